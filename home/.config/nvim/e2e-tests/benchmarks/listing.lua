@@ -0,0 +1,72 @@
+-- Benchmark of the file-explorer directory listing on synthetic directories (files, directories, a few symlinks):
+-- the previous readdir + per-entry isdirectory/getftype listing against listing.lua, with the number of filesystem
+-- calls each makes - vim.fn ones each cost at least a stat, fs_scandir_next ones none
+--   nvim -l e2e-tests/benchmarks/listing.lua
+
+local script_dir = (arg and arg[0] or ""):match("^(.*)/[^/]*$") or "."
+package.path = script_dir .. "/../../lua/?.lua;" .. package.path
+
+local listing = require("file-explorer.listing")
+
+local SIZES = { 1000, 20000 }
+
+local counts = {}
+local function count_calls(owner, name)
+  local original = owner[name]
+  owner[name] = function(...) counts[name] = (counts[name] or 0) + 1; return original(...) end
+end
+for _, name in ipairs({ "readdir", "isdirectory", "getftype", "resolve" }) do count_calls(vim.fn, name) end
+for _, name in ipairs({ "fs_scandir", "fs_stat", "fs_lstat", "fs_readlink", "fs_realpath" }) do
+  count_calls(vim.uv, name)
+end
+
+local function previous_listing(dir)
+  -- The listing as it was: readdir, isdirectory in the sort comparator, then getftype and isdirectory per entry
+  local entries = {}
+  local items = vim.fn.readdir(dir, function(item) return item ~= "." and item ~= ".." end)
+  table.sort(items, function(a, b)
+    local a_is_dir, b_is_dir = vim.fn.isdirectory(dir .. "/" .. a) == 1, vim.fn.isdirectory(dir .. "/" .. b) == 1
+    if a_is_dir ~= b_is_dir then return a_is_dir end
+    return a < b
+  end)
+  for _, item in ipairs(items) do
+    local full_path = dir .. "/" .. item
+    local is_symlink = vim.fn.getftype(full_path) == "link"
+    local entry = { original_name = item, is_dir = vim.fn.isdirectory(full_path) == 1, is_symlink = is_symlink }
+    if is_symlink then entry.symlink_target = vim.fn.resolve(full_path) end
+    table.insert(entries, entry)
+  end
+  return entries
+end
+
+local function make_directory(size)
+  local dir = vim.fn.tempname()
+  vim.fn.mkdir(dir, "p")
+  for i = 1, size do
+    local path = string.format("%s/entry_%06d", dir, i)
+    if i % 10 == 0 then vim.fn.mkdir(path, "p")
+    elseif i % 100 == 1 then vim.uv.fs_symlink(dir .. "/entry_000010", path)
+    else local file = io.open(path, "w"); file:close() end
+  end
+  return dir
+end
+
+local function measure(label, callback)
+  counts = {}
+  local start = vim.uv.hrtime()
+  local entries = callback()
+  local elapsed = (vim.uv.hrtime() - start) / 1e6
+  local calls, total = {}, 0
+  for name, count in pairs(counts) do table.insert(calls, name .. "=" .. count); total = total + count end
+  table.sort(calls)
+  print(string.format("  %-10s %9.2f ms  %7d entries  %8d fs calls (%s)", label, elapsed, #entries, total,
+                      table.concat(calls, " ")))
+end
+
+for _, size in ipairs(SIZES) do
+  local dir = make_directory(size)
+  print(string.format("%d entries", size))
+  measure("previous", function() return previous_listing(dir) end)
+  measure("listing", function() return listing.list(dir) end)
+  vim.fn.delete(dir, "rf")
+end
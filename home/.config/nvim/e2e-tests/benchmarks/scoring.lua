@@ -0,0 +1,71 @@
+-- Benchmark of file-finder path scoring on synthetic trees: plain scorer (lowercasing on every call), plain scorer on
+-- precomputed path data, fuzzy scorer, and the scan-time cost of that precomputation
+-- Only uses the pure Lua modules, so both work:
+--   nvim -l e2e-tests/benchmarks/scoring.lua
+--   luajit e2e-tests/benchmarks/scoring.lua
+
+local script_dir = (arg and arg[0] or ""):match("^(.*)/[^/]*$") or "."
+package.path = script_dir .. "/../../lua/?.lua;" .. package.path
+
+local matcher = require("file-finder.matcher")
+local fuzzy = require("file-finder.fuzzy")
+
+local SIZES = { 10000, 100000 }
+local QUERIES = { "init", "ffui", "scoring.lua", "SrcCompUtil", "zzzz" }
+local WORDS = { "src", "lib", "components", "utils", "test", "file", "finder", "init", "ui", "scoring", "Config",
+                "README", "index", "main", "helpers", "api", "core", "vendor", "build", "docs" }
+local EXTENSIONS = { ".lua", ".py", ".ts", ".md", ".json", ".c" }
+
+local function make_paths(count)
+  math.randomseed(42)
+  local items = {}
+  for i = 1, count do
+    local parts = {}
+    for _ = 1, math.random(1, 6) do table.insert(parts, WORDS[math.random(#WORDS)]) end
+    local path = table.concat(parts, "/") .. "_" .. i .. EXTENSIONS[math.random(#EXTENSIONS)]
+    items[i] = { file = path, printed_path = path }
+  end
+  return items
+end
+
+local function measure(label, callback)
+  local start = os.clock()
+  local matched = callback()
+  local elapsed = string.format("  %-28s %9.2f ms", label, (os.clock() - start) * 1000)
+  print(matched and string.format("%s  %7d matches", elapsed, matched) or elapsed)
+end
+
+for _, size in ipairs(SIZES) do
+  local items = make_paths(size)
+  print(string.format("%d paths", size))
+  measure("prepare (scan time)", function() for _, item in ipairs(items) do fuzzy.prepare(item) end end)
+  for _, query in ipairs(QUERIES) do
+    local low_query = query:lower()
+    print(string.format(" query %q", query))
+    measure("plain, lowercase per call", function()
+      local matched = 0
+      for _, item in ipairs(items) do
+        local _, score = matcher.score(query, item.printed_path, false)
+        if score > 0 then matched = matched + 1 end
+      end
+      return matched
+    end)
+    measure("plain, precomputed", function()
+      local matched = 0
+      for _, item in ipairs(items) do
+        local _, score = matcher.score(query, item.printed_path, false, item.lower, low_query)
+        if score > 0 then matched = matched + 1 end
+      end
+      return matched
+    end)
+    measure("plain then fuzzy", function()
+      local matched = 0
+      for _, item in ipairs(items) do
+        local _, score = matcher.score(query, item.printed_path, false, item.lower, low_query)
+        if score == 0 then score = fuzzy.score(low_query, item) end
+        if score > 0 then matched = matched + 1 end
+      end
+      return matched
+    end)
+  end
+end
@@ -0,0 +1,43 @@
+-- Benchmark of nvim cold start with this config: runs it RUNS times with --startuptime and prints the time to the
+-- first screen, along with the slowest sourced files and required modules of the median run
+-- Needs nvim, run it before and after a change to compare:
+--   nvim -l e2e-tests/benchmarks/startup.lua
+
+local script_dir = (arg and arg[0] or ""):match("^(.*)/[^/]*$") or "."
+local init_lua = vim.fn.fnamemodify(script_dir .. "/../../init.lua", ":p")
+
+local RUNS = 20
+local SHOWN_ENTRIES = 8
+
+local function run_once()
+  -- Returns the total startup time in ms, and the entries of the --startuptime log as { ms, label }
+  local log = vim.fn.tempname()
+  vim.system({ vim.v.progpath, "--headless", "-u", init_lua, "--startuptime", log, "+qa!" }):wait()
+  local total, entries = nil, {}
+  for line in io.lines(log) do
+    local clock, self_ms, label = line:match("^(%d+%.%d+)%s+%d+%.%d+%s+(%d+%.%d+): (.*)$")  -- sourcing/require lines
+    if not clock then clock, label = line:match("^(%d+%.%d+)%s+%d+%.%d+: (.*)$") end
+    if label then
+      if self_ms then table.insert(entries, { tonumber(self_ms), label }) end
+      if label:find("NVIM STARTED", 1, true) then total = tonumber(clock) end
+    end
+  end
+  os.remove(log)
+  return total, entries
+end
+
+local runs = {}
+for _ = 1, RUNS do
+  local total, entries = run_once()
+  if total then table.insert(runs, { total = total, entries = entries }) end
+end
+if #runs == 0 then print("no startup time measured"); return end
+table.sort(runs, function(a, b) return a.total < b.total end)
+local median = runs[math.ceil(#runs / 2)]
+print(string.format("%d runs: min %.2f ms, median %.2f ms, max %.2f ms", #runs, runs[1].total, median.total,
+                    runs[#runs].total))
+table.sort(median.entries, function(a, b) return a[1] > b[1] end)
+print("slowest of the median run (self ms):")
+for i = 1, math.min(SHOWN_ENTRIES, #median.entries) do
+  print(string.format("  %8.3f  %s", median.entries[i][1], median.entries[i][2]))
+end
@@ -10,6 +10,7 @@ Usage:
   DEBUG_NVIM_SCREEN=1 python3 e2e-tests/test_runner.py  # Debug mode (show screen output)
 """
 
+import json
 import os
 import pty
 import select
@@ -46,8 +47,8 @@ class NvimTerminal:
         formatted += f"{'='*80}\n"
         return formatted
 
-    def start(self, cwd=None, filename=None):
-        """Start nvim in a pty"""
+    def start(self, cwd=None, filename=None, extra_env=None):
+        """Start nvim in a pty, extra_env adding variables to its environment"""
         import shutil
         # Find nvim in PATH (try multiple names)
         nvim_path = None
@@ -65,6 +66,7 @@ class NvimTerminal:
         env['LINES'] = str(self.height)
         env['COLUMNS'] = str(self.width)
         env['TERM'] = 'xterm-256color'
+        env.update(extra_env or {})
         # Spawn in pty
         self.pid, self.master_fd = pty.fork()
         if self.pid == 0:  # Child process
@@ -580,6 +582,47 @@ class TestMakeRunner(ReadableAssertionsMixin, unittest.TestCase):
                 self.assertIn('test-integration', grid)
                 self.assertNotIn('build', grid)
 
+    def test_make_runner_follows_includes_and_caches_parsing(self):
+        """Test that included makefiles give targets too, and that reopening only parses again after a change"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / 'mk').mkdir()
+            (Path(tmpdir) / 'Makefile').write_text(
+                "build: ## Build project\n"
+                "\techo build\n"
+                "include mk/lint.mk\n"
+                "-include mk/optional.mk\n"
+            )
+            (Path(tmpdir) / 'mk' / 'lint.mk').write_text(
+                "lint: ## Lint sources\n"
+                "\techo lint\n"
+                "include Makefile\n"  # A cycle, read once
+            )
+            export_path = Path(tmpdir) / 'stats.json'
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir,
+                           extra_env={'NVIM_PLUGIN_STATS': '1', 'NVIM_PLUGIN_STATS_EXPORT': str(export_path)})
+                nvim.send_keys('m')
+                time.sleep(0.05)
+                grid = nvim.get_grid()
+                self.assertIn('build', grid)
+                self.assertIn('Lint sources', grid, "Targets of included makefiles should be listed")
+                nvim.send_keys('\x1b')
+                time.sleep(0.03)
+                nvim.send_keys('m')  # Unchanged: not parsed again
+                time.sleep(0.05)
+                nvim.send_keys('\x1b')
+                time.sleep(0.03)
+                # Creating the optional include changes the targets
+                (Path(tmpdir) / 'mk' / 'optional.mk').write_text("deploy: ## Deploy project\n\techo deploy\n")
+                nvim.send_keys('m')
+                time.sleep(0.05)
+                self.assertIn('Deploy project', nvim.get_grid())
+                nvim.send_keys('\x1b:qa!\n')
+                time.sleep(0.2)
+            exported = json.loads(export_path.read_text())
+            parses = [span for span in exported['spans'] if span['name'] == 'make-runner.parse_makefile']
+            self.assertEqual(len(parses), 2, "Reopening on unchanged makefiles should skip parsing")
+
 
 class TestFileFinder(ReadableAssertionsMixin, unittest.TestCase):
     """E2E tests for file-finder"""
@@ -1300,6 +1343,392 @@ class TestFileFinder(ReadableAssertionsMixin, unittest.TestCase):
                 grid = nvim.get_grid()
                 self.assertIn('test', grid)
 
+    @staticmethod
+    def history_entry(file_path, current_directory):
+        """An entry of the file-finder history file, without its \\0\\n terminator"""
+        return b'\x001' + str(file_path).encode() + b'\x002' + str(current_directory).encode() + b'/'
+
+    def test_file_finder_history_append_only_and_legacy_migration(self):
+        """Test that a legacy history (newest first) is migrated to the append-only format, openings appended after"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            project, data = Path(tmpdir) / 'project', Path(tmpdir) / 'data'
+            project.mkdir()
+            for name in ['a.txt', 'b.txt', 'old1.txt', 'old2.txt']:
+                (project / name).write_text(name)
+            history = data / 'nvim' / 'file-finder' / 'history'
+            history.parent.mkdir(parents=True)
+            history.write_bytes(  # newest first, the last entry unterminated
+                b'C4NV-history-v0.0.0\x00\n' + self.history_entry(project / 'old2.txt', project) + b'\x00\n'
+                + self.history_entry(project / 'old1.txt', project)
+            )
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=str(project), filename='a.txt', extra_env={'XDG_DATA_HOME': str(data)})
+                time.sleep(0.2)
+                nvim.send_keys(':e b.txt\n')
+                time.sleep(0.2)
+                content = history.read_bytes()
+                self.assertTrue(content.startswith(b'C4NV-history-v0.1.0\x00\n'), "Should be migrated")
+                self.assertTrue(content.endswith(b'\x00\n'), "Every entry should be terminated")
+                positions = [content.find(self.history_entry(project / name, project) + b'\x00\n')
+                             for name in ['old1.txt', 'old2.txt', 'a.txt', 'b.txt']]
+                self.assertNotIn(-1, positions)
+                self.assertEqual(positions, sorted(positions), "Entries should be oldest first, openings appended")
+                nvim.send_keys('o')
+                time.sleep(0.1)
+                grid = nvim.get_grid()
+                self.assertIn('old1.txt', grid)
+                self.assertIn('old2.txt', grid)
+
+    def test_file_finder_history_migration_retried_when_locked(self):
+        """Test that openings made while another instance holds the lock wait for the legacy migration, not lost"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            project, data = Path(tmpdir) / 'project', Path(tmpdir) / 'data'
+            project.mkdir()
+            (project / 'a.txt').write_text('a')
+            history = data / 'nvim' / 'file-finder' / 'history'
+            history.parent.mkdir(parents=True)
+            history.write_bytes(b'C4NV-history-v0.0.0\x00\n' + self.history_entry(project / 'old.txt', project))
+            lock = Path(str(history) + '.lock')
+            lock.touch()
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=str(project), filename='a.txt', extra_env={'XDG_DATA_HOME': str(data)})
+                time.sleep(0.2)
+                self.assertTrue(history.read_bytes().startswith(b'C4NV-history-v0.0.0'), "Locked: not migrated yet")
+                lock.unlink()
+                time.sleep(1.5)  # past the retry delay
+                content = history.read_bytes()
+                self.assertTrue(content.startswith(b'C4NV-history-v0.1.0'))
+                self.assertIn(self.history_entry(project / 'old.txt', project), content)
+                self.assertIn(self.history_entry(project / 'a.txt', project), content, "The opening should be kept")
+
+    def test_file_finder_history_compaction_waits_for_lock(self):
+        """Test that compaction doesn't run while another instance holds the lock, but recovers a stale lock"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            project, data = Path(tmpdir) / 'project', Path(tmpdir) / 'data'
+            project.mkdir()
+            history = data / 'nvim' / 'file-finder' / 'history'
+            history.parent.mkdir(parents=True)
+            entry = self.history_entry(project / 'dup.txt', project) + b'\x00\n'
+            history.write_bytes(b'C4NV-history-v0.1.0\x00\n' + entry * 400)
+            lock = Path(str(history) + '.lock')
+            lock.touch()  # held by another instance
+            append = (':lua local h, c = require("file-finder.history"), require("file-finder.config"); '
+                      'c.HISTORY_COMPACT_MIN_BYTES, c.HISTORY_COMPACT_DELAY_MS = 0, 0; for _ = 1, {} do '
+                      f'h.append_to_history(c.data_file, "{project}/dup.txt", "{project}/", 9000) end\n')
+
+            def entries(): return history.read_bytes().count(b'\x00\n') - 1  # the header ends with one too
+
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=str(project), extra_env={'XDG_DATA_HOME': str(data)})
+                time.sleep(0.1)
+                nvim.send_keys(append.format(500))  # doubles the history, a compaction is due
+                time.sleep(0.3)
+                self.assertGreaterEqual(entries(), 900, "Should not compact while the lock is held")
+                self.assertTrue(lock.exists(), "Should leave the lock of another instance alone")
+                stale = time.time() - 120
+                os.utime(lock, (stale, stale))  # its instance crashed
+                nvim.send_keys(append.format(1000))  # doubles again
+                time.sleep(0.3)
+                self.assertEqual(entries(), 1, "Should compact once the stale lock is recovered")
+                self.assertFalse(lock.exists())
+
+    def test_file_finder_history_read_incrementally_after_append(self):
+        """Test that entries appended to an already read history are applied on top of it, deduped, newest first"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            project, data = Path(tmpdir) / 'project', Path(tmpdir) / 'data'
+            project.mkdir()
+            for name in ['a.txt', 'b.txt', 'c.txt']:
+                (project / name).write_text('x\n')
+            history = data / 'nvim' / 'file-finder' / 'history'
+
+            def order(grid):
+                lines = grid.split('\n')
+                return [next((i for i, line in enumerate(lines) if name in line), None)
+                        for name in ['c.txt', 'a.txt', 'b.txt']]
+
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=str(project), filename='a.txt', extra_env={'XDG_DATA_HOME': str(data)})
+                time.sleep(0.2)
+                nvim.send_keys(':e b.txt\n')
+                time.sleep(0.1)
+                nvim.send_keys('o')  # reads the whole history
+                time.sleep(0.1)
+                self.assertIsNone(order(nvim.get_grid())[0])
+                nvim.send_keys('\x1b')
+                time.sleep(0.05)
+                nvim.send_keys(':e a.txt\n')  # a again, supersedes its first opening
+                time.sleep(0.1)
+                with open(history, 'ab') as f:  # another instance opens c, same inode, only grown
+                    f.write(self.history_entry(project / 'c.txt', project) + b'\x00\n')
+                nvim.send_keys(':enew\n')  # no file name shown besides the results
+                time.sleep(0.05)
+                nvim.send_keys('o')  # only reads the tail
+                time.sleep(0.1)
+                grid = nvim.get_grid()
+                self.assertEqual(grid.count('a.txt'), 1, "a.txt should be listed once")
+                c_idx, a_idx, b_idx = order(grid)
+                self.assertIsNotNone(c_idx, "The entry appended by another instance should be listed")
+                self.assertIsNotNone(b_idx)
+                self.assertLess(c_idx, a_idx, "Newest first")
+                self.assertLess(a_idx, b_idx, "a.txt reopened after b.txt")
+
+    def test_file_finder_ranks_one_page_at_a_time(self):
+        """Test that only a page of matches is shown, the next ones being ranked when moving past the last one"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(12):
+                (Path(tmpdir) / f'match_{i:02d}.txt').write_text('x\n')
+            for i in range(20):
+                (Path(tmpdir) / f'other_{i:02d}.txt').write_text('x\n')
+
+            def shown(grid): return len([line for line in grid.split('\n') if '.txt' in line and 'match_' in line])
+
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir)
+                time.sleep(0.05)
+                nvim.send_keys(':lua require("file-finder.config").PAGE_SIZE = 5\n')
+                nvim.send_keys('O')
+                time.sleep(0.05)
+                nvim.send_keys('match_')
+                time.sleep(0.1)
+                self.assertEqual(shown(nvim.get_grid()), 5, "Only the first page should be ranked and shown")
+                for _ in range(5):  # past the last shown match
+                    nvim.send_ctrl('k')
+                time.sleep(0.05)
+                self.assertEqual(shown(nvim.get_grid()), 10, "Moving past the last match should show the next page")
+                for _ in range(10):
+                    nvim.send_ctrl('k')
+                time.sleep(0.05)
+                self.assertEqual(shown(nvim.get_grid()), 12, "The last page only holds the remaining matches")
+                self.assertNotIn('other_', nvim.get_grid())
+
+    def test_file_finder_daemon_shared_by_two_instances(self):
+        """Test that two instances get their tree mode results from one daemon, shown as in-process results are"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            project, run = Path(tmpdir) / 'project', Path(tmpdir) / 'run'
+            (project / 'src').mkdir(parents=True)
+            run.mkdir()
+            (project / 'src' / 'alpha.txt').write_text('first line\nthe needle is here\n')
+            (project / 'beta.txt').write_text('nothing\n')
+            export_path = Path(tmpdir) / 'stats.json'
+            env = {'XDG_RUNTIME_DIR': str(run), 'XDG_DATA_HOME': str(Path(tmpdir) / 'data')}
+            use_daemon = ':lua require("file-finder.config").USE_DAEMON = true\n'
+            sockets = []
+            with NvimTerminal(self.config_dir) as first, NvimTerminal(self.config_dir) as second:
+                try:
+                    first.start(cwd=str(project), extra_env=env)
+                    time.sleep(0.1)
+                    first.send_keys(use_daemon)
+                    first.send_keys('O')  # no daemon yet: starts it, this opening searches in-process
+                    time.sleep(0.1)
+                    first.send_keys('\x1b')
+                    for _ in range(50):
+                        sockets = list(run.rglob('file-finder-*.sock'))
+                        if sockets:
+                            break
+                        time.sleep(0.1)
+                    self.assertEqual(len(sockets), 1, "The daemon should listen on a socket of the runtime directory")
+                    time.sleep(0.2)  # indexing the tree
+                    second.start(cwd=str(project), extra_env={
+                        **env, 'NVIM_PLUGIN_STATS': '1', 'NVIM_PLUGIN_STATS_EXPORT': str(export_path)
+                    })
+                    time.sleep(0.1)
+                    second.send_keys(use_daemon)
+                    second.send_keys('O')
+                    time.sleep(0.1)
+                    second.send_keys('needle')
+                    time.sleep(0.3)
+                    grid = second.get_grid()
+                    self.assertIn('src/alpha.txt', grid)
+                    self.assertIn('the needle is here', grid, "Matched lines should come with the daemon's results")
+                    self.assertNotIn('beta.txt', grid)
+                    first.send_keys('O')
+                    time.sleep(0.1)
+                    first.send_keys('beta')
+                    time.sleep(0.3)
+                    grid = first.get_grid()
+                    self.assertIn('beta.txt', grid)
+                    self.assertNotIn('alpha.txt', grid)
+                    second.send_keys('\x1b:qa!\n')
+                    time.sleep(0.2)
+                    exported = json.loads(export_path.read_text())
+                    self.assertNotIn('file-finder.get_files', [span['name'] for span in exported['spans']],
+                                     "The tree should be indexed by the daemon, not by the instance")
+                finally:
+                    if sockets:  # the daemon would only quit after its idle timeout
+                        first.send_keys('\x1b:lua vim.rpcnotify(vim.fn.sockconnect("pipe", "'
+                                        f'{sockets[0]}", {{ rpc = true }}), "nvim_command", "qall!")\n')
+                        time.sleep(0.2)
+
+    def test_file_finder_memo_evicts_least_recent_and_stale(self):
+        """Test that ranked queries are reused, least recently used first evicted, dropped once the history changes"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            project = Path(tmpdir) / 'project'
+            project.mkdir()
+            for name in ['apple.txt', 'banana.txt', 'cherry.txt', 'other.txt']:
+                (project / name).write_text('x\n')
+            export_path = Path(tmpdir) / 'stats.json'
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=str(project), extra_env={
+                    'XDG_DATA_HOME': str(Path(tmpdir) / 'data'),
+                    'NVIM_PLUGIN_STATS': '1', 'NVIM_PLUGIN_STATS_EXPORT': str(export_path),
+                })
+                time.sleep(0.1)
+                nvim.send_keys(':lua require("file-finder.config").MEMO_MAX_ENTRIES = 2\n')
+                nvim.send_keys('O')
+                time.sleep(0.1)
+                for key in ['a', '\x7f', 'b', '\x7f', 'c', '\x7f', 'b', '\x7f', 'a', '\x7f']:
+                    nvim.send_keys(key)  # a, b, c ranked - b reused - a evicted by c, ranked again
+                    time.sleep(0.05)
+                nvim.send_keys('\x1b')
+                time.sleep(0.05)
+                nvim.send_keys(':e other.txt\n')  # the history changes
+                time.sleep(0.1)
+                nvim.send_keys('O')
+                time.sleep(0.1)
+                nvim.send_keys('b')  # memoized for the previous history
+                time.sleep(0.05)
+                self.assertIn('banana.txt', nvim.get_grid())
+                nvim.send_keys('\x1b:qa!\n')
+                time.sleep(0.2)
+            exported = json.loads(export_path.read_text())
+            filters = [span for span in exported['spans'] if span['name'] == 'file-finder.scoring.filter']
+            self.assertEqual(len(filters), 5, "a, b, c, a again once evicted, b again once stale")
+
+    def test_file_finder_workers_match_main_thread(self):
+        """Test that content search gives the same results with worker threads as on the main thread"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(1200):  # above CONTENT_WORKERS_MIN_FILES, several batches
+                text = f'filler {i}\n' * (i % 7) + ('NEEDLE upper\n' if i % 90 == 0 else '')
+                text += 'a needle here\n' if i % 45 == 0 else ''
+                (Path(tmpdir) / f'file_{i:04d}.txt').write_text(text)
+            grids = {}
+            for workers in ['true', 'false']:
+                with NvimTerminal(self.config_dir) as nvim:
+                    nvim.start(cwd=tmpdir)
+                    time.sleep(0.05)
+                    nvim.send_keys(f':lua require("file-finder.config").CONTENT_WORKERS = {workers}\n')
+                    nvim.send_keys('O')
+                    time.sleep(0.1)
+                    nvim.send_keys('needle')
+                    time.sleep(1.0)
+                    lines = nvim.get_grid().split('\n')
+                    grids[workers] = [line for line in lines if 'file_' in line or 'eedle' in line]
+            self.assertIn('file_0000.txt', '\n'.join(grids['true']))
+            self.assertIn('NEEDLE upper', '\n'.join(grids['true']))
+            self.assertEqual(grids['true'], grids['false'])
+
+    def test_file_finder_trigram_index_loaded_stale(self):
+        """Test that a file changed since the trigram index was saved is still found before the index is refreshed"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            project, data = Path(tmpdir) / 'project', Path(tmpdir) / 'data'
+            project.mkdir()
+            for i in range(2000):
+                (project / f'file_{i:04d}.txt').write_text(f'filler {i}\n')
+            (project / 'target.txt').write_text('nothing to see\n')
+            env = {'XDG_DATA_HOME': str(data)}
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=str(project), filename='target.txt', extra_env=env)
+                time.sleep(0.05)
+                nvim.send_keys('O')
+                time.sleep(1.5)  # the index is built and saved in the background
+                nvim.send_keys('\x1b:qa!\n')
+                time.sleep(0.2)
+            self.assertTrue(list((data / 'nvim' / 'file-finder' / 'trigrams').glob('*.mpack')), "Index should be saved")
+            (project / 'target.txt').write_text('the fresh_needle is here now\n')
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=str(project), extra_env=env)
+                time.sleep(0.05)
+                nvim.send_keys('O')  # the saved index is loaded, its postings for target.txt are stale
+                nvim.send_keys('fresh_needle')
+                time.sleep(0.1)
+                self.assertIn('target.txt', nvim.get_grid())
+
+    def test_file_finder_skips_binary_contents(self):
+        """Test that content search skips files sniffed as binaries and truncates very long lines"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / 'image.bin').write_bytes(b'\x89PNG\x00\x00needle inside binary\n')
+            (Path(tmpdir) / 'notes.txt').write_text('needle inside text\n')
+            (Path(tmpdir) / 'bundle.js').write_text('x' * 5000 + 'needle far away\n')
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir, filename='notes.txt')
+                time.sleep(0.02)
+                nvim.send_keys('O')
+                time.sleep(0.03)
+                nvim.send_keys('needle')
+                time.sleep(0.05)
+                grid = nvim.get_grid()
+                self.assertIn('notes.txt', grid)
+                self.assertNotIn('image.bin', grid)
+                self.assertNotIn('bundle.js', grid)
+
+    def test_file_finder_respects_gitignore(self):
+        """Test that files and directories ignored by .gitignore rules are not listed, negations re-include"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / '.gitignore').write_text('*.log\n!keep.log\nbuild/\n')
+            (Path(tmpdir) / 'main.py').write_text('print()\n')
+            (Path(tmpdir) / 'debug.log').write_text('noise\n')
+            (Path(tmpdir) / 'keep.log').write_text('kept\n')
+            (Path(tmpdir) / 'build').mkdir()
+            (Path(tmpdir) / 'build' / 'artifact.txt').write_text('built\n')
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir, filename='main.py')
+                time.sleep(0.02)
+                nvim.send_keys('O')
+                time.sleep(0.05)
+                grid = nvim.get_grid()
+                self.assertIn('keep.log', grid)
+                self.assertNotIn('debug.log', grid)
+                self.assertNotIn('artifact.txt', grid)
+
+    def test_file_finder_sees_changes_made_while_open(self):
+        """Test that files created or deleted after a first opening are seen by the next one, without a rescan"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / 'main.py').write_text('print()\n')
+            (Path(tmpdir) / 'old_file.txt').write_text('old\n')
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir, filename='main.py')
+                time.sleep(0.02)
+                nvim.send_keys('O')
+                time.sleep(0.05)
+                self.assertIn('old_file.txt', nvim.get_grid())
+                nvim.send_keys('\x1b')
+                time.sleep(0.02)
+                (Path(tmpdir) / 'old_file.txt').unlink()
+                (Path(tmpdir) / 'subdir').mkdir()
+                (Path(tmpdir) / 'subdir' / 'new_file.txt').write_text('new\n')
+                time.sleep(0.3)  # past the watcher debounce
+                nvim.send_keys('O')
+                time.sleep(0.05)
+                grid = nvim.get_grid()
+                self.assertIn('subdir/new_file.txt', grid)
+                self.assertNotIn('old_file.txt', grid)
+
+    def test_file_finder_preview_around_matched_line(self):
+        """Test that Ctrl-p shows a preview of the selected file around the selected matched line"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            lines = [f'filler {i}' for i in range(1, 201)]
+            lines[119] = 'the needle is here'
+            lines[121] = 'context_after_match'
+            (Path(tmpdir) / 'haystack.txt').write_text('\n'.join(lines) + '\n')
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir, filename='haystack.txt')
+                time.sleep(0.02)
+                nvim.send_keys('O')
+                time.sleep(0.05)
+                nvim.send_keys('needle is')
+                time.sleep(0.05)
+                self.assertNotIn('context_after_match', nvim.get_grid())
+                nvim.send_ctrl('p')
+                time.sleep(0.02)
+                nvim.send_ctrl('k')  # the matched line, below the file name
+                time.sleep(0.2)
+                grid = nvim.get_grid()
+                self.assertIn('context_after_match', grid)
+                self.assertIn('122 context_after_match', grid)
+                nvim.send_ctrl('p')
+                time.sleep(0.05)
+                self.assertNotIn('context_after_match', nvim.get_grid())
+
 
 class TestFileExplorer(ReadableAssertionsMixin, unittest.TestCase):
     def setUp(self):
@@ -1568,6 +1997,28 @@ class TestFileExplorer(ReadableAssertionsMixin, unittest.TestCase):
                 # Should have opened file2.txt
                 self.assertIn('two', grid, "Should show content from bbb_file2 after navigation")
 
+    def test_file_explorer_selection_marker_follows_moves(self):
+        """Test that only the selected row shows the marker after moves redrawing just the rows involved"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(10):
+                (Path(tmpdir) / f'file_{i}.txt').write_text(str(i))
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir)
+                time.sleep(0.05)
+                nvim.send_ctrl('o')
+                time.sleep(0.1)
+                for _ in range(4):
+                    nvim.send_ctrl('k')
+                nvim.send_ctrl('^')
+                time.sleep(0.05)
+                rows = [line.replace(' ', '') for line in nvim.get_grid().splitlines() if 'file_' in line]
+                selected = [row for row in rows if '>file_' in row]
+                self.assertEqual(len(selected), 1, f"Exactly one row should be selected: {rows}")
+                self.assertIn('>file_2.txt', selected[0])
+                nvim.send_keys('\n')
+                time.sleep(0.05)
+                self.assertIn('2', nvim.get_grid(), "Should open the selected file")
+
     def test_file_explorer_navigate_up_to_parent_open_file(self):
         """COMPREHENSIVE: Start in subdir, go up to parent, open file in parent"""
         with tempfile.TemporaryDirectory() as tmpdir:
@@ -2896,6 +3347,349 @@ class TestFileExplorer(ReadableAssertionsMixin, unittest.TestCase):
                 nvim.send_keys('\x1b')
                 time.sleep(0.01)
 
+    @staticmethod
+    def symlinked_directory_tree(tmpdir):
+        """a/m -> ld/l, a/ld -> ../x/y, x/y/l -> ../z.txt: m ends at x/z.txt, a/z.txt is where ".." as a string goes"""
+        root = Path(tmpdir).resolve()
+        (root / 'x' / 'y').mkdir(parents=True)
+        (root / 'a').mkdir()
+        (root / 'x' / 'z.txt').write_text('real target')
+        (root / 'a' / 'z.txt').write_text('lexical decoy')
+        (root / 'a' / 'ld').symlink_to('../x/y')
+        (root / 'x' / 'y' / 'l').symlink_to('../z.txt')
+        (root / 'a' / 'm').symlink_to('ld/l')
+        return root
+
+    @staticmethod
+    def select_entry(nvim, prefix):
+        """Moves the explorer selection up until the selected row, without spaces, contains prefix"""
+        for _ in range(10):
+            if prefix in nvim.get_grid().replace(' ', ''):
+                return
+            nvim.send_ctrl('k')
+            time.sleep(0.01)
+
+    def test_file_explorer_symlink_chain_through_symlinked_directory(self):
+        """Test that a relative target is relative to where its link really is, reached through a symlinked dir"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = self.symlinked_directory_tree(tmpdir)
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=str(root / 'a'))
+                time.sleep(0.01)
+                nvim.send_ctrl('o')
+                time.sleep(0.05)
+                grid = nvim.get_grid()
+                self.assertIn(f"m -> {root / 'x' / 'z.txt'}", grid, "../z.txt should go up from x/y, not from a/ld")
+                self.select_entry(nvim, '>m->')
+                nvim.send_keys('\n')
+                time.sleep(0.05)
+                grid = nvim.get_grid()
+                self.assertIn('real target', grid)
+                self.assertNotIn('lexical decoy', grid)
+
+    def test_file_explorer_symlink_toctou_symlinked_directory(self):
+        """SECURITY: Test TOCTOU - retarget the symlinked directory a chain goes through, after display"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = self.symlinked_directory_tree(tmpdir)
+            (root / 'w').mkdir()
+            (root / 'w' / 'bad.txt').write_text('retargeted content')
+            (root / 'w' / 'l').symlink_to('bad.txt')
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=str(root / 'a'))
+                time.sleep(0.01)
+                nvim.send_ctrl('o')
+                time.sleep(0.05)
+                self.assertIn(f"m -> {root / 'x' / 'z.txt'}", nvim.get_grid())
+                self.select_entry(nvim, '>m->')
+                # RETARGET THE DIRECTORY LINK: a/ld/l is now w/l, the link m itself didn't change
+                (root / 'a' / 'ld').unlink()
+                (root / 'a' / 'ld').symlink_to('../w')
+                nvim.send_keys('\n')
+                time.sleep(0.02)
+                grid = nvim.get_grid()
+                self.assertIn('SECURITY', grid, "Should show security warning")
+                self.assertIn('target changed', grid.lower(), "Should mention target changed")
+                self.assertNotIn('retargeted content', grid, "Should not open the new target")
+                nvim.send_keys('\n')  # Dismiss
+                time.sleep(0.01)
+                nvim.send_keys('\x1b')
+                time.sleep(0.01)
+
+    def test_file_explorer_scrolls_long_listing(self):
+        """Test that moving past the bottom of the window scrolls the listing to the selected entry"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(60):
+                (Path(tmpdir) / f'file_{i:02d}.txt').write_text(str(i))
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir)
+                time.sleep(0.05)
+                nvim.send_ctrl('o')
+                time.sleep(0.05)
+                grid = nvim.get_grid()
+                self.assertIn('file_00.txt', grid)
+                self.assertNotIn('file_50.txt', grid)
+                # Entries: ../, file_00.txt ... file_59.txt
+                for _ in range(51):
+                    nvim.send_ctrl('k')
+                time.sleep(0.05)
+                grid = nvim.get_grid()
+                self.assertIn('>file_50.txt', grid.replace(' ', ''), "Selected entry should be visible")
+                self.assertNotIn('file_00.txt', grid)
+                nvim.send_keys('\n')
+                time.sleep(0.05)
+                self.assertIn('50', nvim.get_grid(), "Should open the selected file")
+
+    def test_file_explorer_type_to_filter(self):
+        """Test that typing after / narrows the listing to matching names, keeping the selection while it matches"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(300):
+                (Path(tmpdir) / f'File_{i:03d}.txt').write_text(f'content {i}')
+            (Path(tmpdir) / 'other.txt').write_text('other')
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir)
+                time.sleep(0.05)
+                nvim.send_ctrl('o')
+                time.sleep(0.2)
+                nvim.send_keys('/')
+                time.sleep(0.05)
+                nvim.send_keys('file_2')
+                time.sleep(0.1)
+                grid = nvim.get_grid()
+                self.assertIn('File_200.txt', grid, "Matching is case insensitive")
+                self.assertNotIn('File_100.txt', grid)
+                self.assertNotIn('other.txt', grid)
+                nvim.send_ctrl('k')
+                nvim.send_ctrl('k')  # File_202.txt
+                time.sleep(0.05)
+                nvim.send_keys('0')  # File_200.txt ... File_209.txt still match, selection stays on File_202.txt
+                time.sleep(0.1)
+                grid = nvim.get_grid()
+                self.assertNotIn('File_210.txt', grid)
+                self.assertIn('>File_202.txt', grid.replace(' ', ''))
+                nvim.send_keys('\x1b')  # Back to the list, still filtered
+                time.sleep(0.05)
+                grid = nvim.get_grid()
+                self.assertIn('/file_20', grid)
+                self.assertNotIn('File_210.txt', grid)
+                nvim.send_keys('\n')
+                time.sleep(0.1)
+                self.assertIn('content 202', nvim.get_grid(), "Should open the selected file")
+
+    def test_file_explorer_batch_copy_move_delete(self):
+        """Test marking entries with <Tab>/<S-Tab>/<C-a>, then copying, moving and deleting them in the background"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / 'target').mkdir()
+            for name in ['a.txt', 'b.txt', 'c.txt', 'd.txt']:
+                (Path(tmpdir) / name).write_text(name)
+            (Path(tmpdir) / 'tree' / 'deep').mkdir(parents=True)
+            (Path(tmpdir) / 'tree' / 'deep' / 'leaf.txt').write_text('leaf')
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir)
+                time.sleep(0.05)
+                nvim.send_ctrl('o')
+                time.sleep(0.2)
+                # Entries: ../, target/, tree/, a.txt, b.txt, c.txt, d.txt
+                nvim.send_ctrl('k')
+                nvim.send_ctrl('k')
+                nvim.send_keys('\t')  # tree/, selection moves to a.txt
+                nvim.send_ctrl('k')
+                nvim.send_keys('\t')  # b.txt
+                nvim.send_ctrl('k')
+                nvim.send_ctrl('k')
+                nvim.send_keys('\x1b[Z')  # <S-Tab>: b.txt to d.txt
+                time.sleep(0.05)
+                marked = [line for line in nvim.get_grid().splitlines() if '*' in line]
+                self.assertEqual(len(marked), 4, f"tree/, b.txt, c.txt and d.txt should be marked: {marked}")
+                # Into target/ and copy there
+                nvim.send_ctrl('^')
+                nvim.send_ctrl('^')
+                nvim.send_ctrl('^')
+                nvim.send_ctrl('^')
+                nvim.send_ctrl('^')
+                nvim.send_keys('\n')
+                time.sleep(0.2)
+                nvim.send_ctrl('y')
+                time.sleep(0.05)
+                nvim.send_keys('y\n')
+                time.sleep(0.5)
+                self.assertEqual((Path(tmpdir) / 'target' / 'tree' / 'deep' / 'leaf.txt').read_text(), 'leaf')
+                self.assertEqual((Path(tmpdir) / 'target' / 'c.txt').read_text(), 'c.txt')
+                self.assertTrue((Path(tmpdir) / 'tree').exists(), "Copy keeps the sources")
+                grid = nvim.get_grid()
+                self.assertIn('tree/', grid, "The listing should show the copies")
+                self.assertIn('d.txt', grid)
+                # Mark all the copies and delete them
+                nvim.send_ctrl('a')
+                nvim.send_ctrl('d')
+                time.sleep(0.05)
+                nvim.send_keys('y\n')
+                time.sleep(0.5)
+                self.assertEqual(list((Path(tmpdir) / 'target').iterdir()), [])
+                self.assertNotIn('d.txt', nvim.get_grid())
+                # Back up, mark a.txt and move it into target/
+                nvim.send_keys('\x7f')  # Go up
+                time.sleep(0.2)
+                for _ in range(3):
+                    nvim.send_ctrl('k')
+                nvim.send_keys('\t')
+                nvim.send_ctrl('^')
+                nvim.send_ctrl('^')
+                nvim.send_ctrl('^')
+                nvim.send_keys('\n')  # target/
+                time.sleep(0.2)
+                nvim.send_ctrl('x')
+                time.sleep(0.05)
+                nvim.send_keys('y\n')
+                time.sleep(0.5)
+                self.assertFalse((Path(tmpdir) / 'a.txt').exists())
+                self.assertEqual((Path(tmpdir) / 'target' / 'a.txt').read_text(), 'a.txt')
+                self.assertIn('a.txt', nvim.get_grid())
+
+    def test_file_explorer_large_directory_fills_in(self):
+        """Test that a large directory listing completes, and that leaving it while listing shows only the new one"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(5000):
+                (Path(tmpdir) / f'file_{i:04d}.txt').touch()
+            (Path(tmpdir) / 'aaa_dir').mkdir()
+            (Path(tmpdir) / 'aaa_dir' / 'inner.txt').touch()
+            (Path(tmpdir) / 'aab_link').symlink_to(Path(tmpdir) / 'aaa_dir')
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir)
+                time.sleep(0.1)
+                nvim.send_ctrl('o')
+                time.sleep(0.5)
+                grid = nvim.get_grid()
+                self.assertNotIn('loading', grid, "Listing should be complete")
+                self.assertIn('aaa_dir/', grid)
+                self.assertIn(f'aab_link -> {tmpdir}', grid, "Visible symlink should be resolved")
+                self.assertIn('file_0000.txt', grid)
+                nvim.send_keys('\x1b')
+                time.sleep(0.05)
+                # Enter aaa_dir right away, the listing of tmpdir may still be running
+                nvim.send_ctrl('o')
+                time.sleep(0.03)
+                nvim.send_ctrl('k')
+                nvim.send_keys('\n')
+                time.sleep(0.3)
+                grid = nvim.get_grid()
+                self.assertIn('inner.txt', grid)
+                self.assertNotIn('file_0000.txt', grid, "The cancelled listing should not show up")
+
+    def test_file_explorer_prefetches_selected_and_parent(self):
+        """Test that the selected directory and the parent one are listed in the background, not when entered"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / 'project' / 'subdir').mkdir(parents=True)
+            (Path(tmpdir) / 'project' / 'subdir' / 'inner.txt').touch()
+            (Path(tmpdir) / 'sibling.txt').touch()
+            export_path = Path(tmpdir) / 'stats.json'
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=str(Path(tmpdir) / 'project'),
+                           extra_env={'NVIM_PLUGIN_STATS': '1', 'NVIM_PLUGIN_STATS_EXPORT': str(export_path)})
+                time.sleep(0.1)
+                nvim.send_ctrl('o')
+                time.sleep(0.1)
+                nvim.send_ctrl('k')  # subdir/
+                time.sleep(0.4)
+                nvim.send_keys('\n')
+                time.sleep(0.05)
+                self.assertIn('inner.txt', nvim.get_grid())
+                nvim.send_keys('\x7f')  # Go up
+                time.sleep(0.1)
+                nvim.send_keys('\x7f')  # Go up, to the parent prefetched while in project
+                time.sleep(0.05)
+                self.assertIn('sibling.txt', nvim.get_grid())
+                nvim.send_keys('\x1b:qa!\n')
+                time.sleep(0.2)
+            exported = json.loads(export_path.read_text())
+            listings = [span for span in exported['spans'] if span['name'] == 'file-explorer.get_directory_entries']
+            self.assertEqual(len(listings), 1, "Only the first directory shown should be listed on the spot")
+
+    def test_file_explorer_shows_directory_sizes(self):
+        """Test that directory rows get their recursive size and file count, computed in the background"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / 'sized' / 'nested').mkdir(parents=True)
+            (Path(tmpdir) / 'sized' / 'a.bin').write_bytes(b'x' * 1536)
+            (Path(tmpdir) / 'sized' / 'nested' / 'b.bin').write_bytes(b'x' * 512)
+            (Path(tmpdir) / 'empty').mkdir()
+            (Path(tmpdir) / 'file.txt').write_text('not a directory')
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir)
+                time.sleep(0.1)
+                nvim.send_ctrl('o')
+                time.sleep(0.6)
+                grid = nvim.get_grid()
+                self.assertIn('2.0K, 2 files', grid, "sized/ should count its nested file too")
+                self.assertIn('0B, 0 files', grid, "empty/ should be annotated")
+                self.assertEqual(grid.count(' files'), 2, "Only directories should be annotated")
+                # Into sized/, where a file is added: its mtime changed, its size is walked again once back
+                nvim.send_keys('/sized\x1b')
+                time.sleep(0.05)
+                nvim.send_keys('\n')
+                time.sleep(0.2)
+                (Path(tmpdir) / 'sized' / 'c.bin').write_bytes(b'x' * 1024)
+                time.sleep(0.2)
+                nvim.send_keys('\x7f')  # Go up
+                time.sleep(0.6)
+                self.assertIn('3.0K, 3 files', nvim.get_grid())
+
+    def test_file_explorer_shows_external_changes_live(self):
+        """Test that entries created or deleted by something else show up, also in a directory listed before"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / 'subdir').mkdir()
+            (Path(tmpdir) / 'old.txt').touch()
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir)
+                time.sleep(0.1)
+                nvim.send_ctrl('o')
+                time.sleep(0.2)
+                self.assertIn('old.txt', nvim.get_grid())
+                (Path(tmpdir) / 'external.txt').touch()
+                (Path(tmpdir) / 'old.txt').unlink()
+                time.sleep(0.4)
+                grid = nvim.get_grid()
+                self.assertIn('external.txt', grid, "External creation should show up")
+                self.assertNotIn('old.txt', grid, "External deletion should show up")
+                # Into subdir and back: the listing comes from the cache, changes made meanwhile must be there
+                nvim.send_ctrl('k')
+                nvim.send_keys('\n')
+                time.sleep(0.2)
+                (Path(tmpdir) / 'meanwhile.txt').touch()
+                time.sleep(0.3)
+                nvim.send_keys('\x7f')  # Go up
+                time.sleep(0.2)
+                grid = nvim.get_grid()
+                self.assertIn('meanwhile.txt', grid)
+                self.assertIn('external.txt', grid)
+
+
+class TestPluginStats(ReadableAssertionsMixin, unittest.TestCase):
+    def setUp(self):
+        self.config_dir = Path.cwd()
+
+    def test_spans_exported_on_exit(self):
+        """Test that hot path spans are recorded, shown by :PluginStats and exported as JSON on exit"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / 'main.py').write_text('print()\n')
+            export_path = Path(tmpdir) / 'stats.json'
+            with NvimTerminal(self.config_dir) as nvim:
+                nvim.start(cwd=tmpdir, filename='main.py',
+                           extra_env={'NVIM_PLUGIN_STATS': '1', 'NVIM_PLUGIN_STATS_EXPORT': str(export_path)})
+                time.sleep(0.02)
+                nvim.send_keys('O')
+                time.sleep(0.05)
+                nvim.send_keys('\x1b')
+                time.sleep(0.02)
+                nvim.send_keys(':PluginStats\n')
+                time.sleep(0.05)
+                self.assertIn('file-finder.get_files', nvim.get_grid())
+                nvim.send_keys('\n:qa!\n')  # exported on exit
+                time.sleep(0.2)
+            exported = json.loads(export_path.read_text())
+            span_names = {span['name'] for span in exported['spans']}
+            self.assertIn('file-finder.get_files', span_names)
+            self.assertIn('file-finder.update_display', span_names)
+            self.assertGreaterEqual(exported['summary']['file-finder.get_files']['count'], 1)
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
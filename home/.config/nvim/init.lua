@@ -1,3 +1,5 @@
+vim.loader.enable()  -- byte-compiled module cache, see :h vim.loader
+
 vim.cmd([[
 noremap j h
 noremap i k
@@ -62,7 +64,7 @@ set ttyfast
 " au BufReadPost * if line("'\"") > 1 && line("'\"") <= line("$") | exe "normal! g'\"" | endif
 ]])
 
-vim.cmd('colorscheme c4ffein')
+require('c4ffein-colors').load()  -- same as :colorscheme c4ffein, without searching the runtimepath
 
 vim.g.editorconfig = false
 
@@ -79,6 +81,7 @@ function select_current_word()
 end
 vim.keymap.set('n', '<C-v>', select_current_word, { desc = 'select word' })
 
+require('plugin-stats').setup()
 require('file-finder').setup()
 require('make-runner').setup()
 require('file-explorer').setup()
@@ -0,0 +1,148 @@
+-- Listings of the directories the explorer showed, so going back to one is instant
+-- - Each cached directory is watched with an fs_event: entries created, deleted or renamed in it by anything else
+--   drop its listing and call on_change(dir), so the explorer can show them live
+-- - The watch starts before the listing (see watch): a listing during which something changed isn't cached, and
+--   on_change(dir) is called as for a later change
+-- - The explorer's own operations patch the listing instead (insert, remove), their events are then expected
+-- - Least recently used listings go first, past MAX_DIRS directories or MAX_ENTRIES entries held
+-- Listings are the sorted entries of listing.lua, ../ first
+
+local M = {}
+
+local listing = require("file-explorer.listing")
+
+local uv = vim.uv
+
+local MAX_DIRS = 32
+local MAX_ENTRIES = 100000
+local DEBOUNCE_MS = 100  -- events are handled once none came for that long
+
+M.on_change = nil  -- on_change(dir) when dir changed behind the explorer's back, its listing is already dropped
+
+local listings = {}  -- dir -> { entries, handle, used, expected = { name -> true } }
+local count, entries_total, clock = 0, 0, 0
+local pending = {}  -- dir -> { name -> true } created/deleted/renamed, or true if unknown
+local timer = nil
+
+function M.drop(dir)
+  local cached = listings[dir]
+  if not cached then return end
+  cached.handle:stop(); cached.handle:close()
+  listings[dir], pending[dir] = nil, nil
+  count, entries_total = count - 1, entries_total - #cached.entries
+end
+
+local function flush()
+  local changes = pending
+  pending = {}
+  for dir, names in pairs(changes) do
+    local cached = listings[dir]
+    if cached then
+      local expected = cached.expected
+      cached.expected = {}
+      local unexpected = names == true
+      if not unexpected then for name in pairs(names) do unexpected = unexpected or not expected[name] end end
+      if unexpected then
+        M.drop(dir)
+        if M.on_change then M.on_change(dir) end
+      end
+    end
+  end
+end
+
+local function on_event(dir, err, filename, events)
+  -- Fast context: only records. Modifications don't change listings, only renames (creation, deletion) count
+  if not err and filename and not events.rename then return end
+  if err or not filename then pending[dir] = true
+  elseif pending[dir] ~= true then pending[dir] = pending[dir] or {}; pending[dir][filename] = true end
+  timer:stop()
+  timer:start(DEBOUNCE_MS, 0, vim.schedule_wrap(flush))
+end
+
+function M.get(dir)
+  -- Returns the cached listing of dir, or nil - symlinks are resolved again when shown, their targets may have moved
+  local cached = listings[dir]
+  if not cached then return nil end
+  clock = clock + 1
+  cached.used = clock
+  for _, entry in ipairs(cached.entries) do if entry.is_symlink then entry.resolved = false end end
+  return cached.entries
+end
+
+function M.has(dir) return listings[dir] ~= nil end
+
+function M.watch(dir)
+  -- Starts watching dir, to call before listing it, returns the watch to give to put along with the listing
+  -- Or nil if dir can't be watched (inotify limits...): its listing would go stale, it isn't cached
+  local handle = uv.new_fs_event()
+  if not handle then return nil end
+  local watch = { handle = handle, changed = false, adopted = false }
+  local ok = handle:start(dir, {}, function(err, filename, events)
+    if err or not filename or events.rename then watch.changed = true end
+    if watch.adopted then on_event(dir, err, filename, events) end
+  end)
+  if not ok then handle:close(); return nil end
+  return watch
+end
+
+function M.unwatch(watch)
+  -- Stops a watch whose listing was cancelled or abandoned, nothing if it was given to put
+  if not watch or watch.adopted or watch.handle:is_closing() then return end
+  watch.handle:stop(); watch.handle:close()
+end
+
+function M.put(dir, entries, watch)
+  -- Caches the complete listing of dir, watched since before it was listed by watch (see M.watch)
+  M.drop(dir)
+  if not watch or watch.adopted or watch.handle:is_closing() then return end
+  if watch.changed or #entries > MAX_ENTRIES then
+    M.unwatch(watch)
+    if watch.changed then vim.schedule(function() if M.on_change then M.on_change(dir) end end) end
+    return
+  end
+  timer = timer or uv.new_timer()
+  watch.adopted = true
+  clock = clock + 1
+  listings[dir] = { entries = entries, handle = watch.handle, used = clock, expected = {} }
+  count, entries_total = count + 1, entries_total + #entries
+  while count > MAX_DIRS or entries_total > MAX_ENTRIES do
+    local oldest = nil
+    for d, cached in pairs(listings) do if not oldest or cached.used < listings[oldest].used then oldest = d end end
+    M.drop(oldest)
+  end
+end
+
+local function position(entries, path)
+  for i, entry in ipairs(entries) do if entry.path == path then return i end end
+  return nil
+end
+
+function M.remove(dir, path)
+  -- Removes the entry of path from the listing of dir after the explorer deleted or renamed it
+  local cached = listings[dir]
+  if not cached then return false end
+  local i = position(cached.entries, path)
+  if i then table.remove(cached.entries, i); entries_total = entries_total - 1 end
+  cached.expected[path:match("[^/]+$")] = true
+  return true
+end
+
+function M.insert(dir, name)
+  -- Adds name to the listing of dir after the explorer created it, returns false if dir isn't cached
+  local cached = listings[dir]
+  if not cached then return false end
+  local entry = listing.decorate(dir, name)
+  cached.expected[name] = true
+  local i = position(cached.entries, entry.path)
+  if i then table.remove(cached.entries, i); entries_total = entries_total - 1 end
+  local low, high = 1, #cached.entries + 1  -- first position whose entry doesn't sort before the new one
+  while low < high do
+    local middle = math.floor((low + high) / 2)
+    if listing.before(cached.entries[middle], entry) then low = middle + 1 else high = middle end
+  end
+  table.insert(cached.entries, low, entry)
+  entries_total = entries_total + 1
+  return true
+end
+
+return M
@@ -1,12 +1,10 @@
 local M = {}
 
-local ui = require("file-explorer.ui")
+function M.open() require("file-explorer.ui").open() end  -- the explorer is loaded on first use, not at startup
 
 function M.setup()
   -- Keybinding: Ctrl+o to open file explorer
-  vim.keymap.set("n", "<C-o>", ui.open, {desc = "Open file explorer", silent = true})
+  vim.keymap.set("n", "<C-o>", M.open, {desc = "Open file explorer", silent = true})
 end
 
-M.open = ui.open
-
 return M
@@ -0,0 +1,205 @@
+-- Background queue of the explorer's batch operations: delete, copy or move entries into a directory
+-- - One job at a time, item after item, every filesystem call async in the libuv threadpool: big trees don't freeze
+-- - Each item is validated as the single operations are, names and paths (see operations.lua), failures are
+--   collected and the job goes on with the next item
+-- - Nothing is ever overwritten, symlinks are deleted, copied or moved themselves, never what they point to
+-- - A cancelled job stops at the next filesystem call, what was done stays done
+-- - Progress counts the entries walked inside the items too, a single big tree isn't stuck at 0/1
+-- Jobs: { kind, items = { paths }, destination, done, walked, errors = { messages }, cancelled, on_progress, on_done }
+
+local M = {}
+
+local operations = require("file-explorer.operations")
+
+local uv = vim.uv
+
+-- Errors of fs_link meaning the move has to copy: other filesystem, or one without hard links (vfat, some mounts...)
+local NO_HARD_LINK = { EXDEV = true, EPERM = true, ENOTSUP = true, EMLINK = true }
+
+local queue = {}
+local running = nil
+
+local function children(path, callback)
+  -- callback(err, paths) with the paths of the entries of directory path
+  uv.fs_scandir(path, function(err, handle)
+    if err then return callback(err) end
+    local paths = {}
+    while true do
+      local name = uv.fs_scandir_next(handle)
+      if not name then break end
+      paths[#paths + 1] = path .. "/" .. name
+    end
+    callback(nil, paths)
+  end)
+end
+
+local function walked(job)
+  -- One more entry processed: on_progress is called once the main loop gets to it, not for every entry
+  job.walked = job.walked + 1
+  if job.progress_scheduled then return end
+  job.progress_scheduled = true
+  vim.schedule(function()
+    job.progress_scheduled = false
+    if running == job then job.on_progress(job) end
+  end)
+end
+
+local function each(job, items, action, callback)
+  -- action(item, next) on every item in turn, callback(err) after the last one or on the first error
+  local i = 0
+  local function step(err)
+    if err then return callback(err) end
+    if job.cancelled then return callback("cancelled") end
+    i = i + 1
+    if i > #items then return callback(nil) end
+    action(items[i], step)
+  end
+  step(nil)
+end
+
+local function remove(job, path, callback)
+  uv.fs_lstat(path, function(err, stat)
+    if err then return callback(err) end
+    walked(job)
+    if stat.type ~= "directory" then return uv.fs_unlink(path, function(unlink_err) callback(unlink_err) end) end
+    children(path, function(list_err, paths)
+      if list_err then return callback(list_err) end
+      each(job, paths, function(child, next) remove(job, child, next) end, function(children_err)
+        if children_err then return callback(children_err) end
+        uv.fs_rmdir(path, function(rmdir_err) callback(rmdir_err) end)
+      end)
+    end)
+  end)
+end
+
+local function copy(job, path, destination, callback)
+  uv.fs_lstat(path, function(err, stat)
+    if err then return callback(err) end
+    walked(job)
+    if stat.type == "link" then
+      uv.fs_readlink(path, function(read_err, target)
+        if read_err then return callback(read_err) end
+        uv.fs_symlink(target, destination, nil, function(link_err) callback(link_err) end)
+      end)
+    elseif stat.type == "directory" then
+      uv.fs_mkdir(destination, stat.mode, function(mkdir_err)
+        if mkdir_err then return callback(mkdir_err) end
+        children(path, function(list_err, paths)
+          if list_err then return callback(list_err) end
+          each(job, paths, function(child, next)
+            copy(job, child, destination .. "/" .. child:match("[^/]+$"), next)
+          end, callback)
+        end)
+      end)
+    else
+      uv.fs_copyfile(path, destination, {excl = true}, function(copy_err) callback(copy_err) end)
+    end
+  end)
+end
+
+local function move(job, path, destination, callback)
+  -- Never replaces destination, even one created after step checked it: rename would, so files and symlinks are
+  -- hard linked there then unlinked, and directories are renamed onto an empty directory first made for them
+  -- Copy then delete across filesystems, or where hard links aren't supported
+  local function copy_then_remove()
+    copy(job, path, destination, function(copy_err)
+      if copy_err then return callback(copy_err) end
+      remove(job, path, callback)
+    end)
+  end
+  uv.fs_lstat(path, function(err, stat)
+    if err then return callback(err) end
+    if stat.type ~= "directory" then
+      return uv.fs_link(path, destination, function(link_err)
+        if link_err and NO_HARD_LINK[link_err:match("^%u+")] then return copy_then_remove() end
+        if link_err then return callback(link_err) end
+        walked(job)
+        uv.fs_unlink(path, function(unlink_err) callback(unlink_err) end)
+      end)
+    end
+    uv.fs_mkdir(destination, stat.mode, function(mkdir_err)  -- fails if it exists
+      if mkdir_err then return callback(mkdir_err) end
+      uv.fs_rename(path, destination, function(rename_err)  -- only replaces an empty directory, fails otherwise
+        if not rename_err then walked(job); return callback(nil) end
+        uv.fs_rmdir(destination, function()  -- unless something was put in it meanwhile
+          if rename_err:match("^EXDEV") then return copy_then_remove() end
+          callback(rename_err)
+        end)
+      end)
+    end)
+  end)
+end
+
+local actions = { copy = copy, move = move, delete = function(job, path, _, callback) remove(job, path, callback) end }
+
+local function check(job, path)
+  -- Returns where path goes (itself for a deletion), or nil and why it can't be processed
+  local valid, err = operations.is_valid_path(path)
+  if not valid then return nil, err end
+  if job.kind == "delete" then return path end
+  local name = path:match("[^/]+$")
+  valid, err = operations.is_valid_filename(name)
+  if not valid then return nil, err end
+  local destination = job.destination .. "/" .. name
+  valid, err = operations.is_valid_path(destination)
+  if not valid then return nil, err end
+  if destination == path then return nil, "Already in destination" end
+  if (job.destination .. "/"):sub(1, #path + 1) == path .. "/" then return nil, "Cannot put a directory into itself" end
+  return destination
+end
+
+local run_next
+
+local function step(job)
+  -- Processes the next item of job, on the main loop
+  if job.cancelled or job.done == #job.items then
+    running = nil
+    job.on_done(job)
+    return run_next()
+  end
+  local path = job.items[job.done + 1]
+  local function item_done(err)
+    vim.schedule(function()
+      if err then table.insert(job.errors, path .. ": " .. err) end
+      job.done = job.done + 1
+      job.on_progress(job)
+      step(job)
+    end)
+  end
+  local destination, err = check(job, path)
+  if not destination then return item_done(err) end
+  if job.kind == "delete" then return actions.delete(job, path, destination, item_done) end
+  uv.fs_lstat(destination, function(exists_err)  -- never overwrite
+    if not exists_err then return item_done("Already exists in destination") end
+    actions[job.kind](job, path, destination, item_done)
+  end)
+end
+
+run_next = function()
+  if running or #queue == 0 then return end
+  running = table.remove(queue, 1)
+  step(running)
+end
+
+function M.submit(kind, items, destination, on_progress, on_done)
+  -- Queues kind ("delete", "copy" or "move") of the paths items, into the directory destination for copy and move
+  -- on_progress(job) after each item and on_done(job) at the end are called on the main loop
+  local job = {
+    kind = kind, items = items, destination = destination, done = 0, walked = 0, errors = {}, cancelled = false,
+    on_progress = on_progress, on_done = on_done,
+  }
+  table.insert(queue, job)
+  run_next()
+  return job
+end
+
+function M.cancel()
+  -- Cancels the running job and drops the queued ones, returns false if there was none
+  local any = running ~= nil or #queue > 0
+  for _, job in ipairs(queue) do job.cancelled = true; job.on_done(job) end
+  queue = {}
+  if running then running.cancelled = true end
+  return any
+end
+
+return M
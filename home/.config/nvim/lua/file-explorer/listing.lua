@@ -0,0 +1,196 @@
+-- Directory listing of the explorer, in a single fs_scandir pass that gives names and types together
+-- - Each entry is decorated once (type, display text, validity), sorting then compares precomputed fields only
+-- - Only symlinks cost more syscalls: a stat to know if they point to a directory, and resolving their target (see
+--   symlinks.lua, hops shared between links are read once)
+-- - Entries whose type the filesystem doesn't report get an lstat
+-- - list_async does the same without blocking (slow mounts, huge directories): the syscalls run in the libuv
+--   threadpool, entries come by batches, and symlink targets are only resolved when needed (see resolve)
+-- Entries: { name, original_name, lower_name, is_dir, is_symlink, symlink_target, symlink_chain, path, is_valid,
+--            display_text, is_parent }, lower_name being what the explorer filter matches
+
+local M = {}
+
+local operations = require("file-explorer.operations")
+local symlinks = require("file-explorer.symlinks")
+
+local uv = vim.uv
+
+local BATCH_SIZE = 500  -- entries decorated per main loop iteration by list_async
+
+local function validate(entry)
+  -- Check if filename is valid (skip ../ as it's always allowed, symlinks display as-is)
+  local bare_name = (entry.original_name or entry.name):gsub("/$", "")
+  entry.is_valid = entry.is_parent or entry.is_symlink or operations.is_valid_filename(bare_name)
+  if entry.is_valid then
+    entry.display_text = entry.name
+  else
+    -- Show sanitized version with X for forbidden chars
+    entry.display_text = operations.sanitize_for_display(bare_name) .. (entry.is_dir and "/" or "")
+  end
+  return entry
+end
+
+local function resolve_symlink(entry)
+  -- Get symlink target (protect against redefined symlinks to other dirs)
+  -- NOTE: resolve() follows the entire chain to the final target, the chain is kept for the TOCTOU checks
+  local resolved, chain = symlinks.resolve(entry.path)
+  entry.symlink_chain = chain
+  if resolved then
+    -- SECURITY: Validate symlink target (paranoid path validation)
+    if operations.is_valid_path(resolved) then
+      entry.symlink_target = resolved
+      entry.name = entry.original_name .. " -> " .. resolved  -- Show as "name -> target"
+    else
+      entry.name = entry.original_name .. " -> [INVALID TARGET]"  -- don't store it, show as broken
+    end
+  else
+    entry.name = entry.original_name .. " -> [BROKEN LINK]"  -- circular symlink or other error
+  end
+end
+
+local function new_entry(dir, name, type, target_type)
+  -- type as given by fs_scandir or lstat, target_type the type of what a symlink points to (nil if broken)
+  -- Pure Lua, so libuv callbacks can call it; a symlink is left unresolved
+  local entry = { original_name = name, lower_name = name:lower(), path = dir .. "/" .. name }
+  entry.is_symlink = type == "link"
+  if entry.is_symlink then
+    entry.is_dir = target_type == "directory"  -- a link to a directory is listed as one
+    entry.name, entry.resolved = name .. " -> ...", false
+  else
+    entry.is_dir = type == "directory"
+    entry.name = entry.is_dir and (name .. "/") or name  -- Add trailing slash for directories
+  end
+  return validate(entry)
+end
+
+function M.resolve(entry)
+  -- Resolves the target of a symlink entry if not done yet: only rows shown or acted upon need it
+  if entry.resolved == false then
+    entry.resolved, entry.symlink_target = true, nil
+    resolve_symlink(entry)
+    validate(entry)
+  end
+  return entry
+end
+
+function M.decorate(dir, name, type)
+  -- Returns the entry of name in dir, type being the one fs_scandir gave (nil if the filesystem didn't tell)
+  local full_path = dir .. "/" .. name
+  if not type then local stat = uv.fs_lstat(full_path); type = stat and stat.type end
+  local target_stat = type == "link" and uv.fs_stat(full_path) or nil  -- follows the link
+  return M.resolve(new_entry(dir, name, type, target_stat and target_stat.type))
+end
+
+function M.parent_entry(dir)
+  -- The ../ entry, nil at the root
+  if dir == "/" then return nil end
+  return validate({ name = "../", is_dir = true, is_parent = true, path = vim.fn.fnamemodify(dir, ":h") })
+end
+
+function M.before(a, b)
+  -- Sort: ../ first, then directories, then files, alphabetically
+  if a.is_parent or b.is_parent then return a.is_parent == true and not b.is_parent end
+  if a.is_dir ~= b.is_dir then return a.is_dir end
+  return a.original_name < b.original_name
+end
+
+function M.list(dir)
+  local entries = {}
+  local handle = uv.fs_scandir(dir)
+  while handle do
+    local name, type = uv.fs_scandir_next(handle)
+    if not name then break end
+    table.insert(entries, M.decorate(dir, name, type))
+  end
+  table.sort(entries, M.before)
+  local parent = M.parent_entry(dir)
+  if parent then table.insert(entries, 1, parent) end
+  return entries
+end
+
+local function merge(a, b)
+  -- Both arrays are sorted, returns their sorted union
+  local result, i, j = {}, 1, 1
+  while i <= #a or j <= #b do
+    if j > #b or (i <= #a and not M.before(b[j], a[i])) then result[#result + 1] = a[i]; i = i + 1
+    else result[#result + 1] = b[j]; j = j + 1 end
+  end
+  return result
+end
+
+local function stat_async(dir, name, type, callback)
+  -- callback(entry) once the stats the entry needs are done, in the threadpool - called in a fast context
+  local full_path = dir .. "/" .. name
+  if not type then
+    uv.fs_lstat(full_path, function(_, stat)
+      if stat and stat.type == "link" then stat_async(dir, name, "link", callback)
+      else callback(new_entry(dir, name, stat and stat.type)) end
+    end)
+  else
+    uv.fs_stat(full_path, function(_, stat) callback(new_entry(dir, name, type, stat and stat.type)) end)
+  end
+end
+
+function M.list_async(dir, on_update, on_idle)
+  -- on_update(entries, done) is called on the main loop with all the sorted entries so far, ../ first
+  -- Returns a function cancelling the listing: on_update is never called after it
+  -- on_idle() is called on the main loop once the listing, done or cancelled, has no call left in the threadpool: a
+  -- cancelled fs_scandir or stat still runs there (a hung mount keeps a thread until it answers)
+  local cancelled, scanned, outstanding, scandir_pending = false, false, 0, true
+  local parent = M.parent_entry(dir)
+  local sorted, ready, flush_scheduled = { parent }, {}, false
+  local names, types, position = {}, {}, 1
+
+  local function check_idle()
+    if not on_idle or not cancelled or scandir_pending or outstanding > 0 then return end
+    vim.schedule(on_idle)
+    on_idle = nil
+  end
+
+  local function flush()
+    flush_scheduled = false
+    if cancelled then return end
+    table.sort(ready, M.before)
+    sorted, ready = merge(sorted, ready), {}
+    local done = scanned and outstanding == 0
+    cancelled = done  -- the complete listing is given once
+    on_update(sorted, done)
+    check_idle()
+  end
+
+  local function stat_done(entry)
+    outstanding = outstanding - 1
+    table.insert(ready, entry)
+    if not flush_scheduled then flush_scheduled = true; vim.schedule(flush) end
+    check_idle()
+  end
+
+  local function slice()
+    if cancelled then return end
+    local last = math.min(position + BATCH_SIZE - 1, #names)
+    for i = position, last do
+      local type = types[i] or nil
+      if type and type ~= "link" then table.insert(ready, new_entry(dir, names[i], type))
+      else outstanding = outstanding + 1; stat_async(dir, names[i], type, stat_done) end
+    end
+    position = last + 1
+    scanned = position > #names
+    if not scanned then vim.schedule(slice) end
+    flush()
+  end
+
+  uv.fs_scandir(dir, function(_, handle)
+    -- fs_scandir_next only reads what the threadpool already got, no syscall
+    scandir_pending = false
+    while handle and not cancelled do
+      local name, type = uv.fs_scandir_next(handle)
+      if not name then break end
+      names[#names + 1], types[#names + 1] = name, type or false
+    end
+    vim.schedule(slice)
+    check_idle()
+  end)
+  return function() cancelled = true; check_idle() end
+end
+
+return M
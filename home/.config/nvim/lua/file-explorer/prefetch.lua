@@ -0,0 +1,77 @@
+-- Background listings of the directories the explorer is likely to show next, the selected one and the parent of the
+-- one shown, put in the cache (see cache.lua) so entering or leaving shows them at once
+-- - Only once the selection stayed DELAY_MS on an entry, one listing at a time, the previous prefetch cancelled
+-- - Within budgets: a listing still running after TIMEOUT_MS (slow mount) is abandoned, one past MAX_ENTRIES is
+--   abandoned too and not cached
+-- - A cancelled or abandoned listing may still hold a threadpool thread (hung mount): the next prefetch waits until
+--   it is out of the pool, so prefetching never takes more than one thread
+
+local M = {}
+
+local cache = require("file-explorer.cache")
+local listing = require("file-explorer.listing")
+
+local DELAY_MS = 100
+local TIMEOUT_MS = 500
+local MAX_ENTRIES = 5000
+
+local timer = nil
+local cancel_listing = nil
+local in_pool = false  -- the last listing still has calls in the threadpool, done or not
+local waiting = nil  -- dirs to prefetch once it is out
+
+local function cancel()
+  if cancel_listing then cancel_listing(); cancel_listing = nil end
+end
+
+local prefetch
+
+local function out_of_pool()
+  in_pool = false
+  local dirs = waiting
+  waiting = nil
+  if dirs then prefetch(dirs) end
+end
+
+prefetch = function(dirs)
+  -- Lists the first of dirs not cached yet, then the next ones
+  cancel()
+  if in_pool then waiting = dirs; return end
+  local dir = table.remove(dirs, 1)
+  while dir and cache.has(dir) do dir = table.remove(dirs, 1) end
+  if not dir then return end
+  local this_listing
+  local function abandon()
+    if cancel_listing ~= this_listing then return end
+    cancel()
+    prefetch(dirs)
+  end
+  local watch = cache.watch(dir)  -- before listing, see cache.watch
+  local cancel_this_listing = listing.list_async(dir, function(entries, done)
+    if #entries > MAX_ENTRIES then return abandon() end
+    if not done then return end
+    cancel_listing = nil
+    cache.put(dir, entries, watch)
+    prefetch(dirs)
+  end, out_of_pool)
+  in_pool = true
+  this_listing = function() cancel_this_listing(); cache.unwatch(watch) end
+  cancel_listing = this_listing
+  vim.defer_fn(abandon, TIMEOUT_MS)
+end
+
+function M.schedule(dirs)
+  -- Prefetches dirs in order once no other schedule came for DELAY_MS
+  cancel()
+  timer = timer or vim.uv.new_timer()
+  timer:stop()
+  timer:start(DELAY_MS, 0, vim.schedule_wrap(function() prefetch(dirs) end))
+end
+
+function M.stop()
+  if timer then timer:stop() end
+  cancel()
+  waiting = nil
+end
+
+return M
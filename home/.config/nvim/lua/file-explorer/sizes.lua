@@ -0,0 +1,154 @@
+-- Recursive size of directories (bytes, files, subdirectories), walked by libuv's thread pool so big trees never
+-- block the editor - the explorer shows them after the directory rows visible, as they come
+-- - Results are cached under the directory's mtime, checked again (one async stat) each time they are requested
+-- - At most MAX_IN_FLIGHT walks run at once, the rest wait in a queue dropped by cancel (leaving the directory)
+-- - A walk runs by chunks of CHUNK_ENTRIES entries, its remaining stack queued again after each one: a walk cancelled
+--   meanwhile stops there and is paused, requested again it goes on from there (unless the directory changed)
+-- - Symlinks are counted themselves, never followed; a walk stops after MAX_WALKED entries, its size is a minimum
+-- WARNING the mtime of a directory only changes with its own entries, changes deeper in the tree show up once the
+-- directory itself changes
+
+local M = {}
+
+local uv = vim.uv
+
+local DELAY_MS = 150  -- requests are handled once none came for that long (scrolling, moving)
+local MAX_IN_FLIGHT = 2  -- the rest of the pool stays available to listings and file operations
+local MAX_WALKED = 1000000
+local CHUNK_ENTRIES = 10000  -- walked per threadpool job, a cancelled walk frees its thread after at most that many
+local MAX_RESULTS = 10000  -- past that the cache starts over
+
+local results = {}  -- path -> { mtime, bytes, files, dirs, truncated, on_result, paused }, no bytes until walked once
+local results_count = 0  -- paused being the walk state of a cancelled walk: { stack, bytes, files, dirs, walked }
+local queue, in_flight = {}, 0
+local walking = {}  -- path -> generation of the request it is walked for, while a chunk of it is in the pool
+local context, timer = nil, nil
+local generation = 0  -- bumped by cancel, requests of earlier generations are dropped
+
+local function walk(root, joined_stack, bytes, files, dirs, walked, max_walked)
+  -- Runs in a worker thread: string.dump'ed so no upvalues, and of `vim` only what threads get, vim.uv included
+  -- (see :h lua-loop-threading) - walks directories of the stack until max_walked entries, returns what is left
+  local fs_scandir, fs_scandir_next, fs_lstat = vim.uv.fs_scandir, vim.uv.fs_scandir_next, vim.uv.fs_lstat
+  local stack = {}
+  for dir in joined_stack:gmatch("[^%z]+") do stack[#stack + 1] = dir end
+  while #stack > 0 and walked < max_walked do
+    local dir = table.remove(stack)
+    local handle = fs_scandir(dir)
+    while handle do
+      local name, type = fs_scandir_next(handle)
+      if not name then break end
+      walked = walked + 1
+      local path = dir .. "/" .. name
+      if type == "directory" then
+        dirs = dirs + 1
+        stack[#stack + 1] = path
+      else
+        local stat = fs_lstat(path)
+        if stat and stat.type == "directory" then dirs = dirs + 1; stack[#stack + 1] = path
+        elseif stat then files = files + 1; bytes = bytes + stat.size end
+      end
+    end
+  end
+  return root, table.concat(stack, "\0"), bytes, files, dirs, walked
+end
+
+local function mtime_key(stat) return stat.mtime.sec .. "." .. stat.mtime.nsec end
+
+local queue_next
+
+local function queue_chunk(path, state)
+  context:queue(path, state.stack, state.bytes, state.files, state.dirs, state.walked,
+    math.min(state.walked + CHUNK_ENTRIES, MAX_WALKED))
+end
+
+local function after_walk(path, stack, bytes, files, dirs, walked)
+  local result, wanted = results[path], walking[path] == generation
+  local state = { stack = stack, bytes = bytes, files = files, dirs = dirs, walked = walked }
+  if result and stack ~= "" and walked < MAX_WALKED and wanted then return queue_chunk(path, state) end  -- its slot
+  in_flight, walking[path] = in_flight - 1, nil
+  if result and (stack == "" or walked >= MAX_WALKED) then
+    result.bytes, result.files, result.dirs, result.truncated = bytes, files, dirs, stack ~= ""
+    if result.on_result then result.on_result(path) end
+  elseif result then
+    result.paused = state  -- cancelled between two chunks
+  end
+  queue_next()
+end
+
+queue_next = function()
+  while in_flight < MAX_IN_FLIGHT and #queue > 0 do
+    local path = table.remove(queue, 1)
+    local result = results[path]
+    if result then  -- unless the cache started over
+      local state = result.paused or { stack = path, bytes = 0, files = 0, dirs = 0, walked = 0 }
+      in_flight, walking[path], result.paused = in_flight + 1, generation, nil
+      queue_chunk(path, state)
+    end
+  end
+end
+
+function M.available() return uv.new_work ~= nil end
+
+function M.get(path)
+  -- Returns { bytes, files, dirs, truncated } of directory path if known (maybe of an older mtime), or nil
+  local result = results[path]
+  return result and result.bytes and result or nil
+end
+
+function M.request(paths, on_result)
+  -- Walks the directories paths whose size is unknown or stale, on_result(path) on the main loop for each new one
+  -- Replaces the previous request
+  if not M.available() then return end
+  context = context or uv.new_work(walk, vim.schedule_wrap(after_walk))  -- after_walk would be in a fast context
+  timer = timer or uv.new_timer()
+  M.cancel()
+  local request_generation = generation
+  timer:start(DELAY_MS, 0, function()
+    for _, path in ipairs(paths) do
+      uv.fs_stat(path, vim.schedule_wrap(function(_, stat)
+        if not stat or request_generation ~= generation then return end
+        local result = results[path]
+        if not result then
+          if results_count >= MAX_RESULTS then results, results_count = {}, 0 end
+          result, results_count = {}, results_count + 1
+        end
+        if result.mtime == mtime_key(stat) then  -- known, being walked or paused
+          if walking[path] then walking[path] = generation end  -- still wanted, goes on after its chunk
+          if not result.paused or walking[path] then return end
+          result.on_result = on_result
+          table.insert(queue, path)
+          return queue_next()
+        end
+        result.mtime, result.on_result = mtime_key(stat), on_result  -- stale sizes are shown until the new ones come
+        result.paused = nil  -- the directory changed, walked again from the start
+        results[path] = result
+        table.insert(queue, path)
+        queue_next()
+      end))
+    end
+  end)
+end
+
+function M.cancel()
+  -- Drops the walks not started yet, those running stop after their current chunk
+  generation = generation + 1
+  if timer then timer:stop() end
+  for _, path in ipairs(queue) do
+    local result = results[path]
+    if result and result.paused then  -- goes on from there when requested again
+    elseif result and result.bytes then result.mtime = nil  -- walked again when requested again
+    elseif result then results[path], results_count = nil, results_count - 1 end
+  end
+  queue = {}
+end
+
+function M.format(result)
+  -- "12.3M, 1024 files" - a minimum when the walk was cut short
+  local size, units = result.bytes, { "B", "K", "M", "G", "T" }
+  local unit = 1
+  while size >= 1024 and unit < #units do size, unit = size / 1024, unit + 1 end
+  local text = unit == 1 and string.format("%d%s", size, units[unit]) or string.format("%.1f%s", size, units[unit])
+  return string.format("%s%s, %d files", result.truncated and ">" or "", text, result.files)
+end
+
+return M
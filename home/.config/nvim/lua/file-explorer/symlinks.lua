@@ -0,0 +1,84 @@
+-- Symlink resolution of the explorer, hop by hop with fs_readlink, each hop cached under the lstat signature of its
+-- link (inode, size, ctime): links sharing hops (profiles, alternatives, pnpm stores) only read them once
+-- - Gives what vim.fn.resolve gives: the chain is followed to its end, whose directories are resolved too, a dangling
+--   end is still returned (the link shows where it points), a cycle or a too long chain is nil
+-- - A relative target is relative to the directory the link really is in: joined to the realpath of the directory
+--   the link was reached by, ".." in it then goes up from there as the kernel would (never collapsed as a string)
+-- - A resolution comes with its chain, the signatures of its hops and end: checking it still holds (TOCTOU guard) is
+--   one lstat per hop, no readlink
+-- Chains: { { path, signature }, ... }, the signature of a missing path being "missing"
+
+local M = {}
+
+local uv = vim.uv
+
+local MAX_HOPS = 40  -- as the kernel's limit (ELOOP)
+local MAX_CACHED_HOPS = 10000  -- past that the cache starts over
+
+local hops = {}  -- link path -> { signature, target }, target as read, maybe relative
+local cached_hops = 0
+
+local function signature(stat)
+  if not stat then return "missing" end
+  return stat.ino .. ":" .. stat.size .. ":" .. stat.ctime.sec .. "." .. stat.ctime.nsec
+end
+
+local function normalize(path)
+  -- Absolute path without ., .. or repeated slashes - only for a dangling end, whose directories can't be resolved
+  local parts = {}
+  for part in path:gmatch("[^/]+") do
+    if part == ".." then table.remove(parts) elseif part ~= "." then table.insert(parts, part) end
+  end
+  return "/" .. table.concat(parts, "/")
+end
+
+local function in_real_directory(path)
+  -- path with the directory containing it resolved, or nil if that directory doesn't exist
+  local dir, name = path:match("^(.*)/([^/]*)$")
+  local real_dir = uv.fs_realpath(dir == "" and "/" or dir)
+  return real_dir and (real_dir == "/" and "" or real_dir) .. "/" .. name
+end
+
+local function read_hop(path, link_signature)
+  -- Returns the absolute target of the link at path, only read again once its signature changed
+  local hop = hops[path]
+  local target = hop and hop.signature == link_signature and hop.target
+  if not target then
+    target = uv.fs_readlink(path)
+    if not target then return nil end
+    if not hop then
+      if cached_hops >= MAX_CACHED_HOPS then hops, cached_hops = {}, 0 end
+      cached_hops = cached_hops + 1
+    end
+    hops[path] = { signature = link_signature, target = target }
+  end
+  if target:sub(1, 1) == "/" then return target end
+  local link = in_real_directory(path)  -- the directory it was reached by may itself be or go through a link
+  return link and link:match("^(.*/)") .. target
+end
+
+function M.resolve(path)
+  -- Returns the final target of the link at path and its chain, or nil if it can't be resolved
+  local chain, current = {}, path
+  for _ = 1, MAX_HOPS do
+    local stat = uv.fs_lstat(current)
+    local current_signature = signature(stat)
+    table.insert(chain, { current, current_signature })
+    if stat and stat.type ~= "link" then return uv.fs_realpath(current) or current, chain end
+    if not stat then return in_real_directory(current) or normalize(current), chain end
+    current = read_hop(current, current_signature)
+    if not current then return nil end
+  end
+  return nil
+end
+
+function M.unchanged(chain)
+  -- Whether every hop and the end of a chain are still the same files
+  if not chain then return false end
+  for _, hop in ipairs(chain) do
+    if signature(uv.fs_lstat(hop[1])) ~= hop[2] then return false end
+  end
+  return true
+end
+
+return M
@@ -1,7 +1,15 @@
 local M = {}
 
+local cache = require("file-explorer.cache")
+local jobs = require("file-explorer.jobs")
+local listing = require("file-explorer.listing")
+local symlinks = require("file-explorer.symlinks")
 local operations = require("file-explorer.operations")
+local prefetch = require("file-explorer.prefetch")
+local sizes = require("file-explorer.sizes")
 local ff_config = require("file-finder.config")
+local list_view = require("list-view")
+local stats = require("plugin-stats")
 
 -- State
 M.path_buf = nil
@@ -12,77 +20,22 @@ M.backdrop_buf = nil
 M.backdrop_win = nil
 M.current_dir = nil
 M.selected_line = 1
-M.entries = {}  -- List of {name, is_dir, path}
+M.all_entries = {}  -- List of {name, is_dir, path}, the listing of M.current_dir
+M.entries = {}  -- The entries shown: those of all_entries matching M.filter
+M.filter = ""  -- Lowercase, shown entries have it in their name - typed in the filter prompt
+M.filter_buf = nil
+M.filter_win = nil
+M.marks = {}  -- Marked paths -> true, for batch operations - they stay marked across directories
+M.mark_anchor = nil  -- Path last marked, where a range starts
+M.view = nil  -- list-view of the file list window
+M.cancel_listing = nil  -- cancels the listing in flight, if any
+M.sizes_requested = nil  -- the directories whose sizes were last requested, joined
 
-local function get_directory_entries(dir)
-  local entries = {}
-  -- Add parent directory entry (unless we're at root)
-  if dir ~= "/" then
-    table.insert(entries, {name = "../", is_dir = true, is_parent = true, path = vim.fn.fnamemodify(dir, ":h")})
-  end
-  local items = vim.fn.readdir(dir, function(item)
-    return item ~= "." and item ~= ".."
-  end)
-  if not items then return entries end
-  -- Sort: directories first, then files, alphabetically
-  table.sort(items, function(a, b)
-    local a_path = dir .. "/" .. a
-    local b_path = dir .. "/" .. b
-    local a_is_dir = vim.fn.isdirectory(a_path) == 1
-    local b_is_dir = vim.fn.isdirectory(b_path) == 1
-    if a_is_dir and not b_is_dir then
-      return true
-    elseif not a_is_dir and b_is_dir then
-      return false
-    else
-      return a < b
-    end
-  end)
-  for _, item in ipairs(items) do
-    local full_path = dir .. "/" .. item
-    local is_symlink = vim.fn.getftype(full_path) == "link"
-    local is_dir = vim.fn.isdirectory(full_path) == 1
-    local symlink_target = nil
-    local display_name = item
-    if is_symlink then
-      -- Get symlink target (protect against redefined symlinks to other dirs)
-      -- NOTE: resolve() follows the entire chain to the final target
-      local ok, resolved = pcall(vim.fn.resolve, full_path)
-      if ok and resolved then
-        -- SECURITY: Validate symlink target (paranoid path validation)
-        local target_valid = operations.is_valid_path(resolved)
-        if target_valid then
-          symlink_target = resolved
-          -- Show as "name -> target"
-          display_name = item .. " -> " .. symlink_target
-        else
-          -- Invalid symlink target - don't store it, show as broken
-          display_name = item .. " -> [INVALID TARGET]"
-        end
-      else
-        -- Failed to resolve (circular symlink or other error)
-        display_name = item .. " -> [BROKEN LINK]"
-      end
-    else
-      -- Add trailing slash for directories
-      display_name = is_dir and (item .. "/") or item
-    end
-    table.insert(entries, {
-      name = display_name,
-      original_name = item,
-      is_dir = is_dir,
-      is_symlink = is_symlink,
-      symlink_target = symlink_target,
-      path = full_path
-    })
-  end
-  return entries
-end
+local loading_ns = vim.api.nvim_create_namespace("file_explorer_loading")
+local filter_ns = vim.api.nvim_create_namespace("file_explorer_filter")
+local progress_ns = vim.api.nvim_create_namespace("file_explorer_progress")
 
-local function update_display()
-  if not M.main_buf or not vim.api.nvim_buf_is_valid(M.main_buf) then return end
-  if not M.path_buf or not vim.api.nvim_buf_is_valid(M.path_buf) then return end
-  M.entries = get_directory_entries(M.current_dir)
+local function setup_highlights()
   -- Define highlight groups (matching colors from c4ffein theme)
   vim.api.nvim_set_hl(0, "FileExplorerInvalid", {fg = "#ff0000"})  -- Red
   vim.api.nvim_set_hl(0, "FileExplorerInvalidChar", {fg = "#808080"})  -- Grey
@@ -91,6 +44,179 @@ local function update_display()
   vim.api.nvim_set_hl(0, "FileExplorerSymlink", {fg = "#88FFAA"})  -- Green for symlinks
   vim.api.nvim_set_hl(0, "FileExplorerSymlinkChain", {fg = "#FF0000"})  -- Red for symlink chains
   vim.api.nvim_set_hl(0, "FileExplorerPath", {fg = "#BB88FF"})  -- Purple for path
+  vim.api.nvim_set_hl(0, "FileExplorerMarked", {fg = "#FFB86C", bold = true})  -- Orange for marks
+end
+
+-- Once, and again when a colorscheme cleared them
+setup_highlights()
+vim.api.nvim_create_autocmd("ColorScheme", {
+  group = vim.api.nvim_create_augroup("FileExplorerHighlights", {clear = true}), callback = setup_highlights
+})
+
+local function get_row(i)
+  -- Row i of the listing for list-view: text, colors, size if a directory's is known - symlinks are resolved here
+  local entry = listing.resolve(M.entries[i])
+  local marked = M.marks[entry.path]
+  local prefix = ((i == M.selected_line) and ">" or " ") .. (marked and "*" or " ")
+  local line_text = prefix .. entry.display_text
+  local colors = {}
+  local prefix_len = 2  -- Length of "> " or "  " prefix, "*" marking marked entries
+  if not entry.is_valid then
+    -- Highlight entire line in red (invalid files)
+    table.insert(colors, { "FileExplorerInvalid", 0, -1 })
+    -- Find and highlight X characters in grey
+    for j = 1, #line_text do
+      if line_text:sub(j, j) == "X" then table.insert(colors, { "FileExplorerInvalidChar", j - 1, j }) end
+    end
+  else
+    -- Apply color based on entry type (skip prefix ">" or " ")
+    if entry.is_parent then
+      -- ../ in grey
+      table.insert(colors, { "FileExplorerParent", prefix_len, -1 })
+    elseif entry.is_symlink then
+      -- Symlinks in green
+      table.insert(colors, { "FileExplorerSymlink", prefix_len, -1 })
+    elseif entry.is_dir then
+      -- Directories in cyan
+      table.insert(colors, { "FileExplorerDir", prefix_len, -1 })
+    end
+    -- Files remain white (default, no highlight needed)
+  end
+  if marked then table.insert(colors, { "FileExplorerMarked", 1, 2 }) end
+  -- Highlight selected line (on top of other highlights)
+  if i == M.selected_line then table.insert(colors, { "Visual", 0, -1 }) end
+  local size = entry.is_dir and not entry.is_symlink and not entry.is_parent and sizes.get(entry.path)
+  return line_text, colors, size and ("  " .. sizes.format(size)) or nil
+end
+
+local function prefetch_around()
+  -- The selected directory and the parent one are likely shown next, their listings are made in the background
+  local dirs = {}
+  local entry = M.entries[M.selected_line]
+  if entry and entry.is_dir and not entry.is_parent then
+    local target = entry.symlink_target or (not entry.is_symlink and entry.path)  -- where enter_selected goes
+    if target and operations.is_valid_path(target) then table.insert(dirs, target) end
+  end
+  if M.current_dir ~= "/" then table.insert(dirs, vim.fn.fnamemodify(M.current_dir, ":h")) end
+  prefetch.schedule(dirs)
+end
+
+local function request_sizes()
+  -- Sizes of the directories shown are walked in the background, each row annotated as its size comes
+  -- Symlinks aren't followed: their targets are walked when entered
+  local dirs = {}
+  local last = math.min(#M.entries, M.view.top + vim.api.nvim_win_get_height(M.main_win) - 1)
+  for i = M.view.top, last do
+    local entry = M.entries[i]
+    if entry.is_dir and not entry.is_symlink and not entry.is_parent then table.insert(dirs, entry.path) end
+  end
+  local requested = table.concat(dirs, "\n")
+  if requested == M.sizes_requested then return end  -- same rows, the walks already requested go on
+  M.sizes_requested = requested
+  sizes.request(dirs, function()
+    if M.view then M.selected_line = list_view.render(M.view, nil, nil, M.selected_line) end  -- only that row changed
+  end)
+end
+
+local function render()
+  -- Draws the rows inside the window only, and only those that changed (see list-view.lua), so moving is cheap
+  -- Positions the cursor at the selected line, leftmost position (column 0) - at the ">" marker position
+  if not M.main_buf or not vim.api.nvim_buf_is_valid(M.main_buf) then return end
+  M.selected_line = list_view.render(M.view, #M.entries, get_row, M.selected_line)
+  request_sizes()
+end
+
+local function show_loading(loading)
+  -- "loading..." after the path while the listing is still being filled
+  if not M.path_buf or not vim.api.nvim_buf_is_valid(M.path_buf) then return end
+  vim.api.nvim_buf_clear_namespace(M.path_buf, loading_ns, 0, -1)
+  if not loading then return end
+  vim.api.nvim_buf_set_extmark(M.path_buf, loading_ns, 0, 0, {virt_text = {{"  loading...", "Comment"}}})
+end
+
+local function show_entries(entries)
+  -- Keeps the selected entry selected when still there (batches inserted before it, filter narrowed...)
+  local selected = M.entries[M.selected_line]
+  M.entries = entries
+  if not selected then return end
+  for i, entry in ipairs(entries) do
+    if entry.path == selected.path then M.selected_line = i; return end
+  end
+  if M.filter ~= "" then M.selected_line = 1 end  -- filtered out, the best match is the first one
+end
+
+local function filter_entries(source)
+  -- Entries of source whose name contains M.filter, ../ only shown unfiltered
+  if M.filter == "" then return source end
+  local matches = {}
+  for _, entry in ipairs(source) do
+    if entry.lower_name and entry.lower_name:find(M.filter, 1, true) then matches[#matches + 1] = entry end
+  end
+  return matches
+end
+
+local function set_entries(entries)
+  M.all_entries = entries
+  show_entries(filter_entries(entries))
+end
+
+local function set_filter(filter)
+  -- When the new filter contains the previous one, its matches are among the previous ones: only those are searched
+  local narrowing = M.filter ~= "" and filter:find(M.filter, 1, true) ~= nil
+  M.filter = filter
+  show_entries(filter_entries(narrowing and M.entries or M.all_entries))
+end
+
+local function show_filter()
+  -- The filter after the path, it stays applied once its prompt is closed
+  if not M.path_buf or not vim.api.nvim_buf_is_valid(M.path_buf) then return end
+  vim.api.nvim_buf_clear_namespace(M.path_buf, filter_ns, 0, -1)
+  if M.filter == "" then return end
+  vim.api.nvim_buf_set_extmark(M.path_buf, filter_ns, 0, 0, {virt_text = {{"  /" .. M.filter, "Search"}}})
+end
+
+local function on_listing_update(entries, done)
+  set_entries(entries)
+  if done then M.cancel_listing = nil end
+  show_loading(not done)
+  render()
+  if done then prefetch_around() end
+end
+
+local function list_directory(refresh)
+  -- Lists M.current_dir without blocking, the list fills in as entries come - the previous listing is cancelled
+  -- When refreshing the directory shown, its entries stay until the new listing is complete
+  if M.cancel_listing then M.cancel_listing() end
+  local dir, started = M.current_dir, vim.uv.hrtime()
+  local watch = cache.watch(dir)  -- before listing, changes made meanwhile have it listed again
+  local cancel_listing = listing.list_async(dir, function(entries, done)
+    if refresh and not done then return end
+    if done then stats.span("file-explorer.get_directory_entries", started); cache.put(dir, entries, watch) end
+    on_listing_update(entries, done)
+  end)
+  M.cancel_listing = function() cancel_listing(); cache.unwatch(watch) end
+  show_loading(M.cancel_listing ~= nil)
+end
+
+local function close_filter_prompt()
+  if M.filter_win and vim.api.nvim_win_is_valid(M.filter_win) then vim.api.nvim_win_close(M.filter_win, true) end
+  M.filter_buf, M.filter_win = nil, nil
+end
+
+local function update_display()
+  if not M.main_buf or not vim.api.nvim_buf_is_valid(M.main_buf) then return end
+  if not M.path_buf or not vim.api.nvim_buf_is_valid(M.path_buf) then return end
+  if M.cancel_listing then M.cancel_listing(); M.cancel_listing = nil end
+  local refresh = M.listed_dir == M.current_dir
+  if not refresh then  -- a filter only applies to its directory, the sizes of another one aren't needed anymore
+    close_filter_prompt(); M.filter = ""
+    sizes.cancel()
+  end
+  M.sizes_requested = nil  -- directories shown may have changed, even on the same rows
+  local cached = cache.get(M.current_dir)
+  if cached then set_entries(cached)
+  elseif not refresh then set_entries({}) end  -- not the previous directory's entries meanwhile
+  M.listed_dir = M.current_dir
   -- Update path window (top)
   local path_lines = {M.current_dir}
   vim.api.nvim_buf_set_option(M.path_buf, "modifiable", true)
@@ -99,73 +225,27 @@ local function update_display()
   -- Highlight path in purple
   vim.api.nvim_buf_clear_namespace(M.path_buf, -1, 0, -1)
   vim.api.nvim_buf_add_highlight(M.path_buf, -1, "FileExplorerPath", 0, 0, -1)
-  -- Update file list window (bottom)
-  local file_lines = {}
-  for i, entry in ipairs(M.entries) do
-    local prefix = (i == M.selected_line) and "> " or "  "
-    -- Check if filename is valid (skip ../ as it's always allowed, symlinks display as-is)
-    local is_valid = entry.is_parent or entry.is_symlink or operations.is_valid_filename((entry.original_name or entry.name):gsub("/$", ""))
-    entry.is_valid = is_valid
-    if is_valid then
-      table.insert(file_lines, prefix .. entry.name)
-    else
-      -- Show sanitized version with X for forbidden chars
-      local sanitized = operations.sanitize_for_display((entry.original_name or entry.name):gsub("/$", ""))
-      if entry.is_dir then sanitized = sanitized .. "/" end
-      table.insert(file_lines, prefix .. sanitized)
-    end
-  end
-  -- Make buffer modifiable to update lines
-  vim.api.nvim_buf_set_option(M.main_buf, "modifiable", true)
-  -- Clear all existing lines first
-  vim.api.nvim_buf_set_lines(M.main_buf, 0, -1, true, {})
-  -- Then set new lines
-  vim.api.nvim_buf_set_lines(M.main_buf, 0, -1, false, file_lines)
-  vim.api.nvim_buf_set_option(M.main_buf, "modifiable", false)
-  -- Highlight entries by type and validation
-  vim.api.nvim_buf_clear_namespace(M.main_buf, -1, 0, -1)
-  for i, entry in ipairs(M.entries) do
-    local line_idx = i - 1  -- Files now start at line 0 (no header)
-    local prefix_len = 2  -- Length of "> " or "  " prefix
-    if not entry.is_valid then
-      -- Highlight entire line in red (invalid files)
-      vim.api.nvim_buf_add_highlight(M.main_buf, -1, "FileExplorerInvalid", line_idx, 0, -1)
-      -- Find and highlight X characters in grey
-      local line_text = file_lines[i]
-      if line_text then
-        for j = 1, #line_text do
-          if line_text:sub(j, j) == "X" then
-            vim.api.nvim_buf_add_highlight(M.main_buf, -1, "FileExplorerInvalidChar", line_idx, j - 1, j)
-          end
-        end
-      end
-    else
-      -- Apply color based on entry type (skip prefix ">" or " ")
-      if entry.is_parent then
-        -- ../ in grey
-        vim.api.nvim_buf_add_highlight(M.main_buf, -1, "FileExplorerParent", line_idx, prefix_len, -1)
-      elseif entry.is_symlink then
-        -- Symlinks in green
-        vim.api.nvim_buf_add_highlight(M.main_buf, -1, "FileExplorerSymlink", line_idx, prefix_len, -1)
-      elseif entry.is_dir then
-        -- Directories in cyan
-        vim.api.nvim_buf_add_highlight(M.main_buf, -1, "FileExplorerDir", line_idx, prefix_len, -1)
-      end
-      -- Files remain white (default, no highlight needed)
-    end
-  end
-  -- Highlight selected line (on top of other highlights)
-  if M.selected_line > 0 and M.selected_line <= #M.entries then
-    vim.api.nvim_buf_add_highlight(M.main_buf, -1, "Visual", M.selected_line - 1, 0, -1)
-  end
-  -- Position cursor at the selected line, leftmost position (column 0)
-  -- This makes the cursor appear at the ">" marker position
-  if M.main_win and vim.api.nvim_win_is_valid(M.main_win) then
-    vim.api.nvim_win_set_cursor(M.main_win, {M.selected_line, 0})
-  end
+  show_filter()
+  render()
+  if cached then prefetch_around() else list_directory(refresh) end  -- once listed for a directory not cached
+end
+
+local function patch_display(patched)
+  -- After an operation in the directory shown: its cached listing, the one shown, was patched, or it is listed again
+  if patched then set_entries(M.all_entries); render(); prefetch_around() else update_display() end
+end
+
+cache.on_change = function(dir)
+  -- Something else created, deleted or renamed entries in dir: list it again if it is the one shown
+  if dir == M.current_dir and M.main_buf and vim.api.nvim_buf_is_valid(M.main_buf) then update_display() end
 end
 
 function M.close()
+  if M.cancel_listing then M.cancel_listing() end
+  M.cancel_listing, M.listed_dir, M.filter, M.sizes_requested = nil, nil, "", nil
+  prefetch.stop()
+  sizes.cancel()
+  close_filter_prompt()
   if M.path_win and vim.api.nvim_win_is_valid(M.path_win) then
     vim.api.nvim_win_close(M.path_win, true)
   end
@@ -181,27 +261,31 @@ function M.close()
   M.main_win = nil
   M.backdrop_buf = nil
   M.backdrop_win = nil
+  M.view = nil
 end
 
-local function move_selection(delta)
-  M.selected_line = math.max(1, math.min(#M.entries, M.selected_line + delta))
-  update_display()
+local function select_line(line)
+  -- Only the previously and newly selected rows are drawn again, unless the listing has to scroll
+  if not M.view or #M.entries == 0 then return end
+  M.selected_line = math.max(1, math.min(#M.entries, line))  -- get_row reads it
+  M.selected_line = list_view.move(M.view, M.selected_line)
+  prefetch_around()
+  request_sizes()  -- in case it scrolled
 end
 
+local function move_selection(delta) select_line(M.selected_line + delta) end
+
 local function handle_mouse_click()
   -- Get cursor position after mouse click
   local cursor = vim.api.nvim_win_get_cursor(M.main_win)
-  local clicked_line = cursor[1]
+  local clicked_line = list_view.row_at(M.view, cursor[1])  -- the buffer only holds the visible rows
   -- Update selection to clicked line
-  if clicked_line >= 1 and clicked_line <= #M.entries then
-    M.selected_line = clicked_line
-    update_display()
-  end
+  if clicked_line >= 1 and clicked_line <= #M.entries then select_line(clicked_line) end
 end
 
 local function enter_selected()
   if M.selected_line < 1 or M.selected_line > #M.entries then return end
-  local entry = M.entries[M.selected_line]
+  local entry = listing.resolve(M.entries[M.selected_line])
   -- SECURITY: Block opening symlinks without valid targets (broken/circular/invalid)
   if entry.is_symlink and not entry.symlink_target then
     vim.notify("Cannot open symlink: Invalid or broken target", vim.log.levels.ERROR)
@@ -209,16 +293,16 @@ local function enter_selected()
   end
   -- SECURITY: TOCTOU protection - verify symlink target hasn't changed
   if entry.is_symlink and entry.symlink_target then
-    local current_target = vim.fn.resolve(entry.path)
-    if current_target ~= entry.symlink_target then
+    -- Same hops and end as when resolved (one lstat each): same target, else resolve again to compare
+    if not symlinks.unchanged(entry.symlink_chain) and symlinks.resolve(entry.path) ~= entry.symlink_target then
       vim.notify("SECURITY: Symlink target changed!", vim.log.levels.ERROR)
       return
     end
     -- SECURITY: Block symlink chains - check target is not itself a symlink
     -- NOTE: There's a tiny TOCTOU window between this check and opening, but
     -- the risk is minimal for this edge case and we're already being paranoid
-    local target_type = vim.fn.getftype(entry.symlink_target)
-    if target_type == "link" then
+    local target_stat = vim.uv.fs_lstat(entry.symlink_target)
+    if target_stat and target_stat.type == "link" then
       vim.notify("SECURITY: Symlink chains are not allowed", vim.log.levels.ERROR)
       return
     end
@@ -290,7 +374,7 @@ local function create_file()
     if not filename or filename == "" then return end
     local success, err = operations.create_file(M.current_dir, filename)
     if success then
-      update_display()
+      patch_display(cache.insert(M.current_dir, filename))
       vim.notify("Created: " .. filename, vim.log.levels.INFO)
     else
       vim.notify(err, vim.log.levels.ERROR)
@@ -303,7 +387,7 @@ local function create_directory()
     if not dirname or dirname == "" then return end
     local success, err = operations.create_directory(M.current_dir, dirname)
     if success then
-      update_display()
+      patch_display(cache.insert(M.current_dir, dirname))
       vim.notify("Created: " .. dirname .. "/", vim.log.levels.INFO)
     else
       vim.notify(err, vim.log.levels.ERROR)
@@ -311,7 +395,113 @@ local function create_directory()
   end)
 end
 
+local function show_progress(job)
+  -- "delete 3/10, 1234 entries" after the path while a batch job runs, items done and entries walked inside them
+  if not M.path_buf or not vim.api.nvim_buf_is_valid(M.path_buf) then return end
+  vim.api.nvim_buf_clear_namespace(M.path_buf, progress_ns, 0, -1)
+  if not job then return end
+  local text = string.format("  %s %d/%d, %d entries  <C-q> cancels", job.kind, job.done, #job.items, job.walked)
+  vim.api.nvim_buf_set_extmark(M.path_buf, progress_ns, 0, 0, {virt_text = {{text, "Comment"}}})
+end
+
+local function parent_dir(path)
+  local dir = path:match("^(.*)/[^/]*$")
+  return (dir == nil or dir == "") and "/" or dir
+end
+
+local DONE_VERBS = {delete = "Deleted", copy = "Copied", move = "Moved"}
+
+local function run_job(kind, paths, destination)
+  -- Runs a batch operation in the background (see jobs.lua), the directories involved are listed once at the end:
+  -- their cached listings are dropped, so their watchers don't re-list them on every filesystem event meanwhile
+  local dirs = {}
+  for _, path in ipairs(paths) do dirs[parent_dir(path)] = true end
+  if destination then dirs[destination] = true end
+  for dir in pairs(dirs) do cache.drop(dir) end
+  jobs.submit(kind, paths, destination, show_progress, function(job)
+    show_progress(nil)
+    for dir in pairs(dirs) do cache.drop(dir) end  -- may have been listed meanwhile, half done
+    if dirs[M.current_dir] and M.listed_dir then update_display() end
+    local succeeded = job.done - #job.errors
+    if job.cancelled then
+      vim.notify(string.format("Cancelled %s after %d/%d", kind, job.done, #job.items), vim.log.levels.WARN)
+    elseif #job.errors > 0 then
+      local lines = {string.format("%s %d/%d, failed:", DONE_VERBS[kind], succeeded, #job.items)}
+      for i = 1, math.min(#job.errors, 5) do table.insert(lines, job.errors[i]) end
+      vim.notify(table.concat(lines, "\n"), vim.log.levels.ERROR)
+    elseif #job.items == 1 then
+      vim.notify(DONE_VERBS[kind] .. ": " .. job.items[1]:match("[^/]*$"), vim.log.levels.INFO)
+    else
+      vim.notify(string.format("%s %d entries", DONE_VERBS[kind], succeeded), vim.log.levels.INFO)
+    end
+  end)
+end
+
+local function marked_paths()
+  local paths = vim.tbl_keys(M.marks)
+  table.sort(paths)
+  return paths
+end
+
+local function toggle_mark()
+  local entry = M.entries[M.selected_line]
+  if not entry or entry.is_parent then return end
+  M.marks[entry.path] = not M.marks[entry.path] or nil
+  M.mark_anchor = entry.path
+  move_selection(1)
+  list_view.move(M.view, M.selected_line)  -- the selection may not have moved, its row still has to show the mark
+end
+
+local function mark_range()
+  -- Marks the shown entries from the last one marked to the selected one
+  local anchor = M.selected_line
+  for i, entry in ipairs(M.entries) do if entry.path == M.mark_anchor then anchor = i end end
+  for i = math.min(anchor, M.selected_line), math.max(anchor, M.selected_line) do
+    if not M.entries[i].is_parent then M.marks[M.entries[i].path] = true end
+  end
+  render()
+end
+
+local function mark_all()
+  -- Marks all the shown entries (those matching the filter), or unmarks them if they all are
+  local all_marked = true
+  for _, entry in ipairs(M.entries) do all_marked = all_marked and (entry.is_parent or M.marks[entry.path] == true) end
+  for _, entry in ipairs(M.entries) do
+    if not entry.is_parent then M.marks[entry.path] = (not all_marked) or nil end
+  end
+  render()
+end
+
+local function transfer_marked(kind)
+  -- Copies or moves the marked entries into the directory shown
+  local paths = marked_paths()
+  if #paths == 0 then vim.notify("No marked entries, mark with <Tab>", vim.log.levels.WARN); return end
+  local path_valid, err = operations.is_valid_path(M.current_dir)
+  if not path_valid then vim.notify(err, vim.log.levels.ERROR); return end
+  local destination = M.current_dir
+  local prompt = string.format("%s %d marked entries here? (y/N): ", (kind:gsub("^%l", string.upper)), #paths)
+  vim.ui.input({prompt = prompt}, function(confirm)
+    if not confirm or confirm:lower() ~= "y" then return end
+    M.marks, M.mark_anchor = {}, nil
+    render()
+    run_job(kind, paths, destination)
+  end)
+end
+
+local function cancel_jobs()
+  if not jobs.cancel() then vim.notify("No batch operation running", vim.log.levels.INFO) end
+end
+
 local function delete_selected()
+  local marked = marked_paths()
+  if #marked > 0 then
+    vim.ui.input({prompt = "Delete " .. #marked .. " marked entries? (y/N): "}, function(confirm)
+      if not confirm or confirm:lower() ~= "y" then return end
+      M.marks, M.mark_anchor = {}, nil
+      run_job("delete", marked)
+    end)
+    return
+  end
   if M.selected_line < 1 or M.selected_line > #M.entries then return end
   local entry = M.entries[M.selected_line]
   if entry.name == "../" or entry.is_parent then return end  -- Can't delete parent dir entry
@@ -319,9 +509,11 @@ local function delete_selected()
   local display_name = entry.original_name or entry.name
   vim.ui.input({prompt = "Delete " .. display_name .. "? (y/N): "}, function(confirm)
     if confirm and confirm:lower() == "y" then
+      -- A whole tree could take long, it is deleted in the background
+      if entry.is_dir and not entry.is_symlink then run_job("delete", {entry.path}); return end
       local success, err = operations.delete_path(entry.path)
       if success then
-        update_display()
+        patch_display(cache.remove(M.current_dir, entry.path))
         vim.notify("Deleted: " .. entry.name, vim.log.levels.INFO)
       else
         vim.notify(err, vim.log.levels.ERROR)
@@ -340,7 +532,7 @@ local function rename_selected()
     if not new_name or new_name == "" then return end
     local success, err = operations.rename_path(entry.path, new_name)
     if success then
-      update_display()
+      patch_display(cache.remove(M.current_dir, entry.path) and cache.insert(M.current_dir, new_name))
       vim.notify("Renamed to: " .. new_name, vim.log.levels.INFO)
     else
       vim.notify(err, vim.log.levels.ERROR)
@@ -348,6 +540,56 @@ local function rename_selected()
   end)
 end
 
+local function leave_filter_prompt()
+  -- Back to the list, the filter stays
+  close_filter_prompt()
+  vim.cmd("stopinsert")
+  if M.main_win and vim.api.nvim_win_is_valid(M.main_win) then vim.api.nvim_set_current_win(M.main_win) end
+end
+
+local function open_filter_prompt()
+  -- Type-to-filter over the shown directory, in a prompt over the path window, starting from the current filter
+  if not M.path_win or not vim.api.nvim_win_is_valid(M.path_win) then return end
+  close_filter_prompt()
+  M.filter_buf = vim.api.nvim_create_buf(false, true)
+  vim.api.nvim_buf_set_option(M.filter_buf, "bufhidden", "wipe")
+  vim.api.nvim_buf_set_option(M.filter_buf, "buftype", "prompt")
+  vim.fn.prompt_setprompt(M.filter_buf, "/ ")
+  M.filter_win = vim.api.nvim_open_win(M.filter_buf, true, {
+    relative = "win",
+    win = M.path_win,
+    width = vim.api.nvim_win_get_width(M.path_win),
+    height = 1,
+    row = -1,  -- over the path window, borders included
+    col = -1,
+    style = "minimal",
+    border = "rounded",
+    zindex = 3
+  })
+  vim.api.nvim_buf_set_lines(M.filter_buf, 0, -1, false, {"/ " .. M.filter})
+  local filter_buf = M.filter_buf
+  vim.api.nvim_buf_attach(filter_buf, false, {on_lines = function()
+    vim.schedule(function()
+      if filter_buf ~= M.filter_buf or not vim.api.nvim_buf_is_valid(filter_buf) then return end
+      local line = vim.api.nvim_buf_get_lines(filter_buf, 0, 1, false)[1] or ""
+      local filter = line:gsub("^/ ", ""):lower()
+      if filter == M.filter then return end
+      set_filter(filter)
+      show_filter()
+      render()
+      prefetch_around()  -- the selection may have moved to another entry
+    end)
+  end})
+  local opts = {buffer = M.filter_buf, noremap = true, silent = true}
+  vim.keymap.set("i", "<CR>", function() leave_filter_prompt(); enter_selected() end, opts)
+  vim.keymap.set("i", "<Esc>", leave_filter_prompt, opts)
+  vim.keymap.set("i", "<Down>", function() move_selection(1) end, opts)
+  vim.keymap.set("i", "<Up>", function() move_selection(-1) end, opts)
+  vim.keymap.set("i", "<C-k>", function() move_selection(1) end, opts)
+  vim.keymap.set("i", "<C-^>", function() move_selection(-1) end, opts)
+  vim.cmd("startinsert!")
+end
+
 function M.open()
   -- Get current working directory
   M.current_dir = vim.fn.getcwd()
@@ -405,6 +647,7 @@ function M.open()
     border = "rounded",
     zindex = 2
   })
+  M.view = list_view.new(M.main_buf, M.main_win, "file_explorer_list")
   -- Set keybindings
   local opts = {buffer = M.main_buf, noremap = true, silent = true}
   -- Navigation (multiple options for convenience)
@@ -427,6 +670,14 @@ function M.open()
   vim.keymap.set("n", "<C-d>", delete_selected, opts)
   vim.keymap.set("n", "<C-r>", rename_selected, opts)
   vim.keymap.set("n", "<Esc>", M.close, opts)
+  vim.keymap.set("n", "/", open_filter_prompt, opts)  -- Type-to-filter
+  -- Batch operations on marked entries, in the background
+  vim.keymap.set("n", "<Tab>", toggle_mark, opts)
+  vim.keymap.set("n", "<S-Tab>", mark_range, opts)
+  vim.keymap.set("n", "<C-a>", mark_all, opts)
+  vim.keymap.set("n", "<C-y>", function() transfer_marked("copy") end, opts)  -- into the directory shown
+  vim.keymap.set("n", "<C-x>", function() transfer_marked("move") end, opts)  -- into the directory shown
+  vim.keymap.set("n", "<C-q>", cancel_jobs, opts)
   update_display()
 end
 
@@ -3,9 +3,36 @@ local M = {}
 M.PLUGIN_NAME = "file-finder"
 M.PLUGIN_LAST_FILES_OPEN_FILE_NAME = "last_files_open.txt"
 M.MAX_SAVED_FILES = 9000
+M.HISTORY_COMPACT_MIN_BYTES = 256 * 1024 -- The append-only history is compacted once it doubled, if bigger than that
+M.HISTORY_COMPACT_DELAY_MS = 2000 -- Compaction runs that long after the opening that triggered it
 M.MAX_PRINTABLE_FILES = 9000 -- a filter will be passed on the printable files, so better go as high as possible
 M.MAX_LINES_PER_FILE = 60 -- Maximum lines per file that can be shown with + key
 M.shown_lines_per_file = 3 -- Default/current number of lines shown per file
+M.fuzzy = false -- Fuzzy path matching (fzy-style) after the plain and pattern matching, toggled with <C-f>
+M.PAGE_SIZE = 50 -- Files ranked and shown at once, the next page is ranked when the selection goes past the last one
+M.CONTENT_SNIFF_BYTES = 1024 -- Files with a NUL byte in their first bytes are binaries, never content searched
+M.CONTENT_MAX_BYTES = 1024 * 1024 -- Content search only reads the beginning of bigger files
+M.CONTENT_MAX_LINE_LENGTH = 1024 -- Longer lines (minified bundles...) are truncated when content searched
+M.preview = false -- Preview of the selected file next to the results, toggled with <C-p>
+M.PREVIEW_DEBOUNCE_MS = 40 -- The preview is only read once the selection stayed that long on a line
+M.PREVIEW_MAX_BYTES = 1024 * 1024 -- Maximum bytes read per preview, lines further into the file are not shown
+M.PREVIEW_CHUNK_BYTES = 64 * 1024 -- Previews read by chunks that big, stopping once they got their lines
+M.TRIGRAM_INDEX = true -- Narrow content search with a trigram index over file contents, built in the background
+M.TRIGRAM_MAX_FILE_SIZE = 256 * 1024 -- Bigger files are not indexed, they are always read by the content search
+M.TRIGRAM_SLICE_MS = 8 -- Time budget of each background indexing slice, so the editor stays responsive
+M.CONTENT_WORKERS = true -- Scan file contents in libuv worker threads instead of the main loop
+M.CONTENT_WORKERS_MIN_FILES = 1000 -- Smaller trees are scanned synchronously, threads would cost more than they save
+M.CONTENT_WORKERS_BATCH_SIZE = 64 -- Files per worker job, results stream back to the main loop job by job
+M.CONTENT_WORKERS_REFRESH_MS = 50 -- Minimum delay between two redraws with partial results
+M.MEMO_MAX_ENTRIES = 32 -- Recent queries whose ranked results are kept, to show them at once when repeated
+M.MEMO_MAX_ITEMS = 200000 -- Bound on the scored items these results hold, counted as the number of items searched
+M.USE_DAEMON = false -- Share the tree index, content caches and workers between instances through a local daemon
+M.DAEMON_IDLE_TIMEOUT_MS = 30 * 60 * 1000 -- The daemon quits after that long without any request
+M.WATCH_MAX_DIRS = 2000 -- Directories watched to keep the tree index live, past that each opening rescans the tree
+M.WATCH_DEBOUNCE_MS = 100 -- Filesystem events are applied once none came for that long
+M.IGNORED_DIRS = { ".git", "node_modules", ".nvim", ".venv", "__pycache__", ".ruff_cache", ".gen", ".next" }
+M.USE_IGNORE_FILES = true -- Skip what .gitignore / .ignore / .git/info/exclude rules ignore, as git does
+M.IGNORE_FILES = { ".gitignore", ".ignore" } -- Per directory rule files, later ones take precedence
 
 -- not really config past this line but state, should probably refactor
 
@@ -16,6 +43,7 @@ end
 
 M.data_path = vim.fn.stdpath("data") .. "/file-finder"
 M.data_file = vim.fn.stdpath("data") .. "/file-finder/history"
+M.trigram_path = vim.fn.stdpath("data") .. "/file-finder/trigrams"
 M.set_current_directory(vim.uv.cwd())
 M.next_file_context_directory = nil
 
@@ -0,0 +1,95 @@
+-- Content cache: what is known about the contents of the files content search reads
+-- For now a text/binary verdict per file: sniffed once (a NUL byte in the first bytes means binary), then kept until
+-- the mtime or size of the file changes - re-validated with a single stat once per round, a round being a finder opening
+-- Text files also get line offset checkpoints, recorded as they are read, so previews start reading near their lines
+
+local M = {}
+
+local config = require("file-finder.config")
+
+local uv = vim.uv
+
+local CHECKPOINT_LINES = 256  -- a checkpoint is kept every that many lines
+
+M.generation = 0  -- bumped whenever a cached verdict is dropped or changes, so derived caches can tell they are stale
+
+local verdicts = {}  -- absolute path -> { mtime_sec, mtime_nsec, size, binary, round, checkpoints }
+local round = 0
+
+local function sniff(abs_path)
+  -- Returns true if the file looks binary, or can't be read at all
+  local file = io.open(abs_path, "rb")
+  if not file then return true end
+  local header = file:read(config.CONTENT_SNIFF_BYTES) or ""
+  file:close()
+  return header:find("\0", 1, true) ~= nil
+end
+
+function M.new_round() round = round + 1 end
+
+function M.is_text(abs_path)
+  local verdict = verdicts[abs_path]
+  if verdict and verdict.round == round then return not verdict.binary end
+  local stat = uv.fs_stat(abs_path)
+  if not stat or stat.type ~= "file" then
+    if verdict then verdicts[abs_path] = nil; M.generation = M.generation + 1 end
+    return false
+  end
+  if verdict and verdict.mtime_sec == stat.mtime.sec and verdict.mtime_nsec == stat.mtime.nsec
+     and verdict.size == stat.size then
+    verdict.round = round
+    return not verdict.binary
+  end
+  local binary = sniff(abs_path)
+  if verdict then M.generation = M.generation + 1 end
+  verdicts[abs_path] = {
+    mtime_sec = stat.mtime.sec, mtime_nsec = stat.mtime.nsec, size = stat.size, binary = binary, round = round
+  }
+  return not binary
+end
+
+function M.read_lines(abs_path, first, last)
+  -- Returns lines first..last (fewer past the end of the file), or nil for binaries and unreadable files
+  -- Reads by chunks from the closest checkpoint, at most PREVIEW_MAX_BYTES: lines past that budget are not returned
+  if not M.is_text(abs_path) then return nil end
+  local verdict = verdicts[abs_path]
+  verdict.checkpoints = verdict.checkpoints or { 0 }  -- checkpoint k -> offset of line (k - 1) * CHECKPOINT_LINES + 1
+  local checkpoints = verdict.checkpoints
+  local checkpoint = math.min(#checkpoints, math.floor((first - 1) / CHECKPOINT_LINES) + 1)
+  local line, offset = (checkpoint - 1) * CHECKPOINT_LINES + 1, checkpoints[checkpoint]
+  local fd = uv.fs_open(abs_path, "r", 0)
+  if not fd then return nil end
+  local lines, partial, budget = {}, "", config.PREVIEW_MAX_BYTES
+  while line <= last and budget > 0 do
+    local chunk = uv.fs_read(fd, math.min(config.PREVIEW_CHUNK_BYTES, budget), offset)
+    if not chunk or chunk == "" then
+      if partial ~= "" and line >= first then table.insert(lines, partial) end  -- last line without newline
+      break
+    end
+    budget = budget - #chunk
+    local start = 1
+    while line <= last do
+      local newline = chunk:find("\n", start, true)
+      if not newline then
+        if line >= first then partial = (partial .. chunk:sub(start)):sub(1, config.CONTENT_MAX_LINE_LENGTH) end
+        break
+      end
+      if line >= first then
+        table.insert(lines, (partial .. chunk:sub(start, newline - 1)):sub(1, config.CONTENT_MAX_LINE_LENGTH))
+      end
+      partial, line, start = "", line + 1, newline + 1
+      if (line - 1) % CHECKPOINT_LINES == 0 then checkpoints[(line - 1) / CHECKPOINT_LINES + 1] = offset + newline end
+    end
+    offset = offset + #chunk
+  end
+  uv.fs_close(fd)
+  return lines
+end
+
+function M.invalidate(abs_path)
+  if not verdicts[abs_path] then return end
+  verdicts[abs_path] = nil
+  M.generation = M.generation + 1
+end
+
+return M
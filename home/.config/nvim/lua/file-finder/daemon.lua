@@ -0,0 +1,222 @@
+-- Optional daemon sharing the tree index, the content cache, the trigram index and the workers between instances
+-- - One headless nvim per directory, listening on a socket under stdpath("run"), started on demand by the first
+--   finder opening that doesn't find it (that opening, and any one failing to talk to it, falls back in-process)
+-- - Clients talk msgpack-rpc over that socket with nvim_exec_lua, the daemon sends ranked pages back the same way,
+--   as notifications, partial ones first when the workers are scanning
+-- - The daemon quits after DAEMON_IDLE_TIMEOUT_MS without any request
+-- Only tree mode goes through it, history mode is already cheap and per instance
+-- WARNING both sides run this file: client functions are called by the ui, handle_* by clients, on_* by the daemon
+
+local M = {}
+
+local config = require("file-finder.config")
+
+local uv = vim.uv
+
+local REQUIRE = "return require('file-finder.daemon')."
+
+-- Client state
+local channel = nil  -- to the daemon of channel_directory
+local channel_directory = nil
+local remote_channel = nil  -- our channel id as seen by the daemon
+local query_id = 0
+local current_query = nil  -- { id, on_update }
+
+-- Daemon state
+local items = nil  -- tree index, output of files.get_files
+local queries = {}  -- client channel -> { id, results, more }
+local idle_timer = nil
+
+local function socket_path(directory)
+  return vim.fn.stdpath("run") .. "/file-finder-" .. vim.fn.sha256(directory):sub(1, 16) .. ".sock"
+end
+
+local function plugin_runtime_path()
+  -- The config directory holding this plugin, so the daemon loads the same code whatever config the client uses
+  local this_file = vim.api.nvim_get_runtime_file("lua/file-finder/daemon.lua", false)[1]
+  return this_file and this_file:sub(1, -#"/lua/file-finder/daemon.lua" - 1)
+end
+
+local function start_daemon(directory)
+  local path, runtime_path = socket_path(directory), plugin_runtime_path()
+  if not runtime_path then return end
+  if uv.fs_stat(path) then os.remove(path) end  -- left by a daemon that didn't exit cleanly, nothing answered on it
+  vim.fn.jobstart({
+    vim.v.progpath, "--headless", "--clean", "--listen", path,
+    "--cmd", "set runtimepath^=" .. vim.fn.fnameescape(runtime_path),
+    "-c", "lua require('file-finder.daemon').serve(" .. vim.inspect(directory) .. ")",
+  }, { detach = true, cwd = directory })
+end
+
+local function request(method, ...)
+  -- Returns ok, result of a daemon function, drops the channel if it is dead
+  local ok, result = pcall(vim.rpcrequest, channel, "nvim_exec_lua", REQUIRE .. method .. "(...)", { ... })
+  if not ok then pcall(vim.fn.chanclose, channel); channel = nil end
+  return ok, result
+end
+
+function M.open()
+  -- Called when the finder opens, returns true if tree mode queries can go to the daemon
+  -- Connects (or starts the daemon for next time), and has the daemon refresh its index
+  if not config.USE_DAEMON then return false end
+  local directory = config.current_directory
+  if channel and channel_directory ~= directory then pcall(vim.fn.chanclose, channel); channel = nil end
+  if not channel then
+    local ok, new_channel = pcall(vim.fn.sockconnect, "pipe", socket_path(directory), { rpc = true })
+    if not ok or new_channel == 0 then start_daemon(directory); return false end
+    channel, channel_directory = new_channel, directory
+    local api_ok, api_info = pcall(vim.rpcrequest, channel, "nvim_get_api_info")
+    if not api_ok then pcall(vim.fn.chanclose, channel); channel = nil; return false end
+    remote_channel = api_info[1]
+  end
+  return (request("handle_open"))
+end
+
+local function attach_more(results, has_more, id)
+  if not has_more then return nil end
+  return function(count)
+    -- Synchronous, appends the next ranked items to results like scoring's more
+    if not channel or not current_query or current_query.id ~= id then return 0 end
+    local ok, page = request("handle_more", remote_channel, id, count)
+    if not ok or type(page) ~= "table" then return 0 end
+    vim.list_extend(results, page)
+    return #page
+  end
+end
+
+function M.search(pattern, fuzzy_enabled, on_update)
+  -- Tree mode search, on_update(results, skip_regex_matching, more, done) like scoring.filter_async
+  -- Returns a function cancelling the search, or nil if the daemon can't be used (the caller falls back)
+  if not channel then return nil end
+  query_id = query_id + 1
+  local id = query_id
+  current_query = { id = id, on_update = on_update }
+  if not request("handle_search", remote_channel, id, pattern, fuzzy_enabled) then
+    current_query = nil
+    return nil
+  end
+  return function()
+    if current_query and current_query.id == id then current_query = nil end
+    if not channel then return end
+    pcall(vim.rpcnotify, channel, "nvim_exec_lua", REQUIRE .. "handle_cancel(...)", { remote_channel })
+  end
+end
+
+function M.on_results(id, page, skip_regex_matching, has_more, done)
+  -- Called by the daemon with a ranked page of the query id
+  if not current_query or current_query.id ~= id then return end  -- superseded or cancelled
+  current_query.on_update(page, skip_regex_matching, attach_more(page, has_more, id), done)
+end
+
+-- Daemon side
+
+local function touch()
+  idle_timer:stop()
+  idle_timer:start(config.DAEMON_IDLE_TIMEOUT_MS, 0, vim.schedule_wrap(function() vim.cmd("qall!") end))
+end
+
+local function to_wire(scored_items, first, last)
+  -- Only what the client displays and opens, as scoring gives them in-process - relative paths since both sides share
+  -- the current directory
+  local page = {}
+  for i = first, math.min(last, #scored_items) do
+    local item = scored_items[i]
+    page[#page + 1] = {
+      file = item.file, printed_path = item.printed_path or item.file, matched_lines = item.matched_lines or {},
+      score = item.score,
+    }
+  end
+  return page
+end
+
+local function page_over(all, results)
+  -- more for an empty pattern: the index in its order, as the in-process finder shows it
+  return function(count)
+    local before = #results
+    for i = before + 1, math.min(before + count, #all) do results[i] = all[i] end
+    return #results - before
+  end
+end
+
+local function notify(client, id, results, skip_regex_matching, more, done)
+  local query = queries[client]
+  if not query or query.id ~= id then return end
+  if done then query.results, query.more, query.sent = results, more, #results end
+  local page, code = to_wire(results, 1, #results), REQUIRE .. "on_results(...)"
+  pcall(vim.rpcnotify, client, "nvim_exec_lua", code, { id, page, skip_regex_matching, more ~= nil, done })
+end
+
+function M.serve(directory)
+  -- Entry point of the daemon process, started by start_daemon
+  local files = require("file-finder.files")
+  config.USE_DAEMON = false
+  config.set_current_directory(directory)
+  vim.fn.chdir(directory)
+  idle_timer = uv.new_timer()
+  items = files.get_files()
+  require("file-finder.trigram").refresh(items)
+  touch()
+end
+
+function M.handle_open()
+  -- A finder opened on a client: new and deleted files must be seen, as an in-process opening would see them
+  -- Scheduled so the client doesn't wait for it, searches are scheduled after it
+  touch()
+  vim.schedule(function()
+    local changed
+    items, changed = require("file-finder.files").get_files()
+    if not changed then return end
+    require("file-finder.content").new_round()
+    require("file-finder.trigram").refresh(items)
+  end)
+  return true
+end
+
+function M.handle_search(client, id, pattern, fuzzy_enabled)
+  -- Answers asynchronously with on_results notifications, so the client never blocks on a search
+  local scoring = require("file-finder.scoring")
+  touch()
+  local previous = queries[client]
+  if previous and previous.cancel then previous.cancel() end
+  local query = { id = id }
+  queries[client] = query
+  vim.schedule(function()
+    if queries[client] ~= query then return end
+    config.fuzzy = fuzzy_enabled  -- only read while path scores are computed, synchronously
+    local history_items, _, history_rank = require("file-finder.history").load_history_for_ui()
+    history_rank = history_items and history_rank or {}
+    if pattern == "" then
+      local results = {}
+      local more = page_over(items, results)
+      more(config.PAGE_SIZE)
+      notify(client, id, results, false, more, true)
+    elseif scoring.use_workers(items, false) then
+      query.cancel = scoring.filter_async(pattern, items, nil, history_rank, function(results, skip, more, done)
+        notify(client, id, results, skip, more, done)
+      end)
+    else
+      local results, skip, more = scoring.filter(pattern, items, nil, false, history_rank)
+      notify(client, id, results, skip, more, true)
+    end
+  end)
+  return true
+end
+
+function M.handle_more(client, id, count)
+  -- Returns the next count ranked items of the client's last query
+  touch()
+  local query = queries[client]
+  if not query or query.id ~= id or not query.results then return {} end
+  if query.more then query.more(count) end
+  local page = to_wire(query.results, query.sent + 1, #query.results)
+  query.sent = query.sent + #page
+  return page
+end
+
+function M.handle_cancel(client)
+  local query = queries[client]
+  if query and query.cancel then query.cancel() end
+  queries[client] = nil
+end
+
+return M
@@ -1,16 +1,35 @@
+-- The tree index: per directory sorted entries, kept live by filesystem watchers once scanned (see watcher.lua)
+-- - A change in a watched directory rescans only that directory, or its whole subtree if a rule file changed
+-- - Modified files get their content caches invalidated, the listing is not touched
+-- - Without watchers (budget exhausted, system limits, too many files), each opening rescans the tree as before
+-- - A tree that went over budget is remembered: it is then scanned without watchers, counting its directories, and
+--   watched again once an opening finds that it fits (no watchers set up then dropped on every opening)
+
 local M = {}
 
 local config = require("file-finder.config")
+local content = require("file-finder.content")
+local fuzzy = require("file-finder.fuzzy")
+local ignore = require("file-finder.ignore")
+local stats = require("plugin-stats")
+local trigram = require("file-finder.trigram")
+local watcher = require("file-finder.watcher")
+
+local uv = vim.uv
+
+local MAX_FILES = 10000
 
 M.HOME = vim.env.HOME or vim.env.USERPROFILE -- USERPROFILE for Windows
 if M.HOME:sub(-1) ~= "/" then M.HOME = M.HOME .. "/" end
 
-local function is_ignored_dir(dirname, ignored_dirs)
-  for _, ignored in ipairs(ignored_dirs) do if dirname == ignored then return true end end
-  return false
-end
+M.generation = 0  -- bumped whenever the indexed files change, listed or contents
+
+local index = nil  -- { directory, dirs = { relative dir -> sorted { name, is_dir } }, items = { path -> item }, list }
+local reported_generation = nil  -- last generation get_files returned
+local over_budget = {}  -- directory -> true once its tree couldn't be watched
 
-local function is_symlink(path) local stat = vim.loop.fs_lstat(path); return stat and stat.type == 'link' end
+local rule_file_names = {}
+for _, name in ipairs(config.IGNORE_FILES) do rule_file_names[name] = true end
 
 function M.open_file(file_path, line_number)
   -- line number is optional
@@ -18,35 +37,165 @@ function M.open_file(file_path, line_number)
   else vim.cmd("edit +" .. line_number .. " " .. vim.fn.fnameescape(file_path)) end
 end
 
-function M.get_files()
+local function absolute(relative_dir)
+  return relative_dir == "" and index.directory or index.directory .. "/" .. relative_dir
+end
+local function join(relative_dir, name) return relative_dir == "" and name or relative_dir .. "/" .. name end
+
+local function read_dir(path)
+  -- Returns the entries sorted as readdir() would, and the set of rule file names present
+  -- a single fs_scandir pass per directory gives the entry types, lstat only when the filesystem doesn't
+  local entries, present = {}, {}
+  local handle = uv.fs_scandir(path)
+  if not handle then return entries, present end
+  while true do
+    local name, type = uv.fs_scandir_next(handle)
+    if not name then break end
+    if not type then local stat = uv.fs_lstat(path .. "/" .. name); type = stat and stat.type end
+    if rule_file_names[name] then present[name] = true end
+    table.insert(entries, { name = name, type = type })
+  end
+  table.sort(entries, function(a, b) return a.name < b.name end)
+  return entries, present
+end
+
+local function drop_dir(relative_dir)
+  -- Forgets a directory and everything under it
+  local entries = index.dirs[relative_dir]
+  if not entries then return end
+  index.dirs[relative_dir] = nil
+  watcher.unwatch(absolute(relative_dir))
+  for _, entry in ipairs(entries) do
+    local path = join(relative_dir, entry.name)
+    if entry.is_dir then drop_dir(path) else index.items[path] = nil end
+  end
+end
+
+local function scan_dir(scan, relative_dir, depth, recursive)
+  -- (Re)reads a directory into the index, entering new subdirectories - and known ones too if recursive
+  -- Returns false if the index can't be kept live anymore: too many files, or a directory that can't be watched
+  -- Without scan.watch, only counts the directories in scan.dirs: false past the watch budget
   -- doesn't follow symlinks - could add all targets to (links to check / results) if they don't exist, keeping naive rn
-  local files = {}
-  local ignored_dirs = { ".git", "node_modules", ".nvim", ".venv", "__pycache__", ".ruff_cache", "package-lock.json", ".gen", ".next" }
-  local max_files = 10000
-
-  local function scan_dir(path, relative_path)
-    if #files >= max_files then vim.notify("Too many files in tree", vim.log.levels.WARN); return end
-    local items = vim.fn.readdir(path)
-    if not items then return end
-    for _, item in ipairs(items) do
-      local item_path = path .. "/" .. item
-      if vim.fn.isdirectory(item_path) == 1 then
-        if not is_ignored_dir(item, ignored_dirs) and not is_symlink(item_path) then  -- prevent loops, no dir symlinks
-          local new_relative = relative_path == "" and item or relative_path .. "/" .. item
-          scan_dir(item_path, new_relative)
-        end
+  local path = absolute(relative_dir)
+  scan.dirs = scan.dirs + 1
+  local ok = scan.dirs <= config.WATCH_MAX_DIRS
+  if scan.watch then ok = watcher.watch(path) end  -- before reading, so nothing created meanwhile is missed
+  local entries, present = read_dir(path)
+  local pushed = ignore.push_directory(scan.stack, path, depth, present)
+  local kept, kept_is_dir = {}, {}
+  for _, entry in ipairs(entries) do
+    if entry.type and entry.type ~= "link" then  -- prevent loops, no symlinks
+      local is_dir = entry.type == "directory"
+      scan.components[depth + 1] = entry.name
+      if not ignore.is_ignored(scan.stack, scan.components, depth + 1, is_dir) then
+        table.insert(kept, { name = entry.name, is_dir = is_dir })
+        kept_is_dir[entry.name] = is_dir
+        local child = join(relative_dir, entry.name)
+        if not is_dir then scan.files = scan.files + 1
+        elseif recursive or not index.dirs[child] then ok = scan_dir(scan, child, depth + 1, recursive) and ok end
+      end
+    end
+    if scan.files >= MAX_FILES then ok = false; break end
+  end
+  scan.components[depth + 1] = nil
+  ignore.pop(scan.stack, pushed)
+  for _, entry in ipairs(index.dirs[relative_dir] or {}) do
+    if kept_is_dir[entry.name] ~= entry.is_dir then  -- gone, or a file replaced by a directory or the reverse
+      local child = join(relative_dir, entry.name)
+      if entry.is_dir then drop_dir(child) else index.items[child] = nil end
+    end
+  end
+  index.dirs[relative_dir] = kept
+  return ok
+end
+
+local function rescan(relative_dir, recursive)
+  -- Rebuilds the rule stack down to that directory: its ancestors are indexed, so none of them is ignored
+  local stack, components = ignore.root_stack(index.directory)
+  local depth, path = #components, index.directory
+  for name in relative_dir:gmatch("[^/]+") do
+    ignore.push_directory(stack, path, depth, rule_file_names)  -- missing rule files are skipped
+    depth = depth + 1
+    components[depth], path = name, path .. "/" .. name
+  end
+  return scan_dir({ stack = stack, components = components, files = 0, dirs = 0, watch = true }, relative_dir, depth,
+    recursive)
+end
+
+local function build_list()
+  -- Returns false if the tree holds too many files, the list is then truncated
+  local list = {}
+  local function add(relative_dir)
+    for _, entry in ipairs(index.dirs[relative_dir] or {}) do
+      if #list >= MAX_FILES then return end
+      local path = join(relative_dir, entry.name)
+      if entry.is_dir then add(path)
       else
-        local file_path = relative_path == "" and item or relative_path .. "/" .. item
-        if not is_symlink(item_path) then table.insert(files, file_path) end
+        local item = index.items[path]
+        if not item then item = fuzzy.prepare({ file = path, printed_path = path }); index.items[path] = item end
+        list[#list + 1] = item
       end
-      if #files >= max_files then vim.notify("Too many files in tree", vim.log.levels.WARN); break end
     end
   end
+  add("")
+  index.list = list
+  return #list < MAX_FILES
+end
+
+local function stop_watching()
+  watcher.stop()
+  if index then index.live = false end
+end
 
-  scan_dir(".", "")
-  local return_table = {}
-  for _, file in ipairs(files) do table.insert(return_table, { file = file }) end
-  return return_table
+local function apply_changes(changes)
+  -- Called by the watcher with coalesced changes, see watcher.lua
+  if not index or not index.live then return end
+  local rescans = {}  -- relative dir -> recursive
+  for dir, change in pairs(changes) do
+    local relative_dir = dir == index.directory and "" or dir:sub(#index.directory + 2)
+    if index.dirs[relative_dir] then
+      local needed, recursive = change.all, false
+      for name, renamed in pairs(change.names) do
+        if rule_file_names[name] then needed, recursive = true, true  -- what is ignored below may have changed
+        elseif renamed then needed = true end
+        content.invalidate(dir .. "/" .. name)
+        trigram.invalidate(dir .. "/" .. name)
+      end
+      if needed then rescans[relative_dir] = rescans[relative_dir] or recursive end
+      M.generation = M.generation + 1
+    end
+  end
+  local ordered = vim.tbl_keys(rescans)
+  table.sort(ordered)  -- parents first, a directory they dropped is not rescanned
+  local ok = true
+  for _, relative_dir in ipairs(ordered) do
+    if index.dirs[relative_dir] then ok = rescan(relative_dir, rescans[relative_dir]) and ok end
+  end
+  if #ordered > 0 then ok = build_list() and ok end
+  if not ok then stop_watching() end
+end
+
+function M.get_files()
+  -- Returns the prepared items of the tree, and whether they or their contents changed since the last call
+  -- Only rescans if the index isn't kept live for the current directory
+  local directory = vim.uv.cwd()
+  if not (index and index.live and index.directory == directory) then
+    stop_watching()
+    local watch = not over_budget[directory]
+    index = { directory = directory, dirs = {}, items = {}, list = {}, live = watch }
+    if watch then watcher.start(apply_changes) end
+    local stack, components = ignore.root_stack(directory)
+    local scan = { stack = stack, components = components, files = 0, dirs = 0, watch = watch }
+    local ok = scan_dir(scan, "", #components, false)
+    if not build_list() then vim.notify("Too many files in tree", vim.log.levels.WARN) end
+    over_budget[directory] = not ok or nil  -- unwatched, ok means it fits: watched from the next opening
+    if watch and not ok then stop_watching() end
+    M.generation = M.generation + 1
+  end
+  local changed = reported_generation ~= M.generation
+  reported_generation = M.generation
+  return index.list, changed
 end
+M.get_files = stats.wrap("file-finder.get_files", M.get_files)
 
 return M
@@ -0,0 +1,91 @@
+-- fzy-style fuzzy matching of paths: the query chars must appear in order, matches right after a path separator,
+-- a word separator, a dot or on a camelCase hump get a bonus, consecutive matches are rewarded and gaps penalized
+-- Everything depending only on the path is precomputed once by prepare, when the path is scanned:
+-- - lower: lowercased path, also used by the plain case-insensitive matching
+-- - bonus: one char per path char telling the bonus of a match there, decoded with a byte lookup
+-- - basename_offset: where the basename starts, a query also matching inside the basename alone gets a bonus
+-- Pure Lua, no `vim`, same as matcher.lua
+
+local M = {}
+
+local byte = string.byte
+local max = math.max
+local exp = math.exp
+
+local SCORE_MIN = -math.huge
+local SCORE_GAP_LEADING = -0.005
+local SCORE_GAP_TRAILING = -0.005
+local SCORE_GAP_INNER = -0.01
+local SCORE_MATCH_CONSECUTIVE = 1.0
+local SCORE_BASENAME = 0.5
+local MAX_PATH_LENGTH = 1024  -- only the beginning of longer paths is fuzzy matched, as in fzy
+
+local BONUS = { [byte("0")] = 0, [byte("s")] = 0.9, [byte("w")] = 0.8, [byte("d")] = 0.6, [byte("c")] = 0.7 }
+local BONUS_AFTER = { [byte("/")] = byte("s"), [byte("-")] = byte("w"), [byte("_")] = byte("w"), [byte(" ")] = byte("w"),
+                      [byte(".")] = byte("d") }
+local NO_BONUS, CAMEL_BONUS = byte("0"), byte("c")
+
+function M.prepare(item)
+  local path = item.printed_path
+  local codes, previous = {}, byte("/")  -- the first char is scored as if right after a slash
+  for i = 1, math.min(#path, MAX_PATH_LENGTH) do
+    local current = byte(path, i)
+    local code = BONUS_AFTER[previous]
+    if not code then
+      local camel_hump = previous >= 97 and previous <= 122 and current >= 65 and current <= 90
+      code = camel_hump and CAMEL_BONUS or NO_BONUS
+    end
+    codes[i], previous = code, current
+  end
+  local reversed_slash_pos = path:reverse():find("/", 1, true)
+  item.lower = path:lower()
+  item.bonus = string.char(unpack(codes))
+  item.basename_offset = reversed_slash_pos and #path - reversed_slash_pos + 2 or 1
+  return item
+end
+
+local function is_subsequence(low_pattern, low_str, from)
+  local position = from
+  for i = 1, #low_pattern do
+    position = low_str:find(low_pattern:sub(i, i), position, true)
+    if not position then return false end
+    position = position + 1
+  end
+  return true
+end
+
+function M.score(low_pattern, item)
+  -- Returns a score in ]0, 1[ if low_pattern fuzzy-matches the prepared item, 0 otherwise
+  local low_str, bonus = item.lower, item.bonus
+  local n, m = #low_pattern, #bonus
+  if n == 0 or n > m or not is_subsequence(low_pattern, low_str, 1) then return 0 end
+  local previous_d, previous_m, d, mm = {}, {}, {}, {}
+  for i = 1, n do
+    local needle_char, prev_score = byte(low_pattern, i), SCORE_MIN
+    local gap = i == n and SCORE_GAP_TRAILING or SCORE_GAP_INNER
+    for j = 1, m do
+      if byte(low_str, j) == needle_char then
+        local score = SCORE_MIN
+        local char_bonus = BONUS[byte(bonus, j)]
+        if i == 1 then
+          score = (j - 1) * SCORE_GAP_LEADING + char_bonus
+        elseif j > 1 then
+          score = max(previous_m[j - 1] + char_bonus, previous_d[j - 1] + SCORE_MATCH_CONSECUTIVE)
+        end
+        d[j] = score
+        prev_score = max(score, prev_score + gap)
+      else
+        d[j] = SCORE_MIN
+        prev_score = prev_score + gap
+      end
+      mm[j] = prev_score
+    end
+    previous_d, previous_m, d, mm = d, mm, previous_d, previous_m
+  end
+  local score = previous_m[m]
+  if score == SCORE_MIN then return 0 end
+  if is_subsequence(low_pattern, low_str, item.basename_offset) then score = score + SCORE_BASENAME end
+  return max(1 / (1 + exp(-score)), 1e-9)  -- squashed below the plain matching tiers, keeps the order
+end
+
+return M
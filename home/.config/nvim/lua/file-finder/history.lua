@@ -1,24 +1,50 @@
 -- Load and write history files
--- An history file must start by: C4NV-history-v0.0.0\0\n
--- An history file then contains entries separated by \0\n
+-- An history file must start by: C4NV-history-v0.1.0\0\n
+-- An history file then contains entries, each one terminated by \0\n, appended in opening order (oldest first)
 -- An entry contains parts beginning by an \0 and another char defining the type of the part, for now there are 2 parts:
 -- 1: the full path of an opened file
 -- 2: the full path of the current directory at the time the file was opened - as it is possible to open files outside
 -- That way, when viewing the history, it is possible to either match:
 -- - files that are inside the current directory
 -- - files that were opened from a directory that is (or is contained in) the current directory - could be useful again
--- When saving, we can remove file duplicates if the one we are saving is from a cd that is or contains the previous cd
--- WARNING Saving a file creates a temporary file.tmp
+-- Opening a file only appends an entry with a single O_APPEND write, so concurrent instances never clobber each other
+-- Readers remove duplicates: an entry is dropped if the same file was opened later from a cd that is or contains its cd
+-- The file is compacted in the background (deduped, limited, rewritten) once it doubled, under a lock file:
+-- - the compactor copies entries appended meanwhile, before and after renaming the compacted file over the history
+-- - an appender checks its file is still the history after writing, and appends again to the new one if it isn't
+-- - so no entry is lost, some may be duplicated, which readers handle anyway
+-- Readers share an in-memory copy validated by a stat: a grown file is only parsed from where it was left, the new
+-- entries are applied on top of what was already deduped, and a trie over directory components gives the entries
+-- relevant to a current directory without scanning them all
+-- Files in the previous C4NV-history-v0.0.0\0\n format (newest first, rewritten on each opening) are migrated under the
+-- lock: while another instance holds it, entries wait in memory and the migration is retried later
+-- WARNING Compacting creates the temporary file.tmp and the lock file.lock
 
 local M = {}
 
 local config = require("file-finder.config")
+local stats = require("plugin-stats")
 
-local FILE_HEADER = "C4NV-history-v0.0.0\0\n" -- KISS for now
+local uv = vim.uv
+
+local FILE_HEADER = "C4NV-history-v0.1.0\0\n"
+local LEGACY_FILE_HEADER = "C4NV-history-v0.0.0\0\n" -- same length as FILE_HEADER
+local ENTRY_END = "\0\n"
+local LOCK_STALE_SECONDS = 60 -- a lock older than this was left by a crashed instance
+local MAX_APPEND_ATTEMPTS = 3
+local MIGRATION_RETRY_MS = 1000
+local MAX_MIGRATION_RETRIES = 2 * LOCK_STALE_SECONDS  -- so even a stale lock is recovered meanwhile
+local LOCKED = "history is locked by another instance"
 
 local PART_FILEPATH = "1"
 local PART_CURRENT_DIR = "2"
 
+local compaction_baselines = {}  -- history file path -> { ino, size } when last compacted or first seen
+local checked_inodes = {}  -- history file path -> inode known to start with FILE_HEADER, no need to read it again
+local waiting_migration = {}  -- history file path -> { retries, entries = { encoded entries } }
+local cache = nil  -- see cached_history
+M.generation = 0  -- bumped whenever the cached history changes
+
 local function is_valid_part_char(char) return char == PART_FILEPATH or char == PART_CURRENT_DIR end
 
 local function load_chunk(chunk_data)
@@ -39,94 +65,384 @@ local function load_chunk(chunk_data)
   if next(chunk_table) == nil then return nil, "empty chunk" end return chunk_table, nil
 end
 
-function M.load_history(filename)
-  -- An history file that doesn't start with C4NV-history-v0.0.0\0\n can be considered as empty
-  -- Ignore if there is no history, invalid entries are simply ignored, but a file must start with the correct header
-  -- Now start by reading file
-  local file = io.open(filename, "rb")
-  if not file then return {}, nil end  -- ignore if no history
-  local content = file:read("*all")
-  file:close()
-  local chunks = {}
-  if string.sub(content, 1, #FILE_HEADER) ~= FILE_HEADER then return nil, "no correct header" end
-  -- Split content by \0\n (null byte followed by newline), start just after the len of the accepted header
-  local chunk_start = #FILE_HEADER + 1
+function M.parse_entries(content, chunk_start, entries, accept_unterminated)
+  -- Appends the valid entries found in content from chunk_start to entries, invalid ones are simply ignored
+  -- Returns the position right after the last \0\n: an unterminated entry may still be being written, so it is only
+  -- accepted with accept_unterminated (the legacy format didn't terminate the last entry)
   while chunk_start <= #content do
-    local chunk_end = content:find("\0\n", chunk_start) or #content + 1 -- works whether the file ends with \0\n
-    local chunk_data = content:sub(chunk_start, chunk_end - 1)
-    local chunk_table, error_message = load_chunk(chunk_data)
+    local chunk_end = content:find(ENTRY_END, chunk_start, true)
+    if not chunk_end and not accept_unterminated then break end
+    chunk_end = chunk_end or #content + 1
+    local chunk_table, error_message = load_chunk(content:sub(chunk_start, chunk_end - 1))
     local chunk_verified = not error_message and chunk_table and next(chunk_table)
     chunk_verified = chunk_verified and chunk_table[PART_FILEPATH] and chunk_table[PART_CURRENT_DIR]
-    if chunk_verified then table.insert(chunks, chunk_table) end
-    chunk_start = chunk_end + 2 -- search new chunk past \0\n
+    if chunk_verified then
+      if chunk_table[PART_CURRENT_DIR]:sub(-1) ~= "/" then
+        chunk_table[PART_CURRENT_DIR] = chunk_table[PART_CURRENT_DIR] .. "/"
+      end
+      table.insert(entries, chunk_table)
+    end
+    chunk_start = chunk_end + #ENTRY_END -- search new chunk past \0\n
+  end
+  return math.min(chunk_start, #content + 1)
+end
+
+function M.latest_first(entries)
+  -- Takes entries oldest first, returns them newest first without the duplicates explained in the top comment
+  local result, newer_dirs = {}, {}
+  for i = #entries, 1, -1 do
+    local entry = entries[i]
+    local file_path, current_directory = entry[PART_FILEPATH], entry[PART_CURRENT_DIR]
+    local dirs = newer_dirs[file_path]
+    local superseded = false
+    if not dirs then dirs = {}; newer_dirs[file_path] = dirs end
+    for _, dir in ipairs(dirs) do
+      if current_directory:sub(1, #dir) == dir then superseded = true; break end
+    end
+    if not superseded then table.insert(result, entry); table.insert(dirs, current_directory) end
+  end
+  return result
+end
+
+local function read_from(fd, offset)
+  -- Returns the content of the opened file from offset to its current end
+  local stat = uv.fs_fstat(fd)
+  if not stat or stat.size <= offset then return "" end
+  return uv.fs_read(fd, stat.size - offset, offset) or ""
+end
+
+local function add_to_trie(node, path, list_name, index, is_directory)
+  -- Adds index to the nodes of the directories containing path, and to its own node if it is a directory
+  local list = node[list_name]
+  list[#list + 1] = index
+  for component, separator in path:gmatch("([^/]+)(/?)") do
+    if separator == "" and not is_directory then return end  -- last component of a file path
+    local child = node.children[component]
+    if not child then child = { children = {}, files = {}, dirs = {} }; node.children[component] = child end
+    node = child
+    list = node[list_name]
+    list[#list + 1] = index
+  end
+end
+
+local function apply_entries(history, first)
+  -- Applies history.entries from first on, oldest first, the way latest_first dedupes: each new entry supersedes the
+  -- live entries of its file whose cd is or is inside its cd, which stay superseded whatever comes next
+  -- The trie has one node per directory component, listing the indexes of the entries whose file is inside that
+  -- directory (files) or whose cd is or is inside it (dirs) - increasing, since entries are only appended
+  local entries, superseded, live = history.entries, history.superseded, history.live
+  for index = first, #entries do
+    local entry = entries[index]
+    local file_path, current_directory = entry[PART_FILEPATH], entry[PART_CURRENT_DIR]
+    local live_of_file = live[file_path] or {}
+    live[file_path] = live_of_file
+    for i = #live_of_file, 1, -1 do
+      local older = live_of_file[i]
+      if entries[older][PART_CURRENT_DIR]:sub(1, #current_directory) == current_directory then
+        superseded[older] = true
+        table.remove(live_of_file, i)
+      end
+    end
+    live_of_file[#live_of_file + 1] = index
+    add_to_trie(history.trie, file_path, "files", index, false)
+    add_to_trie(history.trie, current_directory, "dirs", index, true)
+  end
+end
+
+local function same_stat(cached, stat)
+  return cached.ino == stat.ino and cached.size == stat.size
+     and cached.mtime_sec == stat.mtime.sec and cached.mtime_nsec == stat.mtime.nsec
+end
+
+local function read_entries(filename, previous)
+  -- Returns stat, header, entries (oldest first), consumed, error_message - parsing only what was appended since
+  -- previous if it was read from the same file in the current format
+  local fd = uv.fs_open(filename, "r", 0)
+  if not fd then return nil, nil, {}, 1, nil end  -- ignore if no history
+  local stat = uv.fs_fstat(fd)
+  local entries, consumed, header, error_message = {}, 1, nil, nil
+  if stat and previous and previous.ino == stat.ino and previous.header == FILE_HEADER and stat.size >= previous.size then
+    local tail = read_from(fd, previous.consumed - 1)
+    header, entries = FILE_HEADER, previous.entries
+    consumed = previous.consumed + M.parse_entries(tail, 1, entries) - 1
+  elseif stat then
+    local content = read_from(fd, 0)
+    header = content:sub(1, #FILE_HEADER)
+    if header == FILE_HEADER then
+      consumed = M.parse_entries(content, #FILE_HEADER + 1, entries)
+    elseif header == LEGACY_FILE_HEADER then  -- newest first
+      local newest_first = {}
+      M.parse_entries(content, #LEGACY_FILE_HEADER + 1, newest_first, true)
+      for i = #newest_first, 1, -1 do table.insert(entries, newest_first[i]) end
+    else
+      error_message = "no correct header"
+    end
+  end
+  uv.fs_close(fd)
+  return stat, header, entries, consumed, error_message
+end
+
+function M.cached_history(filename)
+  -- Returns the in-memory history of filename, error_message - validated by a stat, re-read only if the file changed
+  -- { entries (oldest first), superseded = { index -> true }, live = { file path -> { indexes } }, trie, views }
+  -- (see apply_entries for the trie and load_history_for_ui for the views)
+  local stat = uv.fs_stat(filename)
+  if cache and cache.filename == filename then
+    if stat and cache.ino and same_stat(cache, stat) then return cache, nil end
+    if not stat and not cache.ino then return cache, nil end
+  end
+  local previous = cache and cache.filename == filename and cache or nil
+  local file_stat, header, entries, consumed, error_message = read_entries(filename, previous)
+  if error_message then cache = nil; return nil, error_message end
+  local history, first = previous, previous and previous.applied + 1
+  if not previous or entries ~= previous.entries then  -- read again from the start, not a tail
+    local trie = { children = {}, files = {}, dirs = {} }
+    history, first = { entries = entries, superseded = {}, live = {}, trie = trie }, 1
+  end
+  apply_entries(history, first)
+  history.filename, history.header, history.consumed = filename, header, consumed
+  history.applied, history.views = #entries, {}
+  history.ino, history.size = file_stat and file_stat.ino, file_stat and file_stat.size
+  history.mtime_sec, history.mtime_nsec = file_stat and file_stat.mtime.sec, file_stat and file_stat.mtime.nsec
+  M.generation = M.generation + 1
+  cache = history
+  return cache, nil
+end
+
+function M.load_history(filename)
+  -- Returns entries newest first, error_message
+  -- An history file that doesn't start with a known header can be considered as empty
+  -- Ignore if there is no history, invalid entries are simply ignored, but a file must start with the correct header
+  local history, error_message = M.cached_history(filename)
+  if not history then return nil, error_message end
+  local latest = {}
+  for index = #history.entries, 1, -1 do
+    if not history.superseded[index] then table.insert(latest, history.entries[index]) end
+  end
+  return latest, nil
+end
+M.load_history = stats.wrap("file-finder.load_history", M.load_history)
+
+local function merge_indexes(a, b)
+  -- Both arrays are increasing, returns their increasing union
+  local result, i, j = {}, 1, 1
+  while i <= #a or j <= #b do
+    local x, y = a[i], b[j]
+    if y == nil or (x ~= nil and x < y) then result[#result + 1] = x; i = i + 1
+    elseif x == nil or y < x then result[#result + 1] = y; j = j + 1
+    else result[#result + 1] = x; i = i + 1; j = j + 1 end
   end
-  return chunks, nil
+  return result
 end
 
 function M.load_history_for_ui()
-  -- Returns table_to_print, error_message
+  -- Returns table_to_print, error_message, ranks (file path relative to the current directory if inside it -> rank)
+  -- Cached until the history changes, per current directory: callers may add fields to the items, nothing else
   local filename, current_directory, limit = config.data_file, config.current_directory, config.MAX_PRINTABLE_FILES
-  local loaded_table, error_message = M.load_history(filename)
-  if loaded_table == nil or error_message then return nil, error_message end
-  local result = {}
+  local history, error_message = M.cached_history(filename)
+  if not history then return nil, error_message end
+  local view = history.views[current_directory]
+  if view then return view.items, nil, view.ranks end
+  local node = history.trie
+  for component in current_directory:gmatch("[^/]+") do
+    node = node.children[component]
+    if not node then break end
+  end
+  local result, ranks = {}, {}
   local set_of_known_paths = {}
-  for _, entry in ipairs(loaded_table) do
-    if #result >= limit then return result, nil end
-    if entry[PART_CURRENT_DIR]:sub(-1) ~= "/" then entry[PART_CURRENT_DIR] = entry[PART_CURRENT_DIR] .. "/" end
-    local entry_cd_match = entry[PART_CURRENT_DIR]:sub(1, #current_directory) == current_directory
-    local entry_file_match = entry[PART_FILEPATH]:sub(1, #current_directory) == current_directory
-    if (entry_cd_match or entry_file_match) and not set_of_known_paths[entry[PART_FILEPATH]] then
-      table.insert(result, { file = entry[PART_FILEPATH], matched_lines = {} })
-      set_of_known_paths[entry[PART_FILEPATH]] = true
+  local indexes = node and merge_indexes(node.files, node.dirs) or {}
+  for i = #indexes, 1, -1 do  -- newest first
+    if #result >= limit then break end
+    local file_path = not history.superseded[indexes[i]] and history.entries[indexes[i]][PART_FILEPATH]
+    if file_path and not set_of_known_paths[file_path] then
+      table.insert(result, { file = file_path, matched_lines = {} })
+      set_of_known_paths[file_path] = true
+      local in_current_directory = file_path:sub(1, #current_directory) == current_directory
+      ranks[in_current_directory and file_path:sub(#current_directory + 1) or file_path] = #result
     end
   end
-  return result, nil
-end
-
-local function write_history(file_path, chunks)
-  -- Write the history file, returns did_work, optional_error_message
-  -- Use this function on a non-existing file path, then move to your existing history to avoid race conditions
-  local last_err, file, checked_err, _ -- last_err is unusual but cheap way to ensure the file is always closed
-  file, checked_err = io.open(file_path, "wx") -- fails if not creating - we want that to avoid race conditions
-  if checked_err or not file then return nil, "could not create the .tmp file" end
-  _, checked_err = file:write(FILE_HEADER)
-  if checked_err then last_err = checked_err end
-  for i, chunk in ipairs(chunks) do
-    for key, value in pairs(chunk) do
-      if type(key) == "string" and #key == 1 then _, checked_err = file:write("\0" .. key .. value) end
-      if checked_err then last_err = checked_err end
+  history.views[current_directory] = { items = result, ranks = ranks }
+  return result, nil, ranks
+end
+M.load_history_for_ui = stats.wrap("file-finder.load_history_for_ui", M.load_history_for_ui)
+
+local function encode_entry(entry)
+  return "\0" .. PART_FILEPATH .. entry[PART_FILEPATH] .. "\0" .. PART_CURRENT_DIR .. entry[PART_CURRENT_DIR] .. ENTRY_END
+end
+
+local function write_new_file(file_path, data)
+  -- Write a file that must not exist yet - we want that to avoid race conditions, returns did_work, error_message
+  local fd, error_message = uv.fs_open(file_path, "wx", 420)
+  if not fd then return nil, error_message end
+  local written, write_error = uv.fs_write(fd, data)
+  local closed, close_error = uv.fs_close(fd)
+  if not written or written ~= #data then return nil, write_error or "short write" end
+  if not closed then return nil, close_error end
+  return true, nil
+end
+
+local function acquire_lock(lock_path)
+  local fd = uv.fs_open(lock_path, "wx", 420)
+  if not fd then
+    local stat = uv.fs_stat(lock_path)
+    if not stat or os.time() - stat.mtime.sec < LOCK_STALE_SECONDS then return false end
+    uv.fs_unlink(lock_path)  -- left by a crashed instance
+    fd = uv.fs_open(lock_path, "wx", 420)
+    if not fd then return false end
+  end
+  uv.fs_close(fd)
+  return true
+end
+
+local function with_lock(history_file_path, callback)
+  -- Returns the results of callback if the lock could be taken, else nil, error_message
+  local lock_path = history_file_path .. ".lock"
+  if not acquire_lock(lock_path) then return nil, LOCKED end
+  local ok, did_work, error_message = pcall(callback)
+  uv.fs_unlink(lock_path)
+  if not ok then return nil, did_work end
+  return did_work, error_message
+end
+
+local function rewrite_opened(fd, history_file_path, limit)
+  local content = read_from(fd, 0)
+  local header, entries, copied = content:sub(1, #FILE_HEADER), {}, #content
+  if header == LEGACY_FILE_HEADER then  -- only rewritten whole by older versions, nothing is appended to it
+    M.parse_entries(content, #LEGACY_FILE_HEADER + 1, entries, true)
+    local oldest_first = {}
+    for i = #entries, 1, -1 do table.insert(oldest_first, entries[i]) end
+    entries = M.latest_first(oldest_first)  -- already deduped, keeps the same order
+  elseif header == FILE_HEADER then
+    copied = M.parse_entries(content, #FILE_HEADER + 1, entries) - 1
+    entries = M.latest_first(entries)
+  else
+    return nil, "no correct header"
+  end
+  local parts = { FILE_HEADER }
+  for i = math.min(#entries, limit), 1, -1 do table.insert(parts, encode_entry(entries[i])) end
+  local tail = read_from(fd, copied)  -- appended since the history was read
+  table.insert(parts, tail)
+  copied = copied + #tail
+  local tmp_path = history_file_path .. ".tmp"
+  uv.fs_unlink(tmp_path)  -- only left by a crashed compaction, we hold the lock
+  local success, error_message = write_new_file(tmp_path, table.concat(parts))
+  if success then success, error_message = uv.fs_rename(tmp_path, history_file_path) end
+  if not success then uv.fs_unlink(tmp_path); return nil, error_message end
+  tail = read_from(fd, copied)  -- appended before the rename, appenders handle what comes after
+  if #tail > 0 then
+    local out = uv.fs_open(history_file_path, "a", 420)
+    if out then uv.fs_write(out, tail); uv.fs_close(out) end
+  end
+  local stat = uv.fs_stat(history_file_path)
+  if stat then compaction_baselines[history_file_path] = { ino = stat.ino, size = stat.size } end
+  return true, nil
+end
+
+local function rewrite(history_file_path, limit)
+  -- Writes the deduped and limited history in a .tmp file renamed over the history, returns did_work, error_message
+  return with_lock(history_file_path, function()
+    local fd, error_message = uv.fs_open(history_file_path, "r", 0)
+    if not fd then return nil, error_message end
+    local ok, did_work, rewrite_error = pcall(rewrite_opened, fd, history_file_path, limit)
+    uv.fs_close(fd)
+    if not ok then return nil, did_work end
+    return did_work, rewrite_error
+  end)
+end
+
+local function ensure_history_file(history_file_path, limit)
+  -- Creates the history file with its header if needed, or migrates it from the legacy format
+  -- Returns success, error_message - the header is only read once per inode
+  local stat = uv.fs_stat(history_file_path)
+  if stat and checked_inodes[history_file_path] == stat.ino then return true, nil end
+  local file = io.open(history_file_path, "rb")
+  if file then
+    local header = file:read(#FILE_HEADER)
+    file:close()
+    if header ~= FILE_HEADER and header ~= LEGACY_FILE_HEADER then return false, "no correct header" end
+    if header == LEGACY_FILE_HEADER then
+      local success, error_message = rewrite(history_file_path, limit)
+      if not success then return false, error_message end
+      stat = uv.fs_stat(history_file_path)  -- the migrated file
     end
-    if i < #chunks then file:write("\0\n") end  -- chunk separator (except after the last chunk, load_history is ok)
+    if stat then checked_inodes[history_file_path] = stat.ino end
+    return true, nil
   end
-  _, checked_err = file:close()
-  if checked_err then last_err = checked_err end
-  if last_err then return nil, last_err end
+  local tmp_path = history_file_path .. "." .. vim.fn.getpid() .. ".new"
+  local success, error_message = write_new_file(tmp_path, FILE_HEADER)
+  if not success then return false, error_message end
+  uv.fs_link(tmp_path, history_file_path)  -- fails if another instance created it meanwhile, which is fine
+  uv.fs_unlink(tmp_path)
   return true, nil
 end
 
+local function maybe_compact(history_file_path, stat, limit)
+  -- Schedules a compaction once the file doubled since it was last compacted or first seen by this instance
+  local baseline = compaction_baselines[history_file_path]
+  if not baseline or baseline.ino ~= stat.ino then
+    compaction_baselines[history_file_path] = { ino = stat.ino, size = stat.size }
+    return
+  end
+  if stat.size < math.max(config.HISTORY_COMPACT_MIN_BYTES, 2 * baseline.size) then return end
+  baseline.size = stat.size  -- don't schedule again until it doubles again, whether this one succeeds or not
+  vim.defer_fn(function() rewrite(history_file_path, limit) end, config.HISTORY_COMPACT_DELAY_MS)
+end
+
+local append_entry
+
+local function retry_migration(history_file_path, limit)
+  -- Appends the entries that waited for the legacy history to be migrated, in order, or waits again
+  local waiting = waiting_migration[history_file_path]
+  waiting_migration[history_file_path] = nil
+  for i, entry in ipairs(waiting.entries) do
+    local success, error_message = append_entry(history_file_path, entry, limit)
+    if not success and error_message == LOCKED and waiting.retries < MAX_MIGRATION_RETRIES then
+      waiting_migration[history_file_path] = { retries = waiting.retries + 1, entries = { unpack(waiting.entries, i) } }
+      vim.defer_fn(function() retry_migration(history_file_path, limit) end, MIGRATION_RETRY_MS)
+      return
+    end
+  end
+end
+
+append_entry = function(history_file_path, entry, limit)
+  -- Appends an encoded entry, returns success, error_message
+  local waiting = waiting_migration[history_file_path]
+  if waiting then table.insert(waiting.entries, entry); return true, nil end  -- after those already waiting
+  local error_message = nil
+  for _ = 1, MAX_APPEND_ATTEMPTS do
+    local success
+    success, error_message = ensure_history_file(history_file_path, limit)
+    if not success and error_message == LOCKED then  -- migrating the legacy file, another instance holds the lock
+      waiting_migration[history_file_path] = { retries = 0, entries = { entry } }
+      vim.defer_fn(function() retry_migration(history_file_path, limit) end, MIGRATION_RETRY_MS)
+      return true, nil
+    end
+    if not success then return false, error_message end
+    local fd
+    fd, error_message = uv.fs_open(history_file_path, "a", 420)
+    if not fd then return false, error_message end
+    local written, write_error = uv.fs_write(fd, entry)  -- a single write, O_APPEND keeps it whole
+    local written_stat = uv.fs_fstat(fd)
+    uv.fs_close(fd)
+    if not written then return false, write_error end
+    local current_stat = uv.fs_stat(history_file_path)
+    if current_stat and written_stat and current_stat.ino == written_stat.ino then
+      maybe_compact(history_file_path, current_stat, limit)
+      return true, nil
+    end
+    error_message = "history file replaced while appending"  -- compacted meanwhile, the entry may be lost there
+  end
+  return false, error_message
+end
+
 function M.append_to_history(history_file_path, added_to_history_file_path, current_directory, limit)
-  -- WARNING Saving a file creates a temporary file.tmp
-  -- Removes duplicates as explained in the top comment
-  -- Returns success, error_message
+  -- Appends an entry, duplicates are removed by readers and compaction as explained in the top comment
+  -- Returns success, error_message - success may mean the entry waits for the legacy history to be migrated
   if added_to_history_file_path:find("\0", 1, true) then return false, "can't handle \\0 in file name" end
   if current_directory:find("\0", 1, true) then return false, "can't handle \\0 in current directory" end
-  local current_history, error_msg = M.load_history(history_file_path)
-  if error_msg then return false, error_msg end
-  local new_history = {}
-  table.insert(new_history, { [PART_FILEPATH] = added_to_history_file_path, [PART_CURRENT_DIR] = current_directory })
-  for _, entry in ipairs(current_history) do
-    if entry[PART_CURRENT_DIR]:sub(-1) ~= "/" then entry[PART_CURRENT_DIR] = entry[PART_CURRENT_DIR] .. "/" end
-    local entry_not_in_current_dir = entry[PART_CURRENT_DIR]:sub(1, #current_directory) ~= current_directory
-    if entry[PART_FILEPATH] ~= added_to_history_file_path or entry_not_in_current_dir then
-      table.insert(new_history, entry)
-    end
-  end
-  while #new_history > limit do table.remove(new_history) end -- enforce limit
-  local success, error_message = write_history(history_file_path .. ".tmp", new_history)
-  if not success or error_message then return false, error_message end
-  local success, error_message = os.rename(history_file_path .. ".tmp", history_file_path)
-  if not success or error_message then return false, error_message end
-  return true, nil
+  if current_directory:sub(-1) ~= "/" then current_directory = current_directory .. "/" end
+  local entry = encode_entry({ [PART_FILEPATH] = added_to_history_file_path, [PART_CURRENT_DIR] = current_directory })
+  return append_entry(history_file_path, entry, limit)
 end
 
 return M
@@ -0,0 +1,187 @@
+-- .gitignore-style rules for the file tree scan
+-- - Rule files are .gitignore and .ignore in each directory, plus .git/info/exclude at the repository root; when the
+--   current directory is inside a repository, the rule files of its parents up to the root apply too
+-- - A rule file is compiled once into matchers (literal or Lua pattern per path segment, `**` handled by the
+--   segment matching), cached by path, mtime and size
+-- - Rule sets are stacked while descending, lowest precedence first: config.IGNORED_DIRS, .git/info/exclude, then
+--   per directory .gitignore and .ignore. The last matching rule wins, so `!negation` works - but never inside an
+--   ignored directory, which is not entered at all, exactly as git
+-- - A rule set knows the depth of its directory, paths are arrays of components from the repository root, so a
+--   rule is matched against the components below its own directory
+
+local M = {}
+
+local config = require("file-finder.config")
+
+local uv = vim.uv
+
+local compiled_files = {}  -- rule file path -> { mtime_sec, mtime_nsec, size, rules }
+
+local function escape(char) return (char:gsub("[%^%$%(%)%%%.%[%]%*%+%-%?]", "%%%0")) end
+
+local function compile_segment(glob)
+  -- Returns a matcher for a glob without slash: { globstar = true }, { literal = name } or { pattern = lua_pattern }
+  if glob == "**" then return { globstar = true } end
+  if not glob:find("[%*%?%[\\]") then return { literal = glob } end
+  local parts, i = { "^" }, 1
+  while i <= #glob do
+    local char = glob:sub(i, i)
+    if char == "\\" and i < #glob then
+      i = i + 1
+      table.insert(parts, escape(glob:sub(i, i)))
+    elseif char == "*" then
+      table.insert(parts, ".*")  -- a segment has no slash, and `**` inside a segment is just `*`
+    elseif char == "?" then
+      table.insert(parts, ".")
+    elseif char == "[" and glob:find("]", i + 2, true) then  -- a `]` right after `[` is part of the set
+      local close = glob:find("]", i + 2, true)
+      local set = glob:sub(i + 1, close - 1)
+      local negated = set:sub(1, 1) == "!" or set:sub(1, 1) == "^"
+      if negated then set = set:sub(2) end
+      table.insert(parts, "[" .. (negated and "^" or "") .. set:gsub("%%", "%%%%") .. "]")
+      i = close
+    else
+      table.insert(parts, escape(char))
+    end
+    i = i + 1
+  end
+  table.insert(parts, "$")
+  local pattern = table.concat(parts)
+  if not pcall(string.find, "", pattern) then return nil end  -- malformed set, ignore the whole rule
+  return { pattern = pattern }
+end
+
+local function compile_line(line)
+  -- Returns a rule { negated, dir_only, anchored, segments } or nil for blank lines, comments and invalid rules
+  line = line:gsub("\r$", "")
+  if line == "" or line:sub(1, 1) == "#" then return nil end
+  local negated = line:sub(1, 1) == "!"
+  if negated then line = line:sub(2)
+  elseif line:sub(1, 2) == "\\#" or line:sub(1, 2) == "\\!" then line = line:sub(2) end
+  line = line:gsub("([^\\]) +$", "%1")  -- trailing spaces are ignored unless escaped
+  local dir_only = line:sub(-1) == "/"
+  if dir_only then line = line:sub(1, -2) end
+  if line == "" or line:match("^ +$") then return nil end
+  local anchored = line:find("/", 1, true) ~= nil  -- a slash anywhere but at the end anchors to the rule file dir
+  local segments = {}
+  for glob in line:gmatch("[^/]+") do
+    local segment = compile_segment(glob)
+    if not segment then return nil end
+    table.insert(segments, segment)
+  end
+  if #segments == 0 then return nil end
+  return { negated = negated, dir_only = dir_only, anchored = anchored, segments = segments }
+end
+
+function M.compile(text)
+  local rules = {}
+  for line in (text .. "\n"):gmatch("([^\n]*)\n") do
+    local rule = compile_line(line)
+    if rule then table.insert(rules, rule) end
+  end
+  return rules
+end
+
+local function load_rules(path)
+  -- Returns the compiled rules of a rule file, or nil if it can't be read
+  local stat = uv.fs_stat(path)
+  if not stat or stat.type ~= "file" then compiled_files[path] = nil; return nil end
+  local cached = compiled_files[path]
+  if cached and cached.mtime_sec == stat.mtime.sec and cached.mtime_nsec == stat.mtime.nsec
+     and cached.size == stat.size then
+    return cached.rules
+  end
+  local file = io.open(path, "rb")
+  if not file then return nil end
+  local rules = M.compile(file:read("*all") or "")
+  file:close()
+  compiled_files[path] = { mtime_sec = stat.mtime.sec, mtime_nsec = stat.mtime.nsec, size = stat.size, rules = rules }
+  return rules
+end
+
+local function match_segment(segment, name)
+  if segment.literal then return segment.literal == name end
+  return name:find(segment.pattern) ~= nil
+end
+
+local function match_segments(segments, si, components, ci, last)
+  -- Matches segments[si..] against components[ci..last]
+  while si <= #segments do
+    local segment = segments[si]
+    if segment.globstar then
+      if si == #segments then return ci <= last end  -- trailing `**` matches everything inside, not the dir itself
+      for k = ci, last do if match_segments(segments, si + 1, components, k, last) then return true end end
+      return false
+    end
+    if ci > last or not match_segment(segment, components[ci]) then return false end
+    si, ci = si + 1, ci + 1
+  end
+  return ci > last
+end
+
+function M.is_ignored(stack, components, last, is_dir)
+  -- components[1..last] is the path of the entry from the repository root
+  for s = #stack, 1, -1 do
+    local rule_set = stack[s]
+    local rules = rule_set.rules
+    for r = #rules, 1, -1 do
+      local rule = rules[r]
+      if not rule.dir_only or is_dir then
+        local matched
+        if rule.anchored then matched = match_segments(rule.segments, 1, components, rule_set.base + 1, last)
+        else matched = match_segment(rule.segments[1], components[last]) end
+        if matched then return not rule.negated end
+      end
+    end
+  end
+  return false
+end
+
+local function push_rules(stack, rules, base)
+  if not rules or #rules == 0 then return 0 end
+  table.insert(stack, { rules = rules, base = base })
+  return 1
+end
+
+function M.push_directory(stack, directory, depth, present)
+  -- Pushes the rule files of a directory, present being a set of the names it contains; returns the count to pop
+  if not config.USE_IGNORE_FILES then return 0 end
+  local pushed = 0
+  for _, name in ipairs(config.IGNORE_FILES) do
+    if present[name] then pushed = pushed + push_rules(stack, load_rules(directory .. "/" .. name), depth) end
+  end
+  return pushed
+end
+
+function M.pop(stack, count) for _ = 1, count do table.remove(stack) end end
+
+function M.root_stack(directory)
+  -- Returns the rule stack and the path components from the repository root to directory (excluded: its own rule
+  -- files are pushed by the scan, like those of any directory) - without repository, directory is the root
+  local default_rules = {}
+  for _, name in ipairs(config.IGNORED_DIRS) do
+    table.insert(default_rules, { negated = false, dir_only = true, anchored = false, segments = { { literal = name } } })
+  end
+  local stack, components = { { rules = default_rules, base = 0 } }, {}
+  if not config.USE_IGNORE_FILES then return stack, components end
+  directory = directory:gsub("(.)/$", "%1")
+  local directories, current = {}, directory
+  while true do
+    table.insert(directories, 1, current)
+    if uv.fs_stat(current .. "/.git") then break end
+    local parent = vim.fn.fnamemodify(current, ":h")
+    if parent == current then directories = { directory }; break end  -- not in a repository
+    current = parent
+  end
+  push_rules(stack, load_rules(directories[1] .. "/.git/info/exclude"), 0)
+  for depth = 2, #directories do
+    local parent = directories[depth - 1]
+    local present = {}
+    for _, name in ipairs(config.IGNORE_FILES) do present[name] = true end  -- load_rules skips missing ones
+    M.push_directory(stack, parent, depth - 2, present)
+    components[depth - 1] = vim.fn.fnamemodify(directories[depth], ":t")
+  end
+  return stack, components
+end
+
+return M
@@ -1,26 +1,35 @@
 local M = {}
 
-local config = require("file-finder.config")
-local ui = require("file-finder.ui")
-local history = require("file-finder.history")
+-- Only keymaps and autocommands at startup, the finder itself is loaded on first use
+local function ui() return require("file-finder.ui") end
 
 function M.setup()
-  vim.keymap.set("n", "o",     ui.start_history_only, {desc = "Find files (history only)", silent = true})
-  vim.keymap.set("n", "O",     ui.start             , {desc = "Find files", silent = true})
-  vim.keymap.set("x", "<C-o>", ui.start             , {desc = "Find files", silent = true})
-  vim.api.nvim_create_user_command("FfFiles", ui.show_windows, {desc = "Find files with scoring"})
+  vim.keymap.set("n", "o",     function() ui().start(true) end, {desc = "Find files (history only)", silent = true})
+  vim.keymap.set("n", "O",     function() ui().start() end    , {desc = "Find files", silent = true})
+  vim.keymap.set("x", "<C-o>", function() ui().start() end    , {desc = "Find files", silent = true})
+  vim.api.nvim_create_user_command("FfFiles", function() ui().show_windows() end, {desc = "Find files with scoring"})
 end
 
-M.start = ui.start
+function M.start(history_only_mode) ui().start(history_only_mode) end
 
 vim.api.nvim_create_autocmd({"VimEnter", "BufReadPost", "BufEnter"}, { -- BufEnter sometimes needed when switching
   callback = function()
     opened_file = vim.fn.expand("%:p")
     if opened_file == "" then return end
+    local config = require("file-finder.config")
     vim.fn.mkdir(config.data_path, "p")
     local context_dir = config.next_file_context_directory or config.current_directory
     config.next_file_context_directory = nil
-    history.append_to_history(config.data_file, opened_file, context_dir, config.MAX_SAVED_FILES)
+    require("file-finder.history").append_to_history(config.data_file, opened_file, context_dir, config.MAX_SAVED_FILES)
+  end
+})
+
+vim.api.nvim_create_autocmd("BufWritePost", {
+  callback = function()
+    -- Caches only exist once the finder was used
+    local content, trigram = package.loaded["file-finder.content"], package.loaded["file-finder.trigram"]
+    if content then content.invalidate(vim.fn.expand("%:p")) end
+    if trigram then trigram.invalidate(vim.fn.expand("%:p")) end
   end
 })
 
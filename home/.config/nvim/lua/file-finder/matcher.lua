@@ -0,0 +1,126 @@
+-- Pure Lua matching, shared by the main thread and the content search workers
+-- WARNING must not use `vim` nor require anything: workers run it with dofile in a fresh Lua state
+
+local M = {}
+
+function M.score(pattern, str, skip_regex_matching, low_str, low_pattern)
+  -- WARNING `find` raises on ["(" => ""] and ["t(" => "tt(("] but doesnt raise on ["t(" => ""]
+  -- no easy and reliable way to do a pre-check, so just update the skip_regex_matching on first fail
+  -- low_str and low_pattern are optional, for callers that already have them lowercased
+  low_str, low_pattern = low_str or str:lower(), low_pattern or pattern:lower()
+  local start_pos, end_pos =     str:find(    pattern, 1, true)  -- start at first char and plain text matching
+  if start_pos                       then return skip_regex_matching, 6, start_pos, end_pos end
+  local start_pos, end_pos = low_str:find(low_pattern, 1, true)  -- start at first char and plain text matching (low)
+  if start_pos                       then return skip_regex_matching, 3, start_pos, end_pos end
+  if skip_regex_matching             then return skip_regex_matching, 0, start_pos, end_pos end
+  local worked, start_pos, end_pos = pcall(string.find,     str,     pattern)    -- now does pattern matching
+  if not worked                      then return true,                0, start_pos, end_pos end
+  if start_pos                       then return skip_regex_matching, 2, start_pos, end_pos end
+  local worked, start_pos, end_pos = pcall(string.find, low_str, low_pattern)    -- now does pattern matching (low)
+  if not worked                      then return skip_regex_matching, 0, start_pos, end_pos end
+  if start_pos                       then return skip_regex_matching, 1, start_pos, end_pos end
+  return                                         skip_regex_matching, 0, start_pos, end_pos
+end
+
+local BLOCK_SIZE = 64 * 1024
+
+function M.bounded_lines(file, max_bytes, max_line_length)
+  -- Like file:lines(), but reads at most max_bytes by blocks, and lines are truncated to max_line_length chars:
+  -- the head of a longer line is returned as soon as it is read, the rest is dropped up to the next newline
+  local buffer, position, remaining, discarding, eof = "", 1, max_bytes, false, false
+  return function()
+    while true do
+      local newline = buffer:find("\n", position, true)
+      if newline then
+        local line = buffer:sub(position, math.min(newline - 1, position + max_line_length - 1))
+        position = newline + 1
+        if not discarding then return line end
+        discarding = false
+      elseif not discarding and #buffer - position + 1 >= max_line_length then
+        local line = buffer:sub(position, position + max_line_length - 1)
+        buffer, position, discarding = "", 1, true
+        return line
+      elseif discarding and position <= #buffer then
+        buffer, position = "", 1
+      elseif eof or remaining <= 0 then
+        if position > #buffer then return nil end
+        local line = buffer:sub(position)
+        buffer, position = "", 1
+        return line
+      else
+        local block = file:read(math.min(BLOCK_SIZE, remaining))
+        if not block then eof = true
+        else buffer, position, remaining = buffer:sub(position) .. block, 1, remaining - #block end
+      end
+    end
+  end
+end
+
+function M.scan_file(pattern, abs_file_path, skip_regex_matching, max_matched_lines, max_bytes, max_line_length)
+  -- Scores the lines of a file, returns skip_regex_matching, content_score, matched_lines
+  -- Collects up to max_matched_lines, callers ask for one more than they show to know if "..." is needed
+  -- Only the first max_bytes of the file are read, and lines are truncated to max_line_length (see bounded_lines)
+  local content_score, matched_lines, line_num = 0, {}, 0
+  local file = io.open(abs_file_path, "rb")
+  if not file then return skip_regex_matching, content_score, matched_lines end
+  for line in M.bounded_lines(file, max_bytes, max_line_length) do
+    line_num = line_num + 1
+    local current_score, start_pos, end_pos
+    skip_regex_matching, current_score, start_pos, end_pos = M.score(pattern, line, skip_regex_matching)
+    content_score = content_score + current_score
+    if current_score > 0 and #matched_lines < max_matched_lines then
+      table.insert(matched_lines, {line_num = line_num, content = line, start_pos = start_pos, end_pos = end_pos})
+    end
+  end
+  file:close()
+  return skip_regex_matching, content_score, matched_lines
+end
+
+-- Batches cross the thread boundary as strings: paths are joined by \0, results are netstrings (length:data)
+
+local function netstring(value) value = tostring(value); return #value .. ":" .. value end
+
+function M.scan_batch(pattern, joined_paths, skip_regex_matching, max_matched_lines, max_bytes, max_line_length)
+  -- Returns skip_regex_matching, encoded results of files with a positive content score, identified by batch index
+  local encoded, index, position = {}, 0, 1
+  while position <= #joined_paths do
+    local path_end = joined_paths:find("\0", position, true) or #joined_paths + 1
+    local path = joined_paths:sub(position, path_end - 1)
+    index, position = index + 1, path_end + 1
+    local content_score, matched_lines
+    skip_regex_matching, content_score, matched_lines =
+      M.scan_file(pattern, path, skip_regex_matching, max_matched_lines, max_bytes, max_line_length)
+    if content_score > 0 then
+      table.insert(encoded, netstring(index) .. netstring(content_score) .. netstring(#matched_lines))
+      for _, match in ipairs(matched_lines) do
+        table.insert(encoded, netstring(match.line_num) .. netstring(match.start_pos) .. netstring(match.end_pos))
+        table.insert(encoded, netstring(match.content))
+      end
+    end
+  end
+  return skip_regex_matching, table.concat(encoded)
+end
+
+function M.decode_batch(encoded)
+  -- Returns a list of { index, content_score, matched_lines } as encoded by scan_batch
+  local results, position = {}, 1
+  local function next_field()
+    local colon = encoded:find(":", position, true)
+    local length = tonumber(encoded:sub(position, colon - 1))
+    local value = encoded:sub(colon + 1, colon + length)
+    position = colon + length + 1
+    return value
+  end
+  while position <= #encoded do
+    local index, content_score, count = tonumber(next_field()), tonumber(next_field()), tonumber(next_field())
+    local matched_lines = {}
+    for _ = 1, count do
+      local line_num, start_pos, end_pos = tonumber(next_field()), tonumber(next_field()), tonumber(next_field())
+      table.insert(matched_lines, {line_num = line_num, content = next_field(), start_pos = start_pos, end_pos = end_pos})
+    end
+    table.insert(results, { index = index, content_score = content_score, matched_lines = matched_lines })
+  end
+  return results
+end
+
+return M
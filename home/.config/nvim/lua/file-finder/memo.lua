@@ -0,0 +1,56 @@
+-- Recently ranked queries, so switching modes, reopening the finder or going back to a previous pattern shows the
+-- results at once - with the state of their ranking, pages already pulled by more are kept
+-- An entry is only valid for the generations of the caches it was computed from: tree index, contents, history
+-- Least recently used entries go first, past MEMO_MAX_ENTRIES queries or MEMO_MAX_ITEMS scored items held
+
+local M = {}
+
+local config = require("file-finder.config")
+local content = require("file-finder.content")
+local files = require("file-finder.files")
+local history = require("file-finder.history")
+
+local entries = {}  -- key -> { results, skip, more, generations, weight, used }
+local count, weight_total, clock = 0, 0, 0
+
+local function generations() return files.generation .. ":" .. content.generation .. ":" .. history.generation end
+
+local function remove(key)
+  weight_total, count = weight_total - entries[key].weight, count - 1
+  entries[key] = nil
+end
+
+function M.query(history_mode, pattern)
+  -- Taken when a search starts, so results are stored for the generations they were computed from
+  local mode = (history_mode and "h" or "t") .. (config.fuzzy and "f" or "-")
+  return { key = mode .. config.current_directory .. "\0" .. pattern, generations = generations() }
+end
+
+function M.get(query)
+  -- Returns results, skip_regex_matching, more as scoring.filter would, or nil if not known or stale
+  local entry = entries[query.key]
+  if not entry then return nil end
+  if entry.generations ~= query.generations then remove(query.key); return nil end
+  clock = clock + 1
+  entry.used = clock
+  return entry.results, entry.skip, entry.more
+end
+
+function M.put(query, results, skip, more, weight)
+  -- weight bounds the scored items held by results and more, usually the number of items searched
+  local key = query.key
+  if entries[key] then remove(key) end
+  if weight > config.MEMO_MAX_ITEMS or query.generations ~= generations() then return end  -- or already stale
+  clock = clock + 1
+  entries[key] = {
+    results = results, skip = skip, more = more, generations = query.generations, weight = weight, used = clock
+  }
+  weight_total, count = weight_total + weight, count + 1
+  while count > config.MEMO_MAX_ENTRIES or weight_total > config.MEMO_MAX_ITEMS do
+    local oldest = nil
+    for k, entry in pairs(entries) do if not oldest or entry.used < entries[oldest].used then oldest = k end end
+    remove(oldest)
+  end
+end
+
+return M
@@ -0,0 +1,78 @@
+-- Preview of the selected file around the selected line, in a window right of the results, toggled with <C-p>
+-- Only read once the selection rests for PREVIEW_DEBOUNCE_MS, through content.read_lines so reads stay bounded
+
+local M = {}
+
+local config = require("file-finder.config")
+local content = require("file-finder.content")
+
+local api = vim.api
+local uv = vim.uv
+
+M.buf, M.win = nil, nil
+local timer = nil
+local shown = nil  -- file .. ":" .. line of what the window holds, nothing is read again for the same selection
+local wanted = nil  -- { file, line_number }
+
+local function absolute(file) return file:sub(1, 1) == "/" and file or (config.current_directory .. file) end
+
+local function render()
+  if not wanted or not M.buf or not api.nvim_buf_is_valid(M.buf) or not api.nvim_win_is_valid(M.win) then return end
+  local file, line_number = wanted.file, wanted.line_number or 1
+  local key = file .. ":" .. line_number
+  if key == shown then return end
+  shown = key
+  local height = api.nvim_win_get_height(M.win)
+  local first = math.max(1, line_number - math.floor(height / 3))
+  local lines = content.read_lines(absolute(file), first, first + height - 1)
+  local texts, ns = {}, api.nvim_create_namespace("file_finder_preview")
+  if not lines then texts = { "  binary or unreadable file" }
+  elseif #lines == 0 and first > 1 then texts = { "  too far into the file to preview" } end
+  for i, text in ipairs(lines or {}) do texts[i] = string.format("%5d ", first + i - 1) .. text end
+  api.nvim_buf_set_option(M.buf, "modifiable", true)
+  api.nvim_buf_clear_namespace(M.buf, ns, 0, -1)
+  api.nvim_buf_set_lines(M.buf, 0, -1, false, texts)
+  api.nvim_buf_set_option(M.buf, "modifiable", false)
+  for i = 1, #(lines or {}) do
+    local group = first + i - 1 == wanted.line_number and "FileFinderLineMatch" or "FileFinderLineNumber"
+    api.nvim_buf_set_extmark(M.buf, ns, i - 1, 0, { end_col = 5, hl_group = group })
+  end
+  api.nvim_win_set_config(M.win, { title = " " .. file .. " ", title_pos = "center" })
+end
+
+function M.open(height, width, row, col, blend)
+  M.close()
+  M.buf = api.nvim_create_buf(false, true)
+  M.win = api.nvim_open_win(M.buf, false, {
+    relative = "editor", height = height, width = width, row = row, col = col, style = "minimal",
+    zindex = 2, border = "single", focusable = false,
+  })
+  api.nvim_win_set_option(M.win, "wrap", false)
+  api.nvim_win_set_option(M.win, "winblend", blend)
+  api.nvim_buf_set_option(M.buf, "modifiable", false)
+  timer = uv.new_timer()
+end
+
+function M.close()
+  if timer then timer:stop(); timer:close(); timer = nil end
+  if M.win and api.nvim_win_is_valid(M.win) then api.nvim_win_close(M.win, true) end
+  if M.buf and api.nvim_buf_is_valid(M.buf) then api.nvim_buf_delete(M.buf, { force = true }) end
+  M.buf, M.win, shown, wanted = nil, nil, nil, nil
+end
+
+function M.show(file, line_number)
+  -- Called on every selection change, the file is only read once the selection rests
+  if not timer then return end
+  if not file then
+    wanted, shown = nil, nil
+    api.nvim_buf_set_option(M.buf, "modifiable", true)
+    api.nvim_buf_set_lines(M.buf, 0, -1, false, {})
+    api.nvim_buf_set_option(M.buf, "modifiable", false)
+    return
+  end
+  wanted = { file = file, line_number = line_number }
+  timer:stop()
+  timer:start(config.PREVIEW_DEBOUNCE_MS, 0, vim.schedule_wrap(render))
+end
+
+return M
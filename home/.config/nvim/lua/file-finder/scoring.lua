@@ -1,71 +1,162 @@
 local M = {}
 
 local config = require("file-finder.config")
+local content = require("file-finder.content")
+local fuzzy = require("file-finder.fuzzy")
+local matcher = require("file-finder.matcher")
+local stats = require("plugin-stats")
+local trigram = require("file-finder.trigram")
+local workers = require("file-finder.workers")
 
-function M.score(pattern, str, skip_regex_matching)
-  -- WARNING `find` raises on ["(" => ""] and ["t(" => "tt(("] but doesnt raise on ["t(" => ""]
-  -- no easy and reliable way to do a pre-check, so just update the skip_regex_matching on first fail
-  local low_str, low_pattern = str:lower(), pattern:lower()
-  local start_pos, end_pos =     str:find(    pattern, 1, true)  -- start at first char and plain text matching
-  if start_pos                       then return skip_regex_matching, 6, start_pos, end_pos end
-  local start_pos, end_pos = low_str:find(low_pattern, 1, true)  -- start at first char and plain text matching (low)
-  if start_pos                       then return skip_regex_matching, 3, start_pos, end_pos end
-  if skip_regex_matching             then return skip_regex_matching, 0, start_pos, end_pos end
-  local worked, start_pos, end_pos = pcall(string.find,     str,     pattern)    -- now does pattern matching
-  if not worked                      then return true,                0, start_pos, end_pos end
-  if start_pos                       then return skip_regex_matching, 2, start_pos, end_pos end
-  local worked, start_pos, end_pos = pcall(string.find, low_str, low_pattern)    -- now does pattern matching (low)
-  if not worked                      then return skip_regex_matching, 0, start_pos, end_pos end
-  if start_pos                       then return skip_regex_matching, 1, start_pos, end_pos end
-  return                                         skip_regex_matching, 0, start_pos, end_pos
+local uv = vim.uv
+
+M.score = matcher.score
+
+local function absolute(file_path)
+  return file_path:sub(1, 1) == "/" and file_path or (config.current_directory .. file_path)
+end
+
+local function score_path(pattern, low_pattern, item, skip_regex_matching)
+  -- Uses the lowercased path precomputed by fuzzy.prepare when there is one, fuzzy matching comes last if enabled
+  local current_score
+  skip_regex_matching, current_score =
+    M.score(pattern, item.printed_path, skip_regex_matching, item.lower, low_pattern)
+  if current_score == 0 and config.fuzzy and item.bonus then current_score = fuzzy.score(low_pattern, item) end
+  return skip_regex_matching, current_score
+end
+
+local function new_scored_item(item, key, item_score, matched_lines, history_rank)
+  local rank = history_rank[item.file] or math.huge  -- Files not in history get worst rank
+  return {
+    file = item.file, score = item_score, key = key, matched_lines = matched_lines, history_rank = rank,
+    printed_path = item.printed_path
+  }
+end
+
+local function better(a, b)
+  -- Primary sort by score (higher is better)
+  if a.score ~= b.score then
+    return a.score > b.score
+  end
+  -- Tiebreaker: use history rank (lower is better = more recent)
+  return a.history_rank < b.history_rank
+end
+
+local function sift_down(heap, i)
+  local size, item = #heap, heap[i]
+  while true do
+    local child = 2 * i
+    if child > size then break end
+    if child < size and better(heap[child + 1], heap[child]) then child = child + 1 end
+    if not better(heap[child], item) then break end
+    heap[i] = heap[child]
+    i = child
+  end
+  heap[i] = item
+end
+
+local function rank(scored_items)
+  -- Partial selection: heapify is O(n), then each of the first k results costs O(log n), so only what is shown
+  -- gets ordered - returns results with the first page, and more(count) appending up to count next best items
+  -- WARNING takes ownership of scored_items, which becomes the heap
+  local heap, results = scored_items, {}
+  for i = math.floor(#heap / 2), 1, -1 do sift_down(heap, i) end
+  local function more(count)
+    local added = 0
+    while added < count and #heap > 0 do
+      table.insert(results, heap[1])
+      heap[1] = heap[#heap]
+      heap[#heap] = nil
+      if #heap > 0 then sift_down(heap, 1) end
+      added = added + 1
+    end
+    return added
+  end
+  more(config.PAGE_SIZE)
+  return results, more
 end
 
 function M.filter(pattern, items, key_func, file_only_mode, history_rank)
-  if not pattern or pattern == "" then return items, false end
+  -- Returns results, skip_regex_matching, more: results only holds the first page, see rank for more
+  if not pattern or pattern == "" then return items, false, nil end
   local scored_items, skip_regex_matching = {}, false
   key_func = key_func or function(item) return item end
   history_rank = history_rank or {}
+  local may_contain = not file_only_mode and trigram.candidates(pattern) or nil  -- nil when it can't narrow the scan
+  local max_matched_lines = config.MAX_LINES_PER_FILE + 1  -- one more than shown to know if "..." is needed
+  local low_pattern = pattern:lower()
   for _, item in ipairs(items) do
-    local file_path, key, item_score, current_score = item.file, key_func(item), 0, 0
-    skip_regex_matching, current_score, start_pos, end_pos = M.score(pattern, item.printed_path, skip_regex_matching)
-    item_score = current_score * 1000
-    local matched_lines = {}
-    local line_num = 0
-    if not file_only_mode then
-      local abs_file_path = file_path:sub(1, 1) == "/" and file_path or (config.current_directory .. file_path)
-      local ok, iter = pcall(io.lines, abs_file_path)
-      if ok and iter then
-        for line in iter do
-          line_num = line_num + 1
-          skip_regex_matching, current_score, start_pos, end_pos = M.score(pattern, line, skip_regex_matching)
-          item_score = item_score + current_score
-          -- Collect up to MAX_LINES_PER_FILE + 1 to know if "..." indicator is needed
-          if current_score > 0 and #matched_lines < config.MAX_LINES_PER_FILE + 1 then
-            table.insert(matched_lines, {line_num = line_num, content = line, start_pos = start_pos, end_pos = end_pos})
-          end
-        end
-      end
+    local current_score, content_score, matched_lines = 0, 0, {}
+    skip_regex_matching, current_score = score_path(pattern, low_pattern, item, skip_regex_matching)
+    local abs_file_path = not file_only_mode and (not may_contain or may_contain(item.file)) and absolute(item.file)
+    if abs_file_path and content.is_text(abs_file_path) then
+      skip_regex_matching, content_score, matched_lines = matcher.scan_file(
+        pattern, abs_file_path, skip_regex_matching, max_matched_lines,
+        config.CONTENT_MAX_BYTES, config.CONTENT_MAX_LINE_LENGTH
+      )
     end
+    local item_score = current_score * 1000 + content_score
     if item_score > 0 then
-      local rank = history_rank[file_path] or math.huge  -- Files not in history get worst rank
-      table.insert(scored_items, {file_path = file_path, score = item_score, key = key, matched_lines = matched_lines, history_rank = rank, printed_path = item.printed_path})
+      table.insert(scored_items, new_scored_item(item, key_func(item), item_score, matched_lines, history_rank))
     end
   end
+  local results, more = rank(scored_items)
+  return results, skip_regex_matching, more
+end
+M.filter = stats.wrap("file-finder.scoring.filter", M.filter)
+
+function M.use_workers(items, file_only_mode)
+  return not file_only_mode and workers.available() and #items >= config.CONTENT_WORKERS_MIN_FILES
+end
 
-  table.sort(scored_items, function(a, b)
-    -- Primary sort by score (higher is better)
-    if a.score ~= b.score then
-      return a.score > b.score
+function M.filter_async(pattern, items, key_func, history_rank, on_update)
+  -- Content mode filter with the same results as M.filter, but file contents are scanned by the workers
+  -- on_update(results, skip_regex_matching, more, done) is called on the main loop with merged partial results, at
+  -- most every CONTENT_WORKERS_REFRESH_MS, and a last time with done set; returns a function cancelling the search
+  key_func = key_func or function(item) return item end
+  history_rank = history_rank or {}
+  local scored_items, scored_by_item, skip_regex_matching = {}, {}, false
+  local may_contain = trigram.candidates(pattern)
+  local scanned_items, scanned_paths, low_pattern = {}, {}, pattern:lower()
+  for _, item in ipairs(items) do
+    local current_score
+    skip_regex_matching, current_score = score_path(pattern, low_pattern, item, skip_regex_matching)
+    if current_score > 0 then
+      scored_by_item[item] = new_scored_item(item, key_func(item), current_score * 1000, {}, history_rank)
+      table.insert(scored_items, scored_by_item[item])
     end
-    -- Tiebreaker: use history rank (lower is better = more recent)
-    return a.history_rank < b.history_rank
-  end)
+    local abs_file_path = (not may_contain or may_contain(item.file)) and absolute(item.file)
+    if abs_file_path and content.is_text(abs_file_path) then
+      table.insert(scanned_items, item)
+      table.insert(scanned_paths, abs_file_path)
+    end
+  end
+  local last_update = uv.hrtime()
 
-  local result = {}
-  for _, scored_item in ipairs(scored_items) do
-    table.insert(result, {file = scored_item.file_path, matched_lines = scored_item.matched_lines, printed_path = scored_item.printed_path})
+  local function on_batch(first_index, results)
+    for _, result in ipairs(results) do
+      local item = scanned_items[first_index + result.index - 1]
+      local scored_item = scored_by_item[item]
+      if not scored_item then
+        scored_item = new_scored_item(item, key_func(item), 0, {}, history_rank)
+        scored_by_item[item] = scored_item
+        table.insert(scored_items, scored_item)
+      end
+      scored_item.score = scored_item.score + result.content_score
+      scored_item.matched_lines = result.matched_lines
+    end
+    if uv.hrtime() - last_update < config.CONTENT_WORKERS_REFRESH_MS * 1e6 then return end
+    last_update = uv.hrtime()
+    local results, more = rank(vim.list_extend({}, scored_items))  -- rank owns its input, the merge goes on
+    on_update(results, skip_regex_matching, more, false)
   end
-  return result, skip_regex_matching
+
+  local function on_done(final_skip_regex_matching)
+    local results, more = rank(scored_items)
+    on_update(results, final_skip_regex_matching, more, true)
+  end
+
+  return workers.search(pattern, scanned_paths, skip_regex_matching, on_batch, on_done)
 end
 
 return M
@@ -0,0 +1,202 @@
+-- Trigram index over file contents, narrowing the files the content search has to read
+-- - Trigrams are taken from lowercased content, never across a newline, and stored as b1 * 65536 + b2 * 256 + b3
+-- - Each indexed file gets an id, posting lists are arrays of ids, always increasing since ids are only appended
+-- - A file whose mtime (sec and nsec) or size changed gets a new id, the old one is dead until the next save compacts the index
+-- - Built in the background by time-bounded slices, persisted per current directory next to the history file
+-- The index can only tell a file MAY contain a query: files it doesn't know about are always scanned, and so are
+-- files of a loaded index not checked again yet (their mtime), whose postings may be stale
+-- WARNING Lua patterns can't be narrowed in general, so queries with magic chars fall back to a full scan - except
+-- for `.` alone, as it stands for exactly one char the literal runs around it still have to be in the file
+
+local M = {}
+
+local config = require("file-finder.config")
+local content = require("file-finder.content")
+
+local byte = string.byte
+local uv = vim.uv
+
+local FORMAT_VERSION = 2
+local MAGIC_CHARS = "[%^%$%(%)%%%[%]%*%+%-%?]" -- all Lua pattern magic chars except `.`
+
+local index = nil  -- { directory, paths = { id -> path|false }, ids = { path -> id }, stats, postings, dead, checked }
+local generation = 0  -- bumped on each refresh, so a superseded background build stops by itself
+
+local function collect_trigrams(text, seen)
+  local b1, b2 = byte(text, 1, 2)
+  for i = 3, #text do
+    local b3 = byte(text, i)
+    if b1 ~= 10 and b2 ~= 10 and b3 ~= 10 then seen[b1 * 65536 + b2 * 256 + b3] = true end
+    b1, b2 = b2, b3
+  end
+  return seen
+end
+
+local function new_index(directory)
+  return {
+    version = FORMAT_VERSION, directory = directory, paths = {}, ids = {}, stats = {}, postings = {}, dead = 0,
+    checked = {},  -- path -> true once its stat was compared to the indexed one in this session
+  }
+end
+
+local function index_file_path(directory)
+  return config.trigram_path .. "/" .. vim.fn.sha256(directory):sub(1, 32) .. ".mpack"
+end
+
+local function absolute(path) return path:sub(1, 1) == "/" and path or (config.current_directory .. path) end
+
+local function load_index(directory)
+  -- Returns the persisted index for that directory, or a new one if there is none or it is unreadable
+  local file = io.open(index_file_path(directory), "rb")
+  if not file then return new_index(directory) end
+  local data = file:read("*all")
+  file:close()
+  local ok, loaded = pcall(vim.mpack.decode, data)
+  if not ok or type(loaded) ~= "table" or loaded.version ~= FORMAT_VERSION or loaded.directory ~= directory then
+    return new_index(directory)
+  end
+  loaded.ids, loaded.dead, loaded.checked = {}, 0, {}
+  for id, path in ipairs(loaded.paths) do if path then loaded.ids[path] = id else loaded.dead = loaded.dead + 1 end end
+  return loaded
+end
+
+local function compact()
+  -- Renumbers live files so dead ids disappear from posting lists, keeps the ids increasing in every list
+  if index.dead == 0 then return end
+  local remap, paths, stats, ids = {}, {}, {}, {}
+  for id, path in ipairs(index.paths) do
+    if path then
+      table.insert(paths, path); table.insert(stats, index.stats[id])
+      remap[id], ids[path] = #paths, #paths
+    end
+  end
+  local postings = {}
+  for trigram, list in pairs(index.postings) do
+    local new_list = {}
+    for _, id in ipairs(list) do if remap[id] then new_list[#new_list + 1] = remap[id] end end
+    if #new_list > 0 then postings[trigram] = new_list end
+  end
+  index.paths, index.stats, index.ids, index.postings, index.dead = paths, stats, ids, postings, 0
+end
+
+local function save_index()
+  compact()
+  vim.fn.mkdir(config.trigram_path, "p")
+  local ids, checked = index.ids, index.checked
+  index.ids, index.checked = nil, nil  -- rebuilt on load, no need to persist them
+  local ok, encoded = pcall(vim.mpack.encode, index)
+  index.ids, index.checked = ids, checked
+  if not ok then return false, encoded end
+  local path = index_file_path(index.directory)
+  local file = io.open(path .. ".tmp", "wb")
+  if not file then return false, "could not create the .tmp file" end
+  file:write(encoded)
+  file:close()
+  return os.rename(path .. ".tmp", path)
+end
+
+local function remove_file(path)
+  local id = index.ids[path]
+  if not id then return end
+  index.ids[path], index.paths[id], index.stats[id], index.dead = nil, false, false, index.dead + 1
+end
+
+local function add_file(path, stat, trigrams)
+  local id = #index.paths + 1
+  index.paths[id], index.ids[path], index.stats[id] = path, id, { stat.mtime.sec, stat.mtime.nsec, stat.size }
+  local postings = index.postings
+  for trigram in pairs(trigrams) do
+    local list = postings[trigram]
+    if not list then list = {}; postings[trigram] = list end
+    list[#list + 1] = id
+  end
+end
+
+local function update_file(path)
+  -- (Re)indexes a single file if it changed, returns true if the index was modified
+  local stat = uv.fs_stat(absolute(path))
+  local id = index.ids[path]
+  index.checked[path] = true
+  if not stat or stat.type ~= "file" or stat.size > config.TRIGRAM_MAX_FILE_SIZE then
+    remove_file(path)
+    return id ~= nil
+  end
+  local known = id and index.stats[id]
+  local same = known and known[1] == stat.mtime.sec and known[2] == stat.mtime.nsec and known[3] == stat.size
+  if same then return false end
+  remove_file(path)
+  if not content.is_text(absolute(path)) then add_file(path, stat, {}); return true end  -- never a candidate
+  local file = io.open(absolute(path), "rb")
+  if not file then return id ~= nil end
+  local file_content = file:read("*all")
+  file:close()
+  add_file(path, stat, collect_trigrams(file_content:lower(), {}))
+  return true
+end
+
+function M.refresh(items)
+  -- Starts (or restarts) the background build for the current directory, items being the output of files.get_files
+  if not config.TRIGRAM_INDEX then return end
+  generation = generation + 1
+  local build_generation, modified, position = generation, false, 1
+  if not index or index.directory ~= config.current_directory then index = load_index(config.current_directory) end
+  local known = {}
+  for _, item in ipairs(items) do known[item.file] = true end
+  for path in pairs(index.ids) do if not known[path] then remove_file(path); modified = true end end
+
+  local function step()
+    if build_generation ~= generation or index.directory ~= config.current_directory then return end
+    local deadline = uv.hrtime() + config.TRIGRAM_SLICE_MS * 1e6
+    while position <= #items and uv.hrtime() < deadline do
+      if update_file(items[position].file) then modified = true end
+      position = position + 1
+    end
+    if position <= #items then vim.defer_fn(step, 0); return end
+    if modified then save_index() end
+  end
+
+  vim.defer_fn(step, 0)
+end
+
+function M.invalidate(abs_path)
+  -- Called when a file is written from this instance, it will be scanned until the next refresh indexes it again
+  if not index or abs_path:sub(1, #index.directory) ~= index.directory then return end
+  remove_file(abs_path:sub(#index.directory + 1))
+end
+
+local function intersect(a, b)
+  -- Both arrays are increasing
+  local result, i, j = {}, 1, 1
+  while i <= #a and j <= #b do
+    if     a[i] < b[j] then i = i + 1
+    elseif a[i] > b[j] then j = j + 1
+    else result[#result + 1] = a[i]; i = i + 1; j = j + 1 end
+  end
+  return result
+end
+
+function M.candidates(pattern)
+  -- Returns nil if the index can't narrow this query, else a function telling whether a relative path may match
+  if not config.TRIGRAM_INDEX or not index or index.directory ~= config.current_directory then return nil end
+  if pattern:find(MAGIC_CHARS) then return nil end  -- regex queries fall back to a full scan
+  local query = {}
+  for run in pattern:lower():gmatch("[^%.]+") do collect_trigrams(run, query) end
+  if next(query) == nil then return nil end  -- nothing of three chars or more to look for
+  local lists = {}
+  for trigram in pairs(query) do table.insert(lists, index.postings[trigram] or {}) end
+  table.sort(lists, function(a, b) return #a < #b end)
+  local matching = lists[1]
+  for i = 2, #lists do
+    if #matching == 0 then break end
+    matching = intersect(matching, lists[i])
+  end
+  local matching_set, ids = {}, index.ids
+  for _, id in ipairs(matching) do matching_set[id] = true end
+  local checked = index.checked
+  return function(path)
+    local id = ids[path]
+    return id == nil or not checked[path] or matching_set[id] == true
+  end
+end
+
+return M
@@ -1,9 +1,17 @@
 local M = {}
 
 local config = require("file-finder.config")
+local content = require("file-finder.content")
+local daemon = require("file-finder.daemon")
 local files = require("file-finder.files")
+local fuzzy = require("file-finder.fuzzy")
 local history = require("file-finder.history")
+local memo = require("file-finder.memo")
+local preview = require("file-finder.preview")
 local scoring = require("file-finder.scoring")
+local stats = require("plugin-stats")
+local trigram = require("file-finder.trigram")
+local list_view = require("list-view")
 local ceil = math.ceil
 
 local api = vim.api
@@ -19,6 +27,7 @@ M.main_row,     M.prompt_row,         M.backdrop_row         =   0,   0,   0
 M.main_col,     M.prompt_col,         M.backdrop_col         =   0,   0,   0
 M.main_blend,   M.prompt_blend,       M.backdrop_blend       =   0,   0,   0
 M.lines_infos = {}
+M.display_limit = config.PAGE_SIZE  -- Number of files shown, grows by pages when the selection goes past the last one
 
 function M.set_windows_characterisitcs()
   if M.history_only_mode then
@@ -30,6 +39,11 @@ function M.set_windows_characterisitcs()
     M.main_row,   M.main_col        = 6, 10
     M.main_blend, M.prompt_blend, M.backdrop_blend  = 0, 0, 15
   end
+  if config.preview then  -- the results keep the left part, the preview gets the right one
+    M.preview_width,  M.preview_height  = math.floor(M.main_width / 2) - 1, M.main_height
+    M.main_width                        = M.main_width - M.preview_width - 2
+    M.preview_row,    M.preview_col     = M.main_row, M.main_col + M.main_width + 2
+  end
   M.prompt_width,   M.prompt_height   = M.main_width, 1
   M.prompt_row,     M.prompt_col      = M.main_row - 4, M.main_col
   M.backdrop_width, M.backdrop_height = vim.o.columns, vim.o.lines
@@ -82,6 +96,18 @@ function M.reset_windows()
   reset(M.backdrop_win, M.backdrop_height, M.backdrop_width, M.backdrop_row, M.backdrop_col, M.backdrop_blend)
   reset(M.main_win,     M.main_height,     M.main_width,     M.main_row,     M.main_col,     M.main_blend    )
   reset(M.prompt_win,   M.prompt_height,   M.prompt_width,   M.prompt_row,   M.prompt_col,   M.prompt_blend  )
+  M.reset_preview_window()
+end
+
+function M.reset_preview_window()
+  if not config.preview then preview.close(); return end
+  preview.open(M.preview_height, M.preview_width, M.preview_row, M.preview_col, M.main_blend)
+end
+
+function M.preview_selection(selected_line)
+  if not config.preview then return end
+  local line_infos = M.lines_infos[selected_line]
+  preview.show(line_infos and line_infos.file, line_infos and line_infos.line_number)
 end
 
 function M.setup_highlights()
@@ -93,17 +119,10 @@ function M.setup_highlights()
 end
 
 function M.update_results(buf, items, selected_line)
-  api.nvim_buf_set_option(buf, "modifiable", true)
-  api.nvim_buf_set_lines(buf, 0, -1, false, items)
-  api.nvim_buf_set_option(buf, "modifiable", false)
-  
-  api.nvim_buf_clear_namespace(buf, -1, 0, -1)
-  
-  for i, item in ipairs(items) do
-    for _, color in ipairs(M.lines_infos[i].colors) do
-      api.nvim_buf_add_highlight(buf, -1, color[1], i - 1, color[2], color[3])
-    end
-  end
+  -- Only the rows inside the window are drawn, see list-view.lua - returns the selected line, clamped to the items
+  local lines_infos = M.lines_infos
+  local function get_row(i) return items[i], lines_infos[i].colors end
+  return list_view.render(M.results_view, #items, get_row, selected_line)
 end
 
 function M.show_windows()
@@ -114,10 +133,13 @@ function M.show_windows()
   M.backdrop_buf, M.backdrop_win = M.create_backdrop_window()
   M.main_buf,     M.main_win     = M.create_floating_window()
   M.prompt_buf,   M.prompt_win   = M.create_prompt_window()
+  M.results_view = list_view.new(M.main_buf, M.main_win, "file_finder_results")
+  M.reset_preview_window()
 end
 
 function M.close_windows()
   local forced = { force = true }
+  preview.close()
   if M.prompt_win   and api.nvim_win_is_valid(M.prompt_win)   then api.nvim_win_close( M.prompt_win,   true)   end
   if M.main_win     and api.nvim_win_is_valid(M.main_win)     then api.nvim_win_close( M.main_win,     true)   end
   if M.backdrop_win and api.nvim_win_is_valid(M.backdrop_win) then api.nvim_win_close( M.backdrop_win, true)   end
@@ -141,20 +163,18 @@ local function get_visual_selection()
   return lines[1]
 end
 
-local function add_short_paths(items)
-  for _, item in ipairs(items) do
-    local abs_path = item.file
-    local rel_path = abs_path
-    if abs_path:sub(1, #config.current_directory) == config.current_directory then
-      rel_path = abs_path:sub(#config.current_directory + 1)
-    elseif abs_path:sub(1, #files.HOME) == files.HOME then
-      rel_path = abs_path:sub(#files.HOME + 1)
-    else
-      rel_path = abs_path:sub(2)
-    end
-    item.short_path = rel_path
+local function add_short_path(item)
+  local abs_path = item.file
+  local rel_path = abs_path
+  if abs_path:sub(1, #config.current_directory) == config.current_directory then
+    rel_path = abs_path:sub(#config.current_directory + 1)
+  elseif abs_path:sub(1, #files.HOME) == files.HOME then
+    rel_path = abs_path:sub(#files.HOME + 1)
+  else
+    rel_path = abs_path:sub(2)
   end
-  return items
+  item.short_path = rel_path
+  return item
 end
 
 local function enrich_display_info(items, count)
@@ -176,15 +196,19 @@ local function enrich_display_info(items, count)
   return items
 end
 
-local function update_display(filtered_files)
+local function update_display(filtered_files, selected_line)
+  -- Returns the selected line, clamped to the displayed lines
   if M.history_only_mode then
-    enrich_display_info(filtered_files, 50)
+    enrich_display_info(filtered_files, M.display_limit)
   end
   local display_items = {}
   M.lines_infos = {}
-  for i = 1, math.min(#filtered_files, 50) do
+  for i = 1, math.min(#filtered_files, M.display_limit) do
     local item = filtered_files[i]
-    if type(item) ~= "table" then vim.notify("update_display consumed a non table", vim.log.levels.ERROR); return end
+    if type(item) ~= "table" then
+      vim.notify("update_display consumed a non table", vim.log.levels.ERROR)
+      return selected_line
+    end
 
     if not M.history_only_mode then
       -- Show filename (without "..." - that comes after matched lines)
@@ -226,31 +250,35 @@ local function update_display(filtered_files)
       end
     end
   end
-  M.update_results(M.main_buf, display_items, selected_line, M.lines_infos)
+  selected_line = M.update_results(M.main_buf, display_items, selected_line)
+  M.preview_selection(selected_line)
+  return selected_line
 end
+update_display = stats.wrap("file-finder.update_display", update_display)
 
 function M.start(history_only_mode)
   M.history_only_mode = history_only_mode
+  M.display_limit = config.PAGE_SIZE
   local visual_selection = get_visual_selection()  -- get this value before UI setup
 
-  local all_files_from_tree = files.get_files()
-  local all_files_from_history = add_short_paths(history.load_history_for_ui())
-  for _, item in ipairs(all_files_from_tree) do item.printed_path = item.file end
-  for _, item in ipairs(all_files_from_history) do item.printed_path = item.short_path end
-  local obtained_files, filtered_files, selected_line, pattern, skip_regex = {}, {}, 1, "", false
-
-  -- Build history rank map: file_path -> rank (lower = more recent)
-  -- Convert absolute paths from history to relative paths to match file tree
-  local history_rank = {}
-  for i, item in ipairs(all_files_from_history) do
-    local abs_path = item.file
-    local rel_path = abs_path
-    -- Convert absolute to relative if it starts with current directory
-    if abs_path:sub(1, #config.current_directory) == config.current_directory then
-      rel_path = abs_path:sub(#config.current_directory + 1)
-    end
-    history_rank[rel_path] = i
+  local use_daemon = daemon.open()  -- when true, the daemon owns the tree index and searches it
+  local all_files_from_tree = {}
+  local function scan_tree()
+    local changed
+    all_files_from_tree, changed = files.get_files()
+    if not changed then return end  -- watched since the last opening and nothing happened, caches are still valid
+    content.new_round()  -- cached binary verdicts get checked against the files again
+    trigram.refresh(all_files_from_tree)  -- background, content search uses whatever is already indexed
   end
+  if not use_daemon then scan_tree() end
+  local history_items, _, history_rank = history.load_history_for_ui()  -- cached, only prepared the first time
+  local all_files_from_history = history_items or {}
+  for _, item in ipairs(all_files_from_history) do
+    if not item.short_path then add_short_path(item); item.printed_path = item.short_path; fuzzy.prepare(item) end
+  end
+  local obtained_files, filtered_files, selected_line, pattern, skip_regex = {}, {}, 1, "", false
+  local more_results = nil  -- ranks the next files of filtered_files, nil when they are all there
+  history_rank = history_rank or {}  -- relative path if in the current directory -> rank (lower = more recent)
 
   M.setup_highlights()
   M.show_windows()
@@ -262,21 +290,60 @@ function M.start(history_only_mode)
   set_obtained_files()
   filtered_files = obtained_files
 
+  local cancel_search = nil  -- set while workers are scanning contents for the current pattern
+
+  local function show_results(results, skip, more)
+    filtered_files, skip_regex, more_results = results, skip, more
+    selected_line = update_display(filtered_files, selected_line)
+    local ns_id = vim.api.nvim_create_namespace("file_finder_prompt_color")
+    vim.api.nvim_buf_clear_namespace(M.prompt_buf, ns_id, 0, -1)
+    if skip_regex then
+      vim.api.nvim_buf_set_extmark(M.prompt_buf, ns_id, 0, 0, {
+        virt_text = {{">", "FileFinderLineMatch"}},
+        virt_text_pos = "overlay"
+      })
+    end
+    if config.fuzzy then
+      vim.api.nvim_buf_set_extmark(M.prompt_buf, ns_id, 0, 0, {
+        virt_text = {{"fuzzy", "FileFinderLineNumber"}},
+        virt_text_pos = "right_align"
+      })
+    end
+  end
+
   local function on_input_change(force)
+    if not M.prompt_buf or not vim.api.nvim_buf_is_valid(M.prompt_buf) then return end
     local lines = vim.api.nvim_buf_get_lines(M.prompt_buf, 0, -1, false)
     local new_pattern = lines[1] and lines[1]:gsub("^> ", "") or ""
     if new_pattern ~= pattern or force then
       pattern = new_pattern
-      filtered_files, skip_regex = scoring.filter(pattern, obtained_files, nil, M.history_only_mode, history_rank)
-      selected_line = 1
-      update_display(filtered_files)
-      local ns_id = vim.api.nvim_create_namespace("file_finder_prompt_color")
-      vim.api.nvim_buf_clear_namespace(M.prompt_buf, ns_id, 0, -1)
-      if skip_regex then
-        vim.api.nvim_buf_set_extmark(M.prompt_buf, ns_id, 0, 0, {
-          virt_text = {{">", "FileFinderLineMatch"}},
-          virt_text_pos = "overlay"
-        })
+      if cancel_search then cancel_search(); cancel_search = nil end
+      selected_line, M.display_limit = 1, config.PAGE_SIZE
+      if use_daemon and not M.history_only_mode then
+        cancel_search = daemon.search(pattern, config.fuzzy, function(results, skip, more, done)
+          if done then cancel_search = nil end
+          if not M.main_buf or not vim.api.nvim_buf_is_valid(M.main_buf) then return end  -- closed meanwhile
+          show_results(results, skip, more)
+        end)
+        if cancel_search then return end
+        use_daemon = false  -- unreachable, in-process from now on
+        scan_tree()
+        set_obtained_files()
+      end
+      if pattern == "" then show_results(obtained_files, false, nil); return end
+      local query, weight = memo.query(M.history_only_mode, pattern), #obtained_files
+      local results, skip, more = memo.get(query)
+      if results then show_results(results, skip, more); return end
+      if scoring.use_workers(obtained_files, M.history_only_mode) then
+        cancel_search = scoring.filter_async(pattern, obtained_files, nil, history_rank, function(results, skip, more, done)
+          if done then cancel_search = nil; memo.put(query, results, skip, more, weight) end
+          if not M.main_buf or not vim.api.nvim_buf_is_valid(M.main_buf) then return end  -- closed meanwhile
+          show_results(results, skip, more)
+        end)
+      else
+        results, skip, more = scoring.filter(pattern, obtained_files, nil, M.history_only_mode, history_rank)
+        memo.put(query, results, skip, more, weight)
+        show_results(results, skip, more)
       end
     end
   end
@@ -314,13 +381,31 @@ function M.start(history_only_mode)
     on_input_change(true)
   end
 
+  local function toggle_fuzzy()
+    config.fuzzy = not config.fuzzy
+    on_input_change(true)
+  end
+
+  local function toggle_preview()
+    config.preview = not config.preview
+    M.set_windows_characterisitcs()
+    M.reset_windows()
+    selected_line = update_display(filtered_files, selected_line)
+  end
+
   local function move_selection(direction)
-    local display_line_count = 0
-    for _, _ in pairs(M.lines_infos) do display_line_count = display_line_count + 1 end
-    local max_line = math.min(math.min(display_line_count - 1, 49), #M.lines_infos)
-    selected_line = math.max(1, math.min(max_line + 1, selected_line + direction))
-    update_display(filtered_files)
-    vim.api.nvim_win_set_cursor(M.main_win, {selected_line, 0})
+    if selected_line + direction > #M.lines_infos then  -- past the last line, show the next page if there is one
+      if more_results and #filtered_files < M.display_limit + config.PAGE_SIZE then
+        more_results(M.display_limit + config.PAGE_SIZE - #filtered_files)
+      end
+      if #filtered_files > M.display_limit then
+        M.display_limit = M.display_limit + config.PAGE_SIZE
+        selected_line = update_display(filtered_files, selected_line + direction)
+        return
+      end
+    end
+    selected_line = list_view.render(M.results_view, nil, nil, selected_line + direction)  -- same rows, scrolls
+    M.preview_selection(selected_line)
   end
 
   vim.api.nvim_buf_attach(M.prompt_buf, false, { on_lines = function() vim.schedule(on_input_change) end })
@@ -330,20 +415,24 @@ function M.start(history_only_mode)
   sk(M.prompt_buf, "i", "<C-k>", "", { callback = function() move_selection(1) end,  noremap = true, silent = true })
   sk(M.prompt_buf, "i", "<C-^>", "", { callback = function() move_selection(-1) end, noremap = true, silent = true })
   sk(M.prompt_buf, "i", "<Esc>", "", { callback = M.close_windows,                   noremap = true, silent = true })
+  sk(M.prompt_buf, "i", "<C-f>", "", { callback = toggle_fuzzy,                      noremap = true, silent = true })
+  sk(M.prompt_buf, "i", "<C-p>", "", { callback = toggle_preview,                    noremap = true, silent = true })
   sk(M.main_buf,   "n", "<CR>",  "", { callback = select_file,                       noremap = true, silent = true })
   sk(M.main_buf,   "n", "<C-o>", "", { callback = switch_mode,                       noremap = true, silent = true })
   sk(M.main_buf,   "n", "q",     "", { callback = M.close_windows,                   noremap = true, silent = true })
   sk(M.main_buf,   "n", "<Esc>", "", { callback = M.close_windows,                   noremap = true, silent = true })
+  sk(M.main_buf,   "n", "<C-f>", "", { callback = toggle_fuzzy,                      noremap = true, silent = true })
+  sk(M.main_buf,   "n", "<C-p>", "", { callback = toggle_preview,                    noremap = true, silent = true })
   setup_number_keys()
   -- Functions to adjust lines per file
   local function increase_lines_per_file()
     M.lines_per_file = math.min(M.lines_per_file + 1, config.MAX_LINES_PER_FILE)
-    update_display(filtered_files)
+    selected_line = update_display(filtered_files, selected_line)
   end
 
   local function decrease_lines_per_file()
     M.lines_per_file = math.max(M.lines_per_file - 1, 1)  -- Min 1 line per file
-    update_display(filtered_files)
+    selected_line = update_display(filtered_files, selected_line)
   end
 
   -- Add keybindings for ≠ (Ctrl+=) and – (Ctrl+-) to adjust lines per file
@@ -353,7 +442,8 @@ function M.start(history_only_mode)
   sk(M.main_buf,   "n", "≠", "", { callback = increase_lines_per_file, noremap = true, silent = true })
   sk(M.main_buf,   "n", "–", "", { callback = decrease_lines_per_file, noremap = true, silent = true })
 
-  update_display(filtered_files)
+  selected_line = update_display(filtered_files, selected_line)
+  if use_daemon and not M.history_only_mode then on_input_change(true) end  -- the first page comes from the daemon
   vim.api.nvim_buf_set_lines(M.prompt_buf, 0, 1, false, { "> " .. visual_selection })  -- triggers recomputation
   vim.cmd("startinsert")
   vim.cmd('normal! $')
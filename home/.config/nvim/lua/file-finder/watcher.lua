@@ -0,0 +1,65 @@
+-- Filesystem watchers over the indexed tree: one fs_event per directory (inotify is not recursive), within a budget
+-- Events are coalesced per directory until nothing happened for WATCH_DEBOUNCE_MS, then handed over all at once
+-- Changes are { absolute dir -> { all = true if unknown, names = { name -> true if created/deleted/renamed } } },
+-- a name only mapped to false was just modified
+
+local M = {}
+
+local config = require("file-finder.config")
+
+local uv = vim.uv
+
+local handles = {}  -- absolute dir -> fs_event handle
+local watched_count = 0
+local pending = {}
+local timer = nil
+local on_changes = nil
+
+local function flush()
+  local changes = pending
+  pending = {}
+  if on_changes and next(changes) then on_changes(changes) end
+end
+
+local function on_event(dir, err, filename, events)
+  -- Called on the main loop but in a fast context: only records, the flush is scheduled
+  local change = pending[dir]
+  if not change then change = { all = false, names = {} }; pending[dir] = change end
+  if err or not filename then change.all = true
+  else change.names[filename] = change.names[filename] or (events.rename == true) end
+  timer:stop()
+  timer:start(config.WATCH_DEBOUNCE_MS, 0, vim.schedule_wrap(flush))
+end
+
+function M.start(callback)
+  -- Drops previous watchers, callback(changes) will get the coalesced changes of the directories watched from now
+  M.stop()
+  on_changes, timer = callback, uv.new_timer()
+end
+
+function M.stop()
+  for _, handle in pairs(handles) do handle:stop(); handle:close() end
+  handles, watched_count, pending, on_changes = {}, 0, {}, nil
+  if timer then timer:stop(); timer:close(); timer = nil end
+end
+
+function M.watch(dir)
+  -- Returns false if dir can't be watched, budget exhausted or the system refused (inotify limits...)
+  if handles[dir] then return true end
+  if not timer or watched_count >= config.WATCH_MAX_DIRS then return false end
+  local handle = uv.new_fs_event()
+  if not handle then return false end
+  local ok = handle:start(dir, {}, function(err, filename, events) on_event(dir, err, filename, events) end)
+  if not ok then handle:close(); return false end
+  handles[dir], watched_count = handle, watched_count + 1
+  return true
+end
+
+function M.unwatch(dir)
+  local handle = handles[dir]
+  if not handle then return end
+  handle:stop(); handle:close()
+  handles[dir], watched_count, pending[dir] = nil, watched_count - 1, nil
+end
+
+return M
@@ -0,0 +1,59 @@
+-- Parallel content search: files are split in batches, scanned by libuv's thread pool running matcher.lua
+-- Only as many batches as cores are in flight, so a cancelled search stops queueing and frees the pool quickly
+-- NOTE libuv's pool defaults to 4 threads whatever the core count, export UV_THREADPOOL_SIZE to use more of them
+
+local M = {}
+
+local config = require("file-finder.config")
+local matcher = require("file-finder.matcher")
+
+local uv = vim.uv
+
+local matcher_path = nil
+
+local function work(matcher_file, first_index, pattern, joined_paths, skip_regex_matching, ...)
+  -- Runs in a worker thread: string.dump'ed so no upvalues, and no `vim`, only what a fresh Lua state has
+  -- Each pool thread keeps its Lua state between jobs, so matcher.lua is only loaded once per thread
+  local matcher = package.loaded["file-finder.matcher"] or dofile(matcher_file)
+  package.loaded["file-finder.matcher"] = matcher
+  return first_index, matcher.scan_batch(pattern, joined_paths, skip_regex_matching, ...)
+end
+
+function M.available() return config.CONTENT_WORKERS and uv.new_work ~= nil end
+
+function M.search(pattern, abs_paths, skip_regex_matching, on_batch, on_done)
+  -- Calls on_batch(first_index, results) on the main loop for each batch, result.index is relative to the batch:
+  -- abs_paths[first_index + result.index - 1] is the scanned file (see matcher.decode_batch for the result format)
+  -- Then on_done(skip_regex_matching) once all batches are merged, returns a function cancelling the search
+  matcher_path = matcher_path or vim.api.nvim_get_runtime_file("lua/file-finder/matcher.lua", false)[1]
+  local max_in_flight, max_matched_lines = math.max(1, uv.available_parallelism()), config.MAX_LINES_PER_FILE + 1
+  local in_flight, next_first, finished = 0, 1, false
+  local context, queue_next
+
+  local function after_work(first_index, batch_skip_regex_matching, encoded)
+    in_flight = in_flight - 1
+    if finished then return end
+    skip_regex_matching = skip_regex_matching or batch_skip_regex_matching
+    on_batch(first_index, matcher.decode_batch(encoded))
+    queue_next()
+  end
+
+  queue_next = function()
+    while in_flight < max_in_flight and next_first <= #abs_paths do
+      local last = math.min(next_first + config.CONTENT_WORKERS_BATCH_SIZE - 1, #abs_paths)
+      local joined_paths = table.concat(abs_paths, "\0", next_first, last)
+      context:queue(
+        matcher_path, next_first, pattern, joined_paths, skip_regex_matching,
+        max_matched_lines, config.CONTENT_MAX_BYTES, config.CONTENT_MAX_LINE_LENGTH
+      )
+      in_flight, next_first = in_flight + 1, last + 1
+    end
+    if in_flight == 0 then finished = true; on_done(skip_regex_matching) end
+  end
+
+  context = uv.new_work(work, vim.schedule_wrap(after_work))  -- after_work is called in a fast context otherwise
+  queue_next()
+  return function() finished = true end
+end
+
+return M
@@ -0,0 +1,133 @@
+-- Virtualized list rendering, shared by file-finder and file-explorer
+-- - The buffer only ever holds the rows inside the window's viewport, rows are asked to the caller only for those
+-- - Each frame is diffed against the previous one: only changed lines are set, by contiguous runs, and only their
+--   highlights are cleared and set again (as extmarks), so the cost stays flat whatever the number of rows
+-- - Row indexes given to and returned by a view are 1-based over all rows, not buffer lines: use row_at to map a
+--   buffer line (cursor, mouse) back to a row
+-- - When rows depend on the cursor (a selection marker), move only asks again for the previous and new cursor rows
+-- A row is its text and its colors: { { hl_group, start_col, end_col }, ... }, end_col -1 meaning end of line, and
+-- optionally an annotation, text shown dimmed after the end of the line
+
+local M = {}
+
+local api = vim.api
+
+function M.new(buf, win, namespace_name)
+  return {
+    buf = buf, win = win, ns = api.nvim_create_namespace(namespace_name),
+    top = 1, count = 0, get_row = nil, cursor = 1, frame_texts = {}, frame_colors = {}, frame_annotations = {},
+  }
+end
+
+local function same_colors(a, b)
+  if a == b then return true end
+  if not a or not b or #a ~= #b then return false end
+  for i = 1, #a do
+    local x, y = a[i], b[i]
+    if x[1] ~= y[1] or x[2] ~= y[2] or x[3] ~= y[3] then return false end
+  end
+  return true
+end
+
+local function same_row(view, line, text, colors, annotation)
+  -- Whether line of the previous frame already shows that row
+  return text == view.frame_texts[line] and same_colors(colors, view.frame_colors[line])
+    and annotation == view.frame_annotations[line]
+end
+
+local function set_highlights(view, line, text, colors, annotation)
+  for _, color in ipairs(colors or {}) do
+    local start_col = math.min(color[2], #text)
+    local end_col = color[3] < 0 and #text or math.min(color[3], #text)
+    if end_col > start_col then
+      api.nvim_buf_set_extmark(view.buf, view.ns, line, start_col, { end_col = end_col, hl_group = color[1] })
+    end
+  end
+  if annotation then
+    api.nvim_buf_set_extmark(view.buf, view.ns, line, 0, { virt_text = { { annotation, "Comment" } } })
+  end
+end
+
+function M.render(view, count, get_row, cursor)
+  -- Draws rows top..top+height-1 of count rows, get_row(i) returning text, colors and maybe an annotation, scrolled
+  -- so cursor is visible
+  -- count and get_row are kept when nil, so moving the cursor is just M.render(view, nil, nil, cursor)
+  -- Returns the cursor, clamped to the rows
+  if not api.nvim_buf_is_valid(view.buf) or not api.nvim_win_is_valid(view.win) then return cursor end
+  view.count, view.get_row = count or view.count, get_row or view.get_row
+  count = view.count
+  local height = api.nvim_win_get_height(view.win)
+  cursor = math.max(1, math.min(cursor or view.cursor, count))
+  if cursor < view.top then view.top = cursor end
+  if cursor > view.top + height - 1 then view.top = cursor - height + 1 end
+  view.top = math.max(1, math.min(view.top, count - height + 1))
+  local shown = math.max(0, math.min(height, count - view.top + 1))
+  local texts, colors, annotations = {}, {}, {}
+  for i = 1, shown do texts[i], colors[i], annotations[i] = view.get_row(view.top + i - 1) end
+
+  local frame_texts = view.frame_texts
+  local changed = false
+  local function start_change()
+    if not changed then api.nvim_buf_set_option(view.buf, "modifiable", true); changed = true end
+  end
+  local i = 1
+  while i <= shown do
+    if same_row(view, i, texts[i], colors[i], annotations[i]) then
+      i = i + 1
+    else
+      local run_start = i
+      while i <= shown and not same_row(view, i, texts[i], colors[i], annotations[i]) do i = i + 1 end
+      local run_texts = { unpack(texts, run_start, i - 1) }
+      local replaced_end = math.min(i - 1, #frame_texts)  -- past the previous frame, lines are added
+      start_change()
+      api.nvim_buf_clear_namespace(view.buf, view.ns, run_start - 1, replaced_end)
+      api.nvim_buf_set_lines(view.buf, run_start - 1, math.max(replaced_end, run_start - 1), false, run_texts)
+      for row = run_start, i - 1 do set_highlights(view, row - 1, texts[row], colors[row], annotations[row]) end
+    end
+  end
+  if api.nvim_buf_line_count(view.buf) > math.max(shown, 1) or (shown == 0 and #frame_texts > 0) then
+    start_change()
+    api.nvim_buf_clear_namespace(view.buf, view.ns, shown, -1)
+    api.nvim_buf_set_lines(view.buf, shown, -1, false, {})
+  end
+  if changed then api.nvim_buf_set_option(view.buf, "modifiable", false) end
+  view.frame_texts, view.frame_colors, view.frame_annotations = texts, colors, annotations
+
+  view.cursor = cursor
+  if shown > 0 then api.nvim_win_set_cursor(view.win, { cursor - view.top + 1, 0 }) end
+  return cursor
+end
+
+function M.move(view, cursor)
+  -- Moves the cursor over the same rows, redrawing only the previous and new cursor rows if no scrolling is needed
+  -- Returns the cursor, clamped to the rows
+  if not api.nvim_buf_is_valid(view.buf) or not api.nvim_win_is_valid(view.win) then return cursor end
+  local height = api.nvim_win_get_height(view.win)
+  cursor = math.max(1, math.min(cursor, view.count))
+  local shown = math.max(0, math.min(height, view.count - view.top + 1))
+  if cursor < view.top or cursor >= view.top + shown or #view.frame_texts ~= shown then
+    return M.render(view, nil, nil, cursor)
+  end
+  local changed = false
+  local rows = { cursor }
+  if view.cursor ~= cursor and view.cursor >= view.top and view.cursor < view.top + shown then rows[2] = view.cursor end
+  for _, row in ipairs(rows) do
+    local line = row - view.top + 1
+    local text, colors, annotation = view.get_row(row)
+    if not same_row(view, line, text, colors, annotation) then
+      if not changed then api.nvim_buf_set_option(view.buf, "modifiable", true); changed = true end
+      api.nvim_buf_clear_namespace(view.buf, view.ns, line - 1, line)
+      api.nvim_buf_set_lines(view.buf, line - 1, line, false, { text })
+      set_highlights(view, line - 1, text, colors, annotation)
+      view.frame_texts[line], view.frame_colors[line], view.frame_annotations[line] = text, colors, annotation
+    end
+  end
+  if changed then api.nvim_buf_set_option(view.buf, "modifiable", false) end
+  view.cursor = cursor
+  api.nvim_win_set_cursor(view.win, { cursor - view.top + 1, 0 })
+  return cursor
+end
+
+function M.row_at(view, line) return view.top + line - 1 end
+
+return M
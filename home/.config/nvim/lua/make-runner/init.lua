@@ -0,0 +1,9 @@
+-- Only what startup needs: the keymap, the runner itself (see runner.lua) is loaded on first use
+local M = {}
+
+function M.open() require("make-runner.runner").open() end
+function M.close() require("make-runner.runner").close() end
+
+function M.setup() vim.keymap.set('n', 'm', M.open, { desc = 'Open make target runner' }) end
+
+return M
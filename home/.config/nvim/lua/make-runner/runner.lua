@@ -1,5 +1,6 @@
 -- Make Target Runner
 -- Press 'm' to show Makefile targets, press number to run instantly
+-- Loaded on first use, the keymap is set up by make-runner/init.lua
 --
 -- ============================================================================
 -- SECURITY MODEL
@@ -34,6 +35,8 @@
 
 local M = {}
 
+local stats = require("plugin-stats")
+
 -- Security: Separate charsets for different purposes - principle of least privilege
 -- KISS: Explicit strings, no regex magic - paranoid char-by-char validation
 local TARGET_SAFE_CHARSET = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._-"
@@ -46,6 +49,8 @@ local PATH_SAFE_CHARSET = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0
 local DESC_SAFE_CHARSET = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 "
   .. ".,!?;:'\"-_()[]{}/@#$%&*+=<>|~`"  -- Printable ASCII, no backslash/newline/tabs
 
+local MAX_MAKEFILES = 100  -- Makefile and the ones it includes, past that includes are ignored
+
 -- State
 local state = {
   win_main = nil, win_prompt = nil, win_output = nil, win_backdrop = nil,
@@ -59,6 +64,9 @@ local state = {
   job_id = nil, -- Job ID of running make process (for proper cleanup)
 }
 
+-- Parsed Makefiles: path -> { targets, files = { { path, signature } } }, valid while no file read changed
+local parsed_makefiles = {}
+
 -- Validate target name (security: only allow safe characters)
 -- KISS: Paranoid char-by-char validation, no pattern matching
 local function is_valid_target_name(name)
@@ -190,32 +198,85 @@ local function find_makefile()
   return nil
 end
 
--- Parse Makefile for targets
-local function parse_makefile(filepath)
-  local targets = {}
+-- Signature of a file for the parse cache: changes with its content, "missing" if it doesn't exist
+local function file_signature(path)
+  local stat = vim.uv.fs_stat(path)
+  if not stat then return "missing" end
+  return stat.mtime.sec .. "." .. stat.mtime.nsec .. ":" .. stat.size
+end
+
+-- Included makefiles of an include line, relative to the Makefile's directory as make runs there (make -C)
+-- KISS: Names with variables or wildcards would need make itself to expand them, they are skipped
+local function included_paths(line, makefile_dir)
+  local names = line:match("^ *%-?include%s+(.*)$") or line:match("^ *sinclude%s+(.*)$")
+  if not names then return nil end
+  local paths = {}
+  for name in names:gsub("#.*$", ""):gmatch("%S+") do
+    if not name:find("[%$%*%?%[]") then
+      local path = name:sub(1, 1) == "/" and name or (makefile_dir .. "/" .. name)
+      -- Security: Same ASCII-only rule as the Makefile itself
+      if is_valid_path(path) then table.insert(paths, path) end
+    end
+  end
+  return paths
+end
+
+-- Parse one makefile into targets, following its includes where they are (as make reads them)
+-- parsed: { targets, seen = { name -> target }, files = { { path, signature } }, read = { path -> true } }
+-- A file is only read once, so include cycles end
+local function parse_file(filepath, makefile_dir, parsed)
+  if parsed.read[filepath] or #parsed.files >= MAX_MAKEFILES then return end
+  parsed.read[filepath] = true
+  table.insert(parsed.files, { filepath, file_signature(filepath) })  -- even missing: creating it changes targets
   local file = io.open(filepath, "r")
-  if not file then return targets end
+  if not file then return end
   for line in file:lines() do
     -- Match: "target: ## Description"
     -- Security: Validate BOTH target AND description (no escape sequences, control chars)
     local target, desc = line:match("^([%w%.%-_]+):%s*##%s*(.+)")
+    local includes = included_paths(line, makefile_dir)
     if target and desc and is_valid_target_name(target) and is_valid_desc(desc) then
-      table.insert(targets, { name = target, desc = desc })
+      local existing = parsed.seen[target]
+      if not existing then
+        parsed.seen[target] = { name = target, desc = desc }
+        table.insert(parsed.targets, parsed.seen[target])
+      elseif existing.desc == "" then existing.desc = desc end  -- described after being listed bare
+    elseif includes then
+      for _, path in ipairs(includes) do parse_file(path, makefile_dir, parsed) end
     else
       -- Match any target without description
       local target_only = line:match("^([%w%.%-_]+):$")
       if target_only and target_only ~= ".PHONY" and target_only ~= ".SILENT" and target_only ~= ".DEFAULT_GOAL" then
-        -- Security check
-        if is_valid_target_name(target_only) then
-          -- Check if we haven't already added this target
-          local exists = false
-          for _, t in ipairs(targets) do if t.name == target_only then exists = true break end end
-          if not exists then table.insert(targets, { name = target_only, desc = "" }) end
+        -- Security check, then only if we haven't already added this target
+        if is_valid_target_name(target_only) and not parsed.seen[target_only] then
+          parsed.seen[target_only] = { name = target_only, desc = "" }
+          table.insert(parsed.targets, parsed.seen[target_only])
         end
       end
     end
   end
   file:close()
+end
+
+-- Parse Makefile for targets, and the makefiles it includes
+-- Returns the targets and the files read with their signatures
+local function parse_makefile(filepath)
+  local parsed = { targets = {}, seen = {}, files = {}, read = {} }
+  parse_file(filepath, vim.fn.fnamemodify(filepath, ":h"), parsed)
+  return parsed.targets, parsed.files
+end
+parse_makefile = stats.wrap("make-runner.parse_makefile", parse_makefile)
+
+-- Targets of Makefile, only parsed again when it or a makefile it includes changed (one stat per file)
+local function get_targets(makefile)
+  local cached = parsed_makefiles[makefile]
+  if cached then
+    local unchanged = true
+    for _, file in ipairs(cached.files) do unchanged = unchanged and file_signature(file[1]) == file[2] end
+    if unchanged then return cached.targets end
+  end
+  local targets, files = parse_makefile(makefile)
+  parsed_makefiles[makefile] = { targets = targets, files = files }
   return targets
 end
 
@@ -605,7 +666,7 @@ function M.open()
     print("Invalid Makefile directory path")
     return
   end
-  state.targets = parse_makefile(makefile)
+  state.targets = get_targets(makefile)
   if #state.targets == 0 then
     print("No targets found in Makefile")
     return
@@ -634,7 +695,4 @@ function M.close()
   state.win_backdrop = nil
 end
 
--- Setup
-function M.setup() vim.keymap.set('n', 'm', M.open, { desc = 'Open make target runner' }) end
-
 return M
@@ -0,0 +1,93 @@
+-- Timing spans around the hot paths of file-finder, file-explorer and make-runner, to tell what makes a popup slow
+-- - Off unless NVIM_PLUGIN_STATS is set: wrap then returns the function itself, so instrumented code pays nothing
+-- - Spans go to a fixed-size ring buffer, :PluginStats shows count and percentiles per span name
+-- - With NVIM_PLUGIN_STATS_EXPORT set to a path, the ring and its summary are written there as JSON on exit
+-- WARNING only covers what was wrapped after the environment was read, when this module was first required
+
+local M = {}
+
+local RING_SIZE = 4096
+
+local hrtime = vim.uv.hrtime
+
+M.enabled = (vim.env.NVIM_PLUGIN_STATS or "") ~= ""
+
+local names, durations = {}, {}  -- the ring: span name and duration in ns, next_slot overwritten first
+local next_slot = 1
+
+local function record(name, started, ...)
+  names[next_slot], durations[next_slot] = name, hrtime() - started
+  next_slot = next_slot % RING_SIZE + 1
+  return ...
+end
+
+function M.wrap(name, fn)
+  -- Returns fn, timed as a span named name if enabled
+  if not M.enabled then return fn end
+  return function(...)
+    local started = hrtime()  -- before fn runs, arguments are evaluated in no specified order
+    return record(name, started, fn(...))
+  end
+end
+
+function M.span(name, started)
+  -- Records a span started at hrtime started, for work that doesn't fit in one call (async, callbacks)
+  if M.enabled then record(name, started) end
+end
+
+local function percentile(sorted, p) return sorted[math.max(1, math.ceil(#sorted * p))] end
+
+function M.summary()
+  -- Returns span name -> { count, p50, p90, p99, max }, in milliseconds, over the spans still in the ring
+  local by_name = {}
+  for slot, name in pairs(names) do
+    by_name[name] = by_name[name] or {}
+    table.insert(by_name[name], durations[slot] / 1e6)
+  end
+  local summary = {}
+  for name, values in pairs(by_name) do
+    table.sort(values)
+    summary[name] = {
+      count = #values, max = values[#values],
+      p50 = percentile(values, 0.5), p90 = percentile(values, 0.9), p99 = percentile(values, 0.99),
+    }
+  end
+  return summary
+end
+
+function M.show()
+  if not M.enabled then
+    vim.notify("Plugin stats are off, start nvim with NVIM_PLUGIN_STATS=1", vim.log.levels.WARN)
+    return
+  end
+  local summary = M.summary()
+  local sorted_names = vim.tbl_keys(summary)
+  table.sort(sorted_names)
+  local lines = { string.format("%-36s %7s %9s %9s %9s %9s", "span (ms)", "count", "p50", "p90", "p99", "max") }
+  for _, name in ipairs(sorted_names) do
+    local s = summary[name]
+    table.insert(lines, string.format("%-36s %7d %9.3f %9.3f %9.3f %9.3f", name, s.count, s.p50, s.p90, s.p99, s.max))
+  end
+  vim.api.nvim_echo({ { table.concat(lines, "\n") } }, false, {})
+end
+
+function M.export(path)
+  local spans = {}
+  for i = 0, RING_SIZE - 1 do  -- oldest first
+    local slot = (next_slot - 1 + i) % RING_SIZE + 1
+    if names[slot] then table.insert(spans, { name = names[slot], ms = durations[slot] / 1e6 }) end
+  end
+  local file = io.open(path, "w")
+  if not file then return end
+  file:write(vim.json.encode({ spans = spans, summary = M.summary() }))
+  file:close()
+end
+
+function M.setup()
+  vim.api.nvim_create_user_command("PluginStats", M.show, { desc = "Show timings of the plugins hot paths" })
+  local export_path = vim.env.NVIM_PLUGIN_STATS_EXPORT
+  if not M.enabled or not export_path or export_path == "" then return end
+  vim.api.nvim_create_autocmd("VimLeavePre", { callback = function() M.export(export_path) end })
+end
+
+return M